@@ -0,0 +1,245 @@
+"""
+Update Pipeline Benchmarks
+
+Times hashing, verification, manifest loading, update application,
+rollback and snapshots on synthetic packages and target trees.
+
+Usage:
+    python -m benchmarks.bench_pipeline --profile small --output results.json
+    python -m benchmarks.bench_pipeline --profile medium --compare results.json
+    python -m benchmarks.bench_pipeline --memory-limit 4194304
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from src.buffer_pool import BufferPool, peak_rss_bytes
+from src.ota_package import OTAPackage, calculate_file_hash
+from src.rollback import RollbackManager
+from src.updater import Updater
+from src.verifier import Verifier
+
+MB = 1024 * 1024
+
+# scenario -> (file count, file size in bytes, directory depth)
+PROFILES: Dict[str, Dict[str, tuple]] = {
+    'small': {
+        'many_tiny_files': (500, 1024, 1),
+        'few_large_files': (2, 16 * MB, 1),
+        'deep_tree': (200, 4096, 12),
+    },
+    'medium': {
+        'many_tiny_files': (20000, 1024, 2),
+        'few_large_files': (4, 256 * MB, 1),
+        'deep_tree': (5000, 8192, 24),
+    },
+    'large': {
+        'many_tiny_files': (100000, 1024, 3),
+        'few_large_files': (3, 2048 * MB, 1),
+        'deep_tree': (20000, 16384, 48),
+    },
+}
+
+
+class Scenario:
+    """A generated package and matching target tree."""
+
+    def __init__(self, name: str, root: str, count: int, size: int, depth: int):
+        self.name = name
+        self.root = root
+        self.package_dir = os.path.join(root, 'package')
+        self.target_dir = os.path.join(root, 'target')
+        self.files: List[Dict] = []
+        self.total_bytes = count * size
+        self._generate(count, size, depth)
+
+    def _generate(self, count: int, size: int, depth: int):
+        block = os.urandom(min(size, MB))
+        for index in range(count):
+            parts = [f"d{(index >> level) % 4}" for level in range(depth - 1)]
+            rel_path = "/".join(parts + [f"file_{index:06d}.bin"])
+            for base in (self.package_dir, self.target_dir):
+                path = os.path.join(base, rel_path)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path, 'wb') as f:
+                    # Make each file distinct so content stores cannot dedupe them
+                    f.write(index.to_bytes(8, 'little'))
+                    remaining = size - 8
+                    while remaining > 0:
+                        f.write(block[:min(remaining, len(block))])
+                        remaining -= len(block)
+            self.files.append({
+                'path': rel_path,
+                'hash': calculate_file_hash(os.path.join(self.package_dir, rel_path)),
+                'size': size
+            })
+
+    def package(self) -> OTAPackage:
+        return OTAPackage(self.package_dir, "2.0.0", self.files)
+
+
+def _measure(scenario: Scenario, operation: str, func: Callable[[], object],
+             setup: Optional[Callable[[], object]] = None,
+             total_bytes: Optional[int] = None, repeat: int = 1) -> Dict:
+    """Run ``func`` ``repeat`` times and keep the fastest run."""
+    best = None
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    total_bytes = scenario.total_bytes if total_bytes is None else total_bytes
+    files = len(scenario.files)
+    return {
+        'scenario': scenario.name,
+        'operation': operation,
+        'seconds': best,
+        'bytes': total_bytes,
+        'files': files,
+        'mb_per_s': total_bytes / MB / best if best else None,
+        'files_per_s': files / best if best else None,
+    }
+
+
+def _copy_step(package: OTAPackage, target_dir: str) -> bool:
+    for file_info in package.files:
+        dst = os.path.join(target_dir, file_info['path'])
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        shutil.copyfile(os.path.join(package.package_id, file_info['path']), dst)
+    return True
+
+
+def run_scenario(scenario: Scenario, repeat: int,
+                 buffer_pool: Optional[BufferPool] = None) -> List[Dict]:
+    """Benchmark every pipeline operation on one scenario."""
+    results = []
+    package = scenario.package()
+    paths = [os.path.join(scenario.package_dir, f['path']) for f in scenario.files]
+    verifier = Verifier(buffer_pool=buffer_pool)
+
+    results.append(_measure(scenario, 'calculate_file_hash',
+                            lambda: [calculate_file_hash(p, pool=buffer_pool) for p in paths],
+                            repeat=repeat))
+    results.append(_measure(scenario, 'Verifier.verify_hash',
+                            lambda: [verifier.verify_hash(p, f['hash'])
+                                     for p, f in zip(paths, scenario.files)], repeat=repeat))
+
+    manifest_path = os.path.join(scenario.root, 'manifest.json')
+    package.save_manifest(manifest_path)
+    results.append(_measure(scenario, 'OTAPackage.from_manifest',
+                            lambda: OTAPackage.from_manifest(manifest_path),
+                            total_bytes=os.path.getsize(manifest_path), repeat=repeat))
+
+    backup_dir = os.path.join(scenario.root, 'backup')
+    updater = Updater(verifier, backup_dir, buffer_pool=buffer_pool)
+    updater.add_update_step(_copy_step)
+    results.append(_measure(scenario, 'Updater.apply_update',
+                            lambda: updater.apply_update(package, scenario.target_dir),
+                            repeat=repeat))
+    results.append(_measure(scenario, 'Updater._rollback',
+                            lambda: updater._rollback(scenario.target_dir),
+                            setup=lambda: updater._create_backup(scenario.target_dir, package),
+                            repeat=repeat))
+    updater._cleanup_backup()
+
+    manager = RollbackManager(os.path.join(scenario.root, 'snapshots'))
+    results.append(_measure(scenario, 'RollbackManager.create_snapshot',
+                            lambda: manager.create_snapshot(scenario.target_dir, 'bench'),
+                            repeat=repeat))
+    results.append(_measure(scenario, 'RollbackManager.rollback_to_snapshot',
+                            lambda: manager.rollback_to_snapshot('bench', scenario.target_dir),
+                            repeat=repeat))
+    return results
+
+
+def compare(results: List[Dict], baseline_path: str, threshold: float) -> List[str]:
+    """Return descriptions of operations slower than the baseline by ``threshold``."""
+    with open(baseline_path, 'r') as f:
+        baseline = {(r['scenario'], r['operation']): r for r in json.load(f)['results']}
+
+    regressions = []
+    for result in results:
+        previous = baseline.get((result['scenario'], result['operation']))
+        if not previous or not previous['seconds']:
+            continue
+        ratio = result['seconds'] / previous['seconds']
+        print(f"  {result['scenario']:<18} {result['operation']:<38} {ratio:6.2f}x")
+        if ratio > 1 + threshold:
+            regressions.append(f"{result['scenario']}/{result['operation']}: {ratio:.2f}x slower")
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the OTA update pipeline.")
+    parser.add_argument('--profile', choices=sorted(PROFILES), default='small')
+    parser.add_argument('--scenario', action='append', help="Run only these scenarios")
+    parser.add_argument('--repeat', type=int, default=3, help="Runs per operation; fastest is kept")
+    parser.add_argument('--workdir', help="Directory for generated data (default: temp dir)")
+    parser.add_argument('--output', help="Write results as JSON to this path")
+    parser.add_argument('--compare', help="Compare against a previous JSON result file")
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help="Relative slowdown reported as a regression (default 0.2)")
+    parser.add_argument('--memory-limit', type=int,
+                        help="Run with a shared buffer pool of at most this many bytes")
+    args = parser.parse_args(argv)
+    pool = BufferPool.for_budget(args.memory_limit) if args.memory_limit else None
+
+    scenarios = PROFILES[args.profile]
+    selected = args.scenario or list(scenarios)
+    workdir = args.workdir or tempfile.mkdtemp(prefix='ota_bench_')
+    results = []
+    try:
+        for name in selected:
+            count, size, depth = scenarios[name]
+            root = os.path.join(workdir, name)
+            if os.path.exists(root):
+                shutil.rmtree(root)
+            print(f"Generating {name}: {count} files x {size} bytes, depth {depth}")
+            scenario = Scenario(name, root, count, size, depth)
+            for result in run_scenario(scenario, args.repeat, pool):
+                results.append(result)
+                print(f"  {result['operation']:<38} {result['seconds']:9.4f}s "
+                      f"{result['mb_per_s'] or 0:10.1f} MB/s {result['files_per_s'] or 0:12.1f} files/s")
+            shutil.rmtree(root)
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        'meta': {
+            'profile': args.profile,
+            'timestamp': datetime.now().isoformat(),
+            'python': sys.version.split()[0],
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'peak_rss_bytes': peak_rss_bytes(),
+            'buffer_pool': pool.stats() if pool else None,
+        },
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.compare:
+        print(f"Compared to {args.compare}:")
+        regressions = compare(results, args.compare, args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
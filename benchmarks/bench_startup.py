@@ -0,0 +1,131 @@
+"""
+CLI Startup Benchmarks
+
+Measures cold-start latency of the ``ota`` CLI. Every run is a fresh
+interpreter, so the times include imports, which dominate on small
+packages. Also records whether ``cryptography`` was imported, which
+should only happen when a signature is checked.
+
+Usage:
+    python -m benchmarks.bench_startup --repeat 20 --output startup.json
+    python -m benchmarks.bench_startup --compare startup.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Prints 1 if cryptography ended up imported, after running the CLI
+_PROBE = ("import sys\nfrom src.cli import main\n"
+          "try:\n    code = main(sys.argv[1:])\nexcept SystemExit as e:\n    code = e.code\n"
+          "print('CRYPTO', int('cryptography' in sys.modules))\nsys.exit(code)\n")
+
+
+def _setup(workdir: str) -> Dict[str, List[str]]:
+    """Create a small signed package and return the commands to time."""
+    from src.ota_package import OTAPackage, calculate_file_hash
+    from src.signer import Signer
+
+    payload = os.path.join(workdir, "pkg")
+    os.makedirs(payload)
+    files = []
+    for i in range(10):
+        path = os.path.join(payload, f"f{i}.bin")
+        with open(path, 'wb') as f:
+            f.write(os.urandom(4096))
+        files.append({'path': f"f{i}.bin", 'hash': calculate_file_hash(path)})
+    manifest = os.path.join(workdir, "manifest.json")
+    OTAPackage(payload, "1.0.0", files).save_signed_manifest(
+        manifest, Signer(os.path.join(REPO_ROOT, "private_key.pem")))
+    journal = os.path.join(workdir, "journal")
+    probe = [sys.executable, '-c', _PROBE]
+    return {
+        # Interpreter start-up alone, to separate it from our own imports
+        'python': [sys.executable, '-c', 'pass'],
+        'help': probe + ['--help'],
+        'status': probe + ['status', '--journal', journal],
+        'verify_hash_only': probe + ['verify', manifest],
+        'verify_signed': probe + ['verify', manifest, '--key',
+                                  os.path.join(REPO_ROOT, "public_key.pem")],
+    }
+
+
+def _time_command(command: List[str], repeat: int, cwd: str) -> Dict:
+    env = dict(os.environ, PYTHONPATH=REPO_ROOT)
+    times = []
+    crypto = False
+    for _ in range(repeat):
+        start = time.perf_counter()
+        proc = subprocess.run(command, cwd=cwd, env=env, capture_output=True, text=True)
+        times.append(time.perf_counter() - start)
+        crypto = crypto or 'CRYPTO 1' in proc.stdout
+    return {
+        'min_ms': min(times) * 1000,
+        'median_ms': statistics.median(times) * 1000,
+        'imports_cryptography': crypto,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark ota CLI cold-start latency.")
+    parser.add_argument('--repeat', type=int, default=10, help="Runs per command")
+    parser.add_argument('--output', help="Write results as JSON to this path")
+    parser.add_argument('--compare', help="Compare against a previous JSON result file")
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help="Relative slowdown reported as a regression (default 0.2)")
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix='ota_startup_')
+    results = {}
+    try:
+        for name, command in _setup(workdir).items():
+            results[name] = _time_command(command, args.repeat, workdir)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    for name, result in results.items():
+        print(f"  {name:<20} {result['min_ms']:8.1f} ms min {result['median_ms']:8.1f} ms median"
+              f"  cryptography: {result['imports_cryptography']}")
+
+    report = {
+        'meta': {
+            'timestamp': datetime.now().isoformat(),
+            'python': sys.version.split()[0],
+            'platform': platform.platform(),
+        },
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            previous = json.load(f)['results']
+        regressions = []
+        for name, result in results.items():
+            before = previous.get(name, {}).get('min_ms')
+            if before:
+                ratio = result['min_ms'] / before
+                print(f"  {name:<20} {ratio:6.2f}x")
+                if ratio > 1 + args.threshold:
+                    regressions.append(f"{name}: {ratio:.2f}x slower")
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,138 @@
+"""
+Buffer Pool Module
+
+Fixed pool of preallocated I/O buffers for memory-bounded updates.
+
+All buffers are allocated up front, so the pool's footprint is known
+before the update starts. Hashing, copying, installing, fetching and
+decompression borrow a buffer for one file at a time and read into it
+with ``readinto``; when every buffer is in use, further workers block
+until one is returned instead of allocating more.
+"""
+
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+from .metrics import Metrics
+
+DEFAULT_POOL_BUFFER_SIZE = 256 * 1024
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+
+def peak_rss_bytes() -> Optional[int]:
+    """Return this process's peak resident set size, if the platform reports it."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS reports bytes, Linux KiB
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class BufferPool:
+    """A fixed set of ``count`` bytearrays of ``buffer_size`` bytes.
+
+    ``acquire`` blocks while all buffers are lent out, which caps the
+    memory used for I/O at ``capacity`` bytes however many workers run.
+    """
+
+    def __init__(self, buffer_size: int = DEFAULT_POOL_BUFFER_SIZE, count: int = 4,
+                 metrics: Optional[Metrics] = None):
+        if buffer_size < 1:
+            raise ValueError("buffer_size must be at least 1")
+        if count < 1:
+            raise ValueError("count must be at least 1")
+        self.buffer_size = buffer_size
+        self.count = count
+        self.metrics = metrics or Metrics()
+        self._free = [bytearray(buffer_size) for _ in range(count)]
+        self._owned = {id(buffer) for buffer in self._free}
+        self._lent = set()  # ids of buffers acquired and not yet released
+        self._cond = threading.Condition()
+        self.in_use = 0
+        self.peak_in_use = 0
+        self.waits = 0
+        self.wait_seconds = 0.0
+
+    @classmethod
+    def for_budget(cls, memory_limit: int, buffer_size: int = DEFAULT_POOL_BUFFER_SIZE,
+                   metrics: Optional[Metrics] = None) -> 'BufferPool':
+        """Create the largest pool that fits in ``memory_limit`` bytes."""
+        buffer_size = min(buffer_size, memory_limit)
+        if buffer_size < 1:
+            raise ValueError("memory_limit must be at least 1 byte")
+        return cls(buffer_size, memory_limit // buffer_size, metrics)
+
+    @property
+    def capacity(self) -> int:
+        return self.buffer_size * self.count
+
+    @property
+    def peak_bytes(self) -> int:
+        """Most buffer memory lent out at once."""
+        return self.peak_in_use * self.buffer_size
+
+    def acquire(self, timeout: Optional[float] = None) -> bytearray:
+        """Borrow a buffer, waiting for one to be released if none is free.
+
+        Raises TimeoutError if ``timeout`` seconds pass first.
+        """
+        with self._cond:
+            if not self._free:
+                start = time.perf_counter()
+                self.waits += 1
+                if not self._cond.wait_for(lambda: self._free, timeout):
+                    raise TimeoutError("No buffer released in time")
+                waited = time.perf_counter() - start
+                self.wait_seconds += waited
+                self.metrics.count('ota_buffer_pool_waits_total')
+                self.metrics.timing('ota_buffer_pool_wait_seconds', waited)
+            buffer = self._free.pop()
+            self._lent.add(id(buffer))
+            self.in_use += 1
+            self.peak_in_use = max(self.peak_in_use, self.in_use)
+            return buffer
+
+    def release(self, buffer: bytearray):
+        """Return a buffer obtained from ``acquire``.
+
+        Raises ValueError for a buffer that is not from this pool or was
+        already released, which would otherwise let two borrowers share it.
+        """
+        if id(buffer) not in self._owned:
+            raise ValueError("Buffer does not belong to this pool")
+        with self._cond:
+            if id(buffer) not in self._lent:
+                raise ValueError("Buffer was already released")
+            self._lent.remove(id(buffer))
+            self._free.append(buffer)
+            self.in_use -= 1
+            self._cond.notify()
+
+    @contextmanager
+    def buffer(self, timeout: Optional[float] = None) -> Iterator[bytearray]:
+        """Borrow a buffer for the duration of a ``with`` block."""
+        buffer = self.acquire(timeout)
+        try:
+            yield buffer
+        finally:
+            self.release(buffer)
+
+    def stats(self) -> Dict:
+        """Pool sizing and peak usage, plus the process peak RSS, for device sizing."""
+        with self._cond:
+            return {
+                'buffer_size': self.buffer_size,
+                'count': self.count,
+                'capacity_bytes': self.capacity,
+                'peak_in_use': self.peak_in_use,
+                'peak_bytes': self.peak_bytes,
+                'waits': self.waits,
+                'wait_seconds': round(self.wait_seconds, 6),
+                'peak_rss_bytes': peak_rss_bytes(),
+            }
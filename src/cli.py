@@ -0,0 +1,311 @@
+"""
+CLI Module
+
+Command-line entry point (``ota``) for verifying, applying and rolling back updates.
+
+Each subcommand imports only the modules it uses, and ``cryptography`` is
+loaded only when a ``--key`` is given, so a status query or a hash-only
+check starts quickly on a constrained head unit. Packages can be JSON or
+compact manifests, or single-file containers.
+
+Usage:
+    python -m src.cli verify manifest.json --key public_key.pem
+    python -m src.cli apply manifest.json /opt/ecu --key public_key.pem --journal ota.journal
+    python -m src.cli rollback /opt/ecu --snapshot before-1.2.0
+    python -m src.cli snapshot create /opt/ecu --id before-1.2.0
+    python -m src.cli status --journal ota.journal --state vehicle.json
+"""
+
+import argparse
+import json
+import os
+import sys
+from typing import List, Optional, Tuple
+
+DEFAULT_BACKUP_DIR = "/tmp/ota_backup"
+DEFAULT_SNAPSHOT_DIR = "/tmp/ota_backups"
+
+
+def load_package(path: str) -> Tuple[object, Optional[bytes], Optional[object]]:
+    """Load a package from a JSON manifest, compact manifest or container.
+
+    Returns (package, detached signature or None, open file to close or None).
+    A JSON manifest's signature is read from '<path>.sig' if present.
+    Compact manifests are returned as the mmap-backed ``CompactManifest``
+    itself, so their entries are streamed rather than loaded.
+    """
+    from . import compact_manifest, container
+    from .ota_package import SIGNATURE_SUFFIX, DeltaPackage, OTAPackage
+
+    with open(path, 'rb') as f:
+        magic = f.read(4)
+    if magic == container.MAGIC:
+        package_container = container.PackageContainer(path)
+        return package_container.to_package(), package_container.signature, package_container
+    if magic == compact_manifest.MAGIC:
+        manifest = compact_manifest.CompactManifest(path)
+        if not manifest.is_delta:
+            return manifest, None, manifest
+        # Delta installs need a DeltaPackage; delta manifests are small
+        with manifest:
+            return manifest.to_package(), None, None
+
+    with open(path, 'r') as f:
+        data = json.load(f)
+    package = DeltaPackage.from_dict(data) if data.get('type') == 'delta' \
+        else OTAPackage.from_dict(data)
+    signature = None
+    if os.path.exists(path + SIGNATURE_SUFFIX):
+        signature = OTAPackage.load_signature(path)
+    return package, signature, None
+
+
+def _make_verifier(args, buffer_pool=None):
+    from .verifier import DEFAULT_MAX_WORKERS, Verifier
+    return Verifier(args.key, max_workers=args.workers or DEFAULT_MAX_WORKERS,
+                    buffer_pool=buffer_pool)
+
+
+def _check_signature(verifier, package, signature: Optional[bytes]) -> bool:
+    """Check the package signature if the verifier has a key."""
+    if verifier.public_key_pem is None:
+        return True
+    if signature is not None:
+        valid = verifier.verify_manifest(package, signature)
+    elif package.root_signature:
+        valid = verifier.verify_package_root(package)
+    else:
+        print("Package is not signed")
+        return False
+    if not valid:
+        print("Package signature is invalid")
+    return valid
+
+
+def cmd_verify(args) -> int:
+    from .updater import Updater
+
+    package, signature, opened = load_package(args.manifest)
+    try:
+        verifier = _make_verifier(args)
+        if not _check_signature(verifier, package, signature):
+            return 1
+        summary = Updater(verifier).verify_package(package, strict=args.strict)
+    finally:
+        if opened is not None:
+            opened.close()
+
+    if args.json:
+        print(json.dumps({'package_id': package.package_id, 'version': package.version,
+                          **summary.to_dict()}, indent=2))
+    else:
+        for result in summary.failures:
+            detail = f" ({result.error})" if result.error else ""
+            print(f"{result.status}: {result.path}{detail}")
+        if summary.skipped:
+            print(f"{len(summary.skipped)} files not checked after the first failure")
+        print(f"{package.package_id} {package.version}: {summary.passed} of "
+              f"{summary.checked} checked files ok")
+    # Files left unchecked once verification stopped are not failures
+    return 1 if summary.failures else 0
+
+
+def cmd_apply(args) -> int:
+    from datetime import datetime
+    from .updater import Updater
+
+    if not os.path.isdir(args.target):
+        print(f"Target directory {args.target} does not exist")
+        return 1
+    if args.no_signature_check:
+        print("Warning: installing without checking the package signature")
+    buffer_pool = None
+    if args.memory_limit:
+        from .buffer_pool import BufferPool
+        buffer_pool = BufferPool.for_budget(args.memory_limit)
+
+    package, signature, opened = load_package(args.manifest)
+    try:
+        verifier = _make_verifier(args, buffer_pool)
+        if not _check_signature(verifier, package, signature):
+            return 1
+        updater = Updater(verifier, args.backup_dir, backup_mode=args.backup_mode,
+                          streaming_install=True, journal_path=args.journal,
+                          buffer_pool=buffer_pool)
+        success = updater.apply_update(package, args.target)
+    finally:
+        if opened is not None:
+            opened.close()
+
+    print(f"Update {package.package_id} {package.version}: "
+          f"{'applied' if success else 'failed, rolled back'}")
+    if success and args.state:
+        from .vehicle import Vehicle
+        vehicle = Vehicle.load_state(args.state)
+        vehicle.record_update(package.package_id, package.version,
+                              datetime.now().isoformat(timespec='seconds'))
+        vehicle.save_state(args.state)
+    return 0 if success else 1
+
+
+def cmd_rollback(args) -> int:
+    if args.journal:
+        from .updater import RECOVERY_NONE, RecoveryError, Updater
+        from .verifier import Verifier
+        try:
+            # Rolls back from the backup directory recorded in the journal
+            outcome = Updater(Verifier(), args.backup_dir, journal_path=args.journal).recover()
+        except RecoveryError as e:
+            print(f"Rollback failed: {e}")
+            return 1
+        if outcome == RECOVERY_NONE:
+            print("No interrupted update to roll back")
+            return 1
+        print("Interrupted update rolled back")
+        return 0
+
+    from .rollback import RollbackManager
+    manager = RollbackManager(args.snapshot_dir)
+    if not manager.rollback_to_snapshot(args.snapshot, args.target,
+                                        differential=args.differential):
+        return 1
+    print(f"Restored {args.target} from snapshot {args.snapshot}")
+    return 0
+
+
+def cmd_snapshot(args) -> int:
+    from .rollback import RollbackManager
+    manager = RollbackManager(args.snapshot_dir, content_addressed=args.content_addressed)
+    if args.action == 'create':
+        snapshot_id = manager.create_snapshot(args.target, args.id)
+        print(f"Created snapshot {snapshot_id}")
+    elif args.action == 'delete':
+        if not manager.delete_snapshot(args.id):
+            print(f"Snapshot {args.id} not found")
+            return 1
+        print(f"Deleted snapshot {args.id}")
+    else:
+        for snapshot_id in manager.list_snapshots():
+            info = manager.snapshot_info(snapshot_id) or {}
+            print(f"{snapshot_id}\t{info.get('files', '?')} files\t{info.get('size', '?')} bytes")
+    return 0
+
+
+def cmd_status(args) -> int:
+    status = {}
+    if args.journal:
+        from .journal import UpdateJournal
+        state = UpdateJournal(args.journal).replay()
+        begin = state.begin or {}
+        status['update'] = {
+            'package_id': begin.get('package_id'),
+            'version': begin.get('version'),
+            'target_dir': begin.get('target_dir'),
+            'in_progress': state.in_progress,
+            'outcome': state.outcome,
+            'phases_done': sorted(state.phases),
+            'files_installed': len(state.installed),
+            'steps_done': sorted(state.steps),
+        }
+    if args.state:
+        from .vehicle import Vehicle
+        vehicle = Vehicle.load_state(args.state)
+        status['vehicle'] = {'vehicle_id': vehicle.vehicle_id,
+                             'current_version': vehicle.current_version,
+                             'updates': len(vehicle.update_history)}
+    if args.snapshot_dir:
+        from .rollback import SnapshotCatalog, CATALOG_FILE
+        catalog = SnapshotCatalog(os.path.join(args.snapshot_dir, CATALOG_FILE))
+        status['snapshots'] = sorted(catalog.entries)
+
+    if args.json:
+        print(json.dumps(status, indent=2))
+        return 0
+    if not status:
+        print("Nothing to report; pass --journal, --state or --snapshot-dir")
+    for section, values in status.items():
+        print(f"{section}:")
+        if isinstance(values, dict):
+            for key, value in values.items():
+                print(f"  {key}: {value}")
+        else:
+            for value in values:
+                print(f"  {value}")
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog='ota', description="Verify and apply OTA updates.")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    verify = commands.add_parser('verify', help="Check a package's signature and file hashes")
+    verify.add_argument('manifest', help="JSON or compact manifest, or package container")
+    verify.add_argument('--key', help="Public key; without one only hashes are checked")
+    verify.add_argument('--strict', action='store_true', help="Bypass the hash cache")
+    verify.add_argument('--workers', type=int, help="Hashing threads")
+    verify.add_argument('--json', action='store_true', help="Print results as JSON")
+    verify.set_defaults(func=cmd_verify)
+
+    apply = commands.add_parser('apply', help="Install a package into a target directory")
+    apply.add_argument('manifest', help="JSON or compact manifest, or package container")
+    apply.add_argument('target', help="Directory to update")
+    trust = apply.add_mutually_exclusive_group(required=True)
+    trust.add_argument('--key', help="Public key to check the package signature with")
+    trust.add_argument('--no-signature-check', action='store_true',
+                       help="Install without checking the signature (prints a warning)")
+    apply.add_argument('--backup-dir', default=DEFAULT_BACKUP_DIR)
+    apply.add_argument('--backup-mode', choices=('full', 'incremental'), default='full')
+    apply.add_argument('--journal', help="Write-ahead journal; resumes an interrupted update")
+    apply.add_argument('--memory-limit', type=int, help="Cap I/O buffer memory (bytes)")
+    apply.add_argument('--workers', type=int, help="Hashing threads")
+    apply.add_argument('--state', help="Vehicle state file to record the update in")
+    apply.set_defaults(func=cmd_apply)
+
+    rollback = commands.add_parser('rollback', help="Restore a snapshot or undo an interrupted update")
+    rollback.add_argument('target', nargs='?', help="Directory to restore")
+    source = rollback.add_mutually_exclusive_group(required=True)
+    source.add_argument('--snapshot', help="Snapshot ID to restore")
+    source.add_argument('--journal', help="Roll back the interrupted update in this journal")
+    rollback.add_argument('--snapshot-dir', default=DEFAULT_SNAPSHOT_DIR)
+    rollback.add_argument('--backup-dir', default=DEFAULT_BACKUP_DIR)
+    rollback.add_argument('--differential', action='store_true',
+                          help="Rewrite only files that differ from the snapshot")
+    rollback.set_defaults(func=cmd_rollback)
+
+    snapshot = commands.add_parser('snapshot', help="Create, list or delete snapshots")
+    snapshot.add_argument('action', choices=('create', 'list', 'delete'))
+    snapshot.add_argument('target', nargs='?', help="Directory to snapshot (create)")
+    snapshot.add_argument('--id', help="Snapshot ID (create, delete)")
+    snapshot.add_argument('--snapshot-dir', default=DEFAULT_SNAPSHOT_DIR)
+    snapshot.add_argument('--content-addressed', action='store_true',
+                          help="Store file contents once across snapshots")
+    snapshot.set_defaults(func=cmd_snapshot)
+
+    status = commands.add_parser('status', help="Show update, vehicle and snapshot state")
+    status.add_argument('--journal', help="Update journal to inspect")
+    status.add_argument('--state', help="Vehicle state file")
+    status.add_argument('--snapshot-dir', help="Snapshot directory")
+    status.add_argument('--json', action='store_true', help="Print status as JSON")
+    status.set_defaults(func=cmd_status)
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.command == 'rollback' and args.snapshot and not args.target:
+        parser.error("rollback --snapshot needs a target directory")
+    if args.command == 'snapshot':
+        if args.action == 'create' and not args.target:
+            parser.error("snapshot create needs a target directory")
+        if args.action == 'delete' and not args.id:
+            parser.error("snapshot delete needs --id")
+    try:
+        return args.func(args)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}")
+        return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,355 @@
+"""
+Compact Manifest Module
+
+Indexed binary manifest format for packages with very many files.
+
+Layout (little-endian):
+    magic b"OTAM", u32 format version, u32 header length, header JSON
+    (every top-level manifest key except 'files'), u64 entry count,
+    u64 hash table slots, hash table of u64 record offsets (0 = empty),
+    then one record per file in manifest order.
+
+Each record is: u16 path length, path, u8 flags, the hash (32 raw bytes
+for lowercase hex SHA256, else u16 length + ASCII), u64 size when it is
+an integer, and u32 length + JSON of any other keys. Files are read
+through mmap, iterated lazily and looked up by path in O(1). A truncated
+or corrupt file raises ValueError when opened or when the damaged record
+is read.
+"""
+
+import hashlib
+import json
+import mmap
+import os
+import re
+import struct
+import tempfile
+from typing import Dict, Iterator, Optional, Tuple
+from .ota_package import OTAPackage, DeltaPackage
+
+MAGIC = b"OTAM"
+FORMAT_VERSION = 1
+
+_FLAG_RAW_HASH = 0x01
+_FLAG_INT_SIZE = 0x02
+
+_PREAMBLE = struct.Struct("<4sII")
+_COUNTS = struct.Struct("<QQ")
+_U8 = struct.Struct("<B")
+_U16 = struct.Struct("<H")
+_U32 = struct.Struct("<I")
+_U64 = struct.Struct("<Q")
+
+_RAW_HASH = re.compile(r"[0-9a-f]{64}\Z")
+
+
+def _slot_hash(path: bytes) -> int:
+    return int.from_bytes(hashlib.blake2b(path, digest_size=8).digest(), 'little')
+
+
+def _is_raw_hash(value) -> bool:
+    return isinstance(value, str) and _RAW_HASH.match(value) is not None
+
+
+class FileEntry:
+    """One manifest file entry; reads like the dict it was built from."""
+
+    __slots__ = ('path', 'hash', 'size', 'extra')
+
+    def __init__(self, path: str, hash: str, size=None, extra: Optional[Dict] = None):
+        self.path = path
+        self.hash = hash
+        self.size = size
+        self.extra = extra
+
+    def __getitem__(self, key: str):
+        if key == 'path':
+            return self.path
+        if key == 'hash':
+            return self.hash
+        if key == 'size' and self.size is not None:
+            return self.size
+        if self.extra and key in self.extra:
+            return self.extra[key]
+        raise KeyError(key)
+
+    def get(self, key: str, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __contains__(self, key: str) -> bool:
+        return self.get(key, _MISSING) is not _MISSING
+
+    def keys(self):
+        return self.to_dict().keys()
+
+    def to_dict(self) -> Dict:
+        """Convert entry to a manifest file dictionary."""
+        data = {'path': self.path, 'hash': self.hash}
+        if self.size is not None:
+            data['size'] = self.size
+        if self.extra:
+            data.update(self.extra)
+        return data
+
+    def __repr__(self) -> str:
+        return f"FileEntry({self.path!r})"
+
+
+_MISSING = object()
+
+
+def _encode_record(file_info: Dict) -> bytes:
+    path = file_info['path'].encode('utf-8')
+    file_hash = file_info['hash']
+    size = file_info.get('size')
+    extra = {k: v for k, v in file_info.items() if k not in ('path', 'hash', 'size')}
+
+    flags = 0
+    parts = [_U16.pack(len(path)), path, b""]
+    if _is_raw_hash(file_hash):
+        flags |= _FLAG_RAW_HASH
+        parts.append(bytes.fromhex(file_hash))
+    else:
+        encoded = file_hash.encode('ascii')
+        parts.extend([_U16.pack(len(encoded)), encoded])
+    if isinstance(size, int) and not isinstance(size, bool) and size >= 0:
+        flags |= _FLAG_INT_SIZE
+        parts.append(_U64.pack(size))
+    elif 'size' in file_info:
+        extra['size'] = size
+    encoded_extra = json.dumps(extra, separators=(',', ':')).encode('utf-8') if extra else b""
+    parts.extend([_U32.pack(len(encoded_extra)), encoded_extra])
+    parts[2] = _U8.pack(flags)
+    return b"".join(parts)
+
+
+def write_compact_manifest(manifest: Dict, path: str):
+    """Write a manifest dictionary (``to_manifest`` output) in compact form."""
+    header = json.dumps({k: v for k, v in manifest.items() if k != 'files'},
+                        separators=(',', ':')).encode('utf-8')
+    files = manifest['files']
+    slots = 8
+    while slots < 2 * len(files):
+        slots *= 2
+
+    table_start = _PREAMBLE.size + len(header) + _COUNTS.size
+    offset = table_start + slots * _U64.size
+    table = [0] * slots
+    seen = set()
+
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.manifest_')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(_PREAMBLE.pack(MAGIC, FORMAT_VERSION, len(header)))
+            f.write(header)
+            f.write(_COUNTS.pack(len(files), slots))
+            f.seek(offset)
+            for file_info in files:
+                if isinstance(file_info, FileEntry):
+                    file_info = file_info.to_dict()
+                if file_info['path'] in seen:
+                    raise ValueError(f"Duplicate path in manifest: {file_info['path']}")
+                seen.add(file_info['path'])
+                key = file_info['path'].encode('utf-8')
+                slot = _slot_hash(key) & (slots - 1)
+                while table[slot]:
+                    slot = (slot + 1) & (slots - 1)
+                table[slot] = offset
+                record = _encode_record(file_info)
+                f.write(record)
+                offset += len(record)
+            f.seek(table_start)
+            f.write(struct.pack(f"<{slots}Q", *table))
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+        raise
+
+
+class CompactManifest:
+    """Read-only view of a compact manifest file.
+
+    Exposes ``package_id``, ``version``, ``merkle_root``,
+    ``root_signature``, ``files`` and ``payload_files()`` like
+    ``OTAPackage``, so the updater can verify and apply it while streaming
+    over the entries instead of materializing them.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, 'rb')
+        try:
+            self._data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise ValueError(f"Not a compact manifest: {path}")
+
+        if len(self._data) < _PREAMBLE.size or \
+                _PREAMBLE.unpack_from(self._data, 0)[:2] != (MAGIC, FORMAT_VERSION):
+            self.close()
+            raise ValueError(f"Not a compact manifest: {path}")
+        try:
+            self._read_layout()
+        except (struct.error, ValueError, KeyError, TypeError) as e:
+            self.close()
+            raise ValueError(f"Corrupt compact manifest {path}: {e}") from e
+
+    def _read_layout(self):
+        (header_len,) = _U32.unpack_from(self._data, 8)
+        offset = _PREAMBLE.size
+        self.header: Dict = json.loads(self._data[offset:offset + header_len])
+        offset += header_len
+        self._count, self._slots = _COUNTS.unpack_from(self._data, offset)
+        self._table_start = offset + _COUNTS.size
+        self._records_start = self._table_start + self._slots * _U64.size
+        if not self._slots or self._slots & (self._slots - 1):
+            raise ValueError(f"hash table size {self._slots} is not a power of two")
+        if self._records_start > len(self._data):
+            raise ValueError("hash table runs past the end of the file")
+
+        self.package_id = self.header['package_id']
+        self.version = self.header['version']
+
+    def close(self):
+        self._data.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    def __len__(self) -> int:
+        return self._count
+
+    @property
+    def merkle_root(self) -> Optional[str]:
+        return self.header.get('merkle_root')
+
+    @property
+    def root_signature(self) -> Optional[str]:
+        return self.header.get('root_signature')
+
+    @property
+    def is_delta(self) -> bool:
+        return self.header.get('type') == 'delta'
+
+    def manifest_header(self) -> Dict:
+        """Return the manifest dictionary without its file entries."""
+        return dict(self.header)
+
+    def digest(self) -> str:
+        """Return the SHA256 of the manifest file, hashed in place."""
+        with memoryview(self._data) as view:
+            return hashlib.sha256(view).hexdigest()
+
+    # Payload files live under the package_id directory, as for OTAPackage
+    open_payload = OTAPackage.open_payload
+    payload_mode = OTAPackage.payload_mode
+
+    @property
+    def files(self) -> 'CompactManifest':
+        """Iterable over file entries (the manifest itself)."""
+        return self
+
+    def __iter__(self) -> Iterator[FileEntry]:
+        offset = self._records_start
+        for _ in range(self._count):
+            entry, offset = self._read_record(offset)
+            yield entry
+
+    def payload_files(self) -> Iterator[Tuple[str, str]]:
+        """Yield (relative path, hash) of each payload file."""
+        for entry in self:
+            yield entry.path, entry.hash
+
+    def get(self, path: str) -> Optional[FileEntry]:
+        """Look up a file entry by path."""
+        key = path.encode('utf-8')
+        slot = _slot_hash(key) & (self._slots - 1)
+        for _ in range(self._slots):
+            (offset,) = _U64.unpack_from(self._data, self._table_start + slot * _U64.size)
+            if not offset:
+                return None
+            if offset + _U16.size > len(self._data):
+                raise ValueError(f"Corrupt compact manifest hash table entry: {offset}")
+            (path_len,) = _U16.unpack_from(self._data, offset)
+            if self._data[offset + 2:offset + 2 + path_len] == key:
+                return self._read_record(offset)[0]
+            slot = (slot + 1) & (self._slots - 1)
+        return None
+
+    def __contains__(self, path: str) -> bool:
+        return self.get(path) is not None
+
+    def _read_record(self, offset: int) -> Tuple[FileEntry, int]:
+        try:
+            entry, end = self._parse_record(offset)
+        except (struct.error, ValueError) as e:
+            raise ValueError(f"Corrupt compact manifest record at offset {offset}: {e}") from e
+        if end > len(self._data):
+            raise ValueError(f"Truncated compact manifest record at offset {offset}")
+        return entry, end
+
+    def _parse_record(self, offset: int) -> Tuple[FileEntry, int]:
+        data = self._data
+        (path_len,) = _U16.unpack_from(data, offset)
+        offset += 2
+        path = data[offset:offset + path_len].decode('utf-8')
+        offset += path_len
+        (flags,) = _U8.unpack_from(data, offset)
+        offset += 1
+        if flags & _FLAG_RAW_HASH:
+            file_hash = data[offset:offset + 32].hex()
+            offset += 32
+        else:
+            (hash_len,) = _U16.unpack_from(data, offset)
+            offset += 2
+            file_hash = data[offset:offset + hash_len].decode('ascii')
+            offset += hash_len
+        size = None
+        if flags & _FLAG_INT_SIZE:
+            (size,) = _U64.unpack_from(data, offset)
+            offset += 8
+        (extra_len,) = _U32.unpack_from(data, offset)
+        offset += 4
+        extra = None
+        if extra_len:
+            extra = json.loads(data[offset:offset + extra_len])
+            offset += extra_len
+            if 'size' in extra:
+                size = extra['size']
+        return FileEntry(path, file_hash, size, extra or None), offset
+
+    def to_manifest(self) -> Dict:
+        """Return the equivalent JSON manifest dictionary."""
+        manifest = dict(self.header)
+        manifest['files'] = [entry.to_dict() for entry in self]
+        return manifest
+
+    def to_package(self) -> OTAPackage:
+        """Materialize a regular ``OTAPackage`` (or ``DeltaPackage``)."""
+        if self.is_delta:
+            return DeltaPackage.from_dict(self.to_manifest())
+        return OTAPackage.from_dict(self.to_manifest())
+
+
+def convert_json_to_compact(json_path: str, compact_path: str):
+    """Convert a JSON manifest file to compact form."""
+    with open(json_path, 'r') as f:
+        write_compact_manifest(json.load(f), compact_path)
+
+
+def convert_compact_to_json(compact_path: str, json_path: str):
+    """Convert a compact manifest back to the JSON ``save_manifest`` format."""
+    with CompactManifest(compact_path) as manifest:
+        data = manifest.to_manifest()
+    with open(json_path, 'w') as f:
+        json.dump(data, f, indent=2)
@@ -0,0 +1,384 @@
+"""
+Container Module
+
+Single-file OTA package container with individually compressed members.
+
+Layout (little-endian):
+    magic b"OTAC", u32 format version,
+    member data back to back (stored, zlib or lzma streams),
+    index JSON: manifest, optional base64 signature, and for every
+    member [offset, stored size, size, method, mode],
+    footer: u64 index offset, u64 index length, magic b"OTAC".
+
+The index is found from the footer, so opening a container reads only
+the index. Members are read from an mmap and decompressed as a stream,
+one bounded buffer at a time, without unpacking the archive.
+"""
+
+import base64
+import io
+import json
+import lzma
+import mmap
+import os
+import stat
+import struct
+import tempfile
+import zlib
+from typing import Dict, Iterator, List, Optional
+from .buffer_pool import BufferPool
+from .ota_package import OTAPackage, DeltaPackage
+
+MAGIC = b"OTAC"
+FORMAT_VERSION = 1
+
+METHOD_STORE = "store"
+METHOD_ZLIB = "zlib"
+METHOD_LZMA = "lzma"
+METHODS = (METHOD_STORE, METHOD_ZLIB, METHOD_LZMA)
+
+# Compressed bytes fed to a decompressor at a time
+INPUT_CHUNK = 64 * 1024
+COPY_CHUNK = 1024 * 1024
+
+_HEADER = struct.Struct("<4sI")
+_FOOTER = struct.Struct("<QQ4s")
+
+
+class ContainerError(OSError):
+    """A container member could not be decoded."""
+
+
+class MemberInfo:
+    """Location and encoding of one member inside a container."""
+
+    __slots__ = ('path', 'offset', 'stored_size', 'size', 'method', 'mode')
+
+    def __init__(self, path: str, offset: int, stored_size: int, size: int,
+                 method: str, mode: int):
+        self.path = path
+        self.offset = offset
+        self.stored_size = stored_size
+        self.size = size
+        self.method = method
+        self.mode = mode
+
+    def to_list(self) -> List:
+        return [self.offset, self.stored_size, self.size, self.method, self.mode]
+
+
+def _safe_member_path(rel_path: str) -> bool:
+    """Whether a member path stays below the directory it is extracted to."""
+    if not rel_path or os.path.isabs(rel_path) or os.path.splitdrive(rel_path)[0]:
+        return False
+    parts = rel_path.replace('\\', '/').split('/')
+    return parts[0] != '' and '..' not in parts
+
+
+def _member_problem(info: MemberInfo, data_end: int) -> Optional[str]:
+    """Describe why an index entry cannot be read, or return None if it can."""
+    fields = (info.offset, info.stored_size, info.size, info.mode)
+    if not all(isinstance(field, int) and not isinstance(field, bool) for field in fields):
+        return "non-integer field"
+    if info.method not in METHODS:
+        return f"unknown method {info.method!r}"
+    if info.stored_size < 0 or info.size < 0:
+        return "negative size"
+    if info.offset < _HEADER.size or info.offset + info.stored_size > data_end:
+        return "data lies outside the member area"
+    if info.method == METHOD_STORE and info.stored_size != info.size:
+        return "stored size differs from size"
+    return None
+
+
+def _compressor(method: str, level: Optional[int]):
+    if method == METHOD_ZLIB:
+        return zlib.compressobj(6 if level is None else level)
+    if method == METHOD_LZMA:
+        return lzma.LZMACompressor(preset=6 if level is None else level)
+    return None
+
+
+def _write_member(out, src_path: str, method: str, level: Optional[int]) -> MemberInfo:
+    """Append one file to ``out``, falling back to storing it if compression does not help."""
+    offset = out.tell()
+    st = os.stat(src_path)
+    compressor = _compressor(method, level)
+    with open(src_path, 'rb') as src:
+        if compressor is not None:
+            for chunk in iter(lambda: src.read(COPY_CHUNK), b""):
+                out.write(compressor.compress(chunk))
+            out.write(compressor.flush())
+            if out.tell() - offset < st.st_size:
+                return MemberInfo('', offset, out.tell() - offset, st.st_size, method,
+                                  stat.S_IMODE(st.st_mode))
+            out.seek(offset)
+            out.truncate()
+            src.seek(0)
+        for chunk in iter(lambda: src.read(COPY_CHUNK), b""):
+            out.write(chunk)
+    return MemberInfo('', offset, out.tell() - offset, st.st_size, METHOD_STORE,
+                      stat.S_IMODE(st.st_mode))
+
+
+def write_container(package: OTAPackage, path: str, payload_dir: Optional[str] = None,
+                    method: str = METHOD_ZLIB, level: Optional[int] = None,
+                    signature: Optional[bytes] = None):
+    """Pack a package's manifest and payload files into one container file.
+
+    Payload files are read from ``payload_dir`` (default: the package ID
+    directory). ``signature`` is a detached manifest signature to embed.
+    """
+    if method not in METHODS:
+        raise ValueError(f"Unknown compression method: {method}")
+    if isinstance(package, DeltaPackage):
+        raise ValueError("Delta packages cannot be stored in a container")
+    payload_dir = package.package_id if payload_dir is None else payload_dir
+
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.container_')
+    try:
+        with os.fdopen(fd, 'w+b') as out:
+            out.write(_HEADER.pack(MAGIC, FORMAT_VERSION))
+            members: Dict[str, List] = {}
+            for rel_path, _ in package.payload_files():
+                if rel_path in members:
+                    raise ValueError(f"Duplicate path in manifest: {rel_path}")
+                info = _write_member(out, os.path.join(payload_dir, rel_path), method, level)
+                members[rel_path] = info.to_list()
+
+            index = {'manifest': package.to_manifest(), 'members': members}
+            if signature is not None:
+                index['signature'] = base64.b64encode(signature).decode('ascii')
+            encoded = json.dumps(index, separators=(',', ':')).encode('utf-8')
+            index_offset = out.tell()
+            out.write(encoded)
+            out.write(_FOOTER.pack(index_offset, len(encoded), MAGIC))
+            out.flush()
+            os.fsync(out.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+        raise
+
+
+class MemberReader(io.RawIOBase):
+    """Readable, seekable stream over one (possibly compressed) member.
+
+    Compressed members are decompressed incrementally with output capped
+    at the caller's buffer size; seeking backwards restarts decompression.
+    Seeking forwards decompresses and drops the skipped bytes
+    ``INPUT_CHUNK`` at a time, without a buffer of its own.
+    """
+
+    def __init__(self, data: mmap.mmap, info: MemberInfo):
+        super().__init__()
+        self._data = data
+        self.info = info
+        self._start = info.offset
+        self._end = info.offset + info.stored_size
+        self._reset()
+
+    def _reset(self):
+        self._pos = 0
+        self._in_pos = self._start
+        self._tail = b""
+        if self.info.method == METHOD_ZLIB:
+            self._decompressor = zlib.decompressobj()
+        elif self.info.method == METHOD_LZMA:
+            self._decompressor = lzma.LZMADecompressor()
+        else:
+            self._decompressor = None
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._pos
+
+    def _next_input(self) -> bytes:
+        chunk = self._data[self._in_pos:min(self._in_pos + INPUT_CHUNK, self._end)]
+        self._in_pos += len(chunk)
+        return chunk
+
+    def readinto(self, buffer) -> int:
+        want = len(buffer)
+        if not want or self._pos >= self.info.size:
+            return 0
+
+        if self._decompressor is None:
+            start = self._start + self._pos
+            data = self._data[start:min(start + want, self._start + self.info.size, self._end)]
+            if not data:
+                raise ContainerError(f"Container member {self.info.path} is truncated")
+            n = len(data)
+            buffer[:n] = data
+            self._pos += n
+            return n
+
+        out = self._decompress(want)
+        n = len(out)
+        buffer[:n] = out
+        self._pos += n
+        return n
+
+    def _decompress(self, want: int) -> bytes:
+        """Return up to ``want`` (at least one) more decompressed bytes."""
+        while True:
+            try:
+                if self.info.method == METHOD_ZLIB:
+                    feed = self._tail or self._next_input()
+                    out = self._decompressor.decompress(feed, want)
+                    self._tail = self._decompressor.unconsumed_tail
+                    exhausted = not feed
+                else:
+                    feed = self._next_input() if self._decompressor.needs_input else b""
+                    out = self._decompressor.decompress(feed, want)
+                    exhausted = self._decompressor.eof or (not feed and self._decompressor.needs_input)
+            except (zlib.error, lzma.LZMAError) as e:
+                raise ContainerError(f"Container member {self.info.path} is corrupt: {e}")
+            if out:
+                return out
+            if exhausted:
+                raise ContainerError(f"Container member {self.info.path} is truncated")
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self._pos
+        elif whence == io.SEEK_END:
+            offset += self.info.size
+        offset = max(0, min(offset, self.info.size))
+        if self._decompressor is None:
+            self._pos = offset
+            return offset
+        if offset < self._pos:
+            self._reset()
+        while self._pos < offset:
+            self._pos += len(self._decompress(min(INPUT_CHUNK, offset - self._pos)))
+        return self._pos
+
+
+class PackageContainer:
+    """Read-only access to a container file."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, 'rb')
+        try:
+            self._data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise ValueError(f"Not a package container: {path}")
+
+        size = len(self._data)
+        if size < _HEADER.size + _FOOTER.size:
+            self.close()
+            raise ValueError(f"Not a package container: {path}")
+        magic, version = _HEADER.unpack_from(self._data, 0)
+        index_offset, index_length, end_magic = _FOOTER.unpack_from(self._data, size - _FOOTER.size)
+        if magic != MAGIC or end_magic != MAGIC or version != FORMAT_VERSION:
+            self.close()
+            raise ValueError(f"Not a package container: {path}")
+
+        # The index is not covered by the signature, so nothing in it is trusted
+        try:
+            index = json.loads(self._data[index_offset:index_offset + index_length])
+            self.manifest: Dict = index['manifest']
+            self.signature: Optional[bytes] = (
+                base64.b64decode(index['signature']) if 'signature' in index else None
+            )
+            self.members: Dict[str, MemberInfo] = {
+                member_path: MemberInfo(member_path, *fields)
+                for member_path, fields in index['members'].items()
+            }
+        except (ValueError, KeyError, TypeError, AttributeError) as e:
+            self.close()
+            raise ValueError(f"Corrupt package container index in {path}: {e}") from e
+        for info in self.members.values():
+            if not _safe_member_path(info.path):
+                self.close()
+                raise ValueError(f"Unsafe member path {info.path!r} in {path}")
+            problem = _member_problem(info, index_offset)
+            if problem:
+                self.close()
+                raise ValueError(f"Corrupt member {info.path!r} in {path}: {problem}")
+
+    def close(self):
+        self._data.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    def __iter__(self) -> Iterator[MemberInfo]:
+        return iter(self.members.values())
+
+    def open_member(self, rel_path: str) -> MemberReader:
+        """Open a member for streaming reads."""
+        info = self.members.get(rel_path)
+        if info is None:
+            raise FileNotFoundError(f"No member {rel_path} in {self.path}")
+        return MemberReader(self._data, info)
+
+    def read_member(self, rel_path: str) -> bytes:
+        """Return a member's full decompressed content."""
+        with self.open_member(rel_path) as reader:
+            return reader.read()
+
+    def to_package(self) -> 'ContainerPackage':
+        """Return the package, reading its payload from this container."""
+        package = ContainerPackage(self, self.manifest['package_id'], self.manifest['version'],
+                                   self.manifest['files'])
+        package._load_optional_fields(self.manifest)
+        return package
+
+    def extract(self, output_dir: str, buffer_pool: Optional[BufferPool] = None):
+        """Unpack every member below ``output_dir``.
+
+        With ``buffer_pool`` set, members are decompressed into a pooled
+        buffer instead of freshly allocated ``COPY_CHUNK`` reads.
+        """
+        for info in self:
+            dst = os.path.join(output_dir, info.path)
+            os.makedirs(os.path.dirname(dst) or '.', exist_ok=True)
+            with self.open_member(info.path) as src, open(dst, 'wb') as out:
+                if buffer_pool is None:
+                    for chunk in iter(lambda: src.read(COPY_CHUNK), b""):
+                        out.write(chunk)
+                else:
+                    with buffer_pool.buffer() as buffer:
+                        view = memoryview(buffer)
+                        for n in iter(lambda: src.readinto(buffer), 0):
+                            out.write(view[:n])
+            os.chmod(dst, info.mode)
+
+
+class ContainerPackage(OTAPackage):
+    """An ``OTAPackage`` whose payload files live in a ``PackageContainer``.
+
+    The updater verifies and installs these by streaming members through
+    ``open_payload``. There is no ``package_id`` directory on disk, so
+    update steps must not read payload files from it.
+    """
+
+    def __init__(self, container: PackageContainer, package_id: str, version: str,
+                 files: List[Dict]):
+        super().__init__(package_id, version, files)
+        self.container = container
+
+    def open_payload(self, rel_path: str):
+        return self.container.open_member(rel_path)
+
+    def payload_mode(self, rel_path: str) -> int:
+        info = self.container.members.get(rel_path)
+        if info is None:
+            raise FileNotFoundError(f"No member {rel_path} in {self.container.path}")
+        return info.mode
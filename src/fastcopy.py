@@ -0,0 +1,331 @@
+"""
+Fast Copy Module
+
+Copies and synchronizes directory trees with a pool of worker threads.
+
+Trees are walked with ``os.scandir``; directories and symlinks are
+created by the walking thread and file data is copied concurrently,
+which hides per-file syscall latency on trees of many small files.
+Each file is copied with the cheapest mechanism the kernel supports:
+a reflink, ``copy_file_range``, ``sendfile``, then plain reads/writes.
+"""
+
+import errno
+import os
+import shutil
+import stat
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional, Tuple
+from .buffer_pool import BufferPool
+from .metrics import Metrics
+from .ota_package import calculate_file_hash
+
+DEFAULT_COPY_WORKERS = 8
+
+# ioctl request number for FICLONE on Linux
+_FICLONE = 0x40049409
+
+# Errors meaning "this mechanism is not available here", as opposed to
+# a real I/O failure that should propagate.
+_UNSUPPORTED = {
+    errno.ENOSYS, errno.EXDEV, errno.EINVAL, errno.EOPNOTSUPP, errno.ENOTTY,
+    errno.EBADF, errno.EPERM, getattr(errno, 'ENOTSUP', errno.EOPNOTSUPP)
+}
+
+# (source device, destination device) pairs known not to support a mechanism
+_no_reflink = set()
+_no_copy_range = set()
+_no_sendfile = set()
+_support_lock = threading.Lock()
+
+
+def _mark_unsupported(cache: set, devices: Tuple[int, int]):
+    with _support_lock:
+        cache.add(devices)
+
+
+def _try_reflink(src_fd: int, dst_fd: int) -> bool:
+    try:
+        import fcntl
+        fcntl.ioctl(dst_fd, _FICLONE, src_fd)
+        return True
+    except ImportError:
+        return False
+
+
+def _try_copy_range(src_fd: int, dst_fd: int, size: int) -> int:
+    copied = 0
+    while copied < size:
+        n = os.copy_file_range(src_fd, dst_fd, size - copied)
+        if n == 0:
+            break
+        copied += n
+    return copied
+
+
+def _try_sendfile(src_fd: int, dst_fd: int, size: int) -> int:
+    copied = 0
+    while copied < size:
+        n = os.sendfile(dst_fd, src_fd, copied, size - copied)
+        if n == 0:
+            break
+        copied += n
+    return copied
+
+
+def _copy_through(fsrc, fdst, buffer: bytearray):
+    view = memoryview(buffer)
+    while True:
+        n = fsrc.readinto(buffer)
+        if not n:
+            break
+        fdst.write(view[:n])
+
+
+def copy_file(src: str, dst: str, buffer_pool: Optional[BufferPool] = None) -> int:
+    """Copy file data and metadata from ``src`` to ``dst``. Returns bytes copied.
+
+    ``dst`` is created or truncated. Mechanisms that fail with an
+    "unsupported" error are skipped for that pair of filesystems from
+    then on, so the fallback cost is paid once. The read/write fallback
+    borrows its buffer from ``buffer_pool`` when one is given.
+    """
+    with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+        src_fd, dst_fd = fsrc.fileno(), fdst.fileno()
+        src_st = os.fstat(src_fd)
+        size = src_st.st_size
+        devices = (src_st.st_dev, os.fstat(dst_fd).st_dev)
+        done = False
+
+        if size and devices not in _no_reflink:
+            try:
+                done = _try_reflink(src_fd, dst_fd)
+            except OSError as e:
+                if e.errno not in _UNSUPPORTED:
+                    raise
+                _mark_unsupported(_no_reflink, devices)
+
+        if not done and size and hasattr(os, 'copy_file_range') and devices not in _no_copy_range:
+            try:
+                done = _try_copy_range(src_fd, dst_fd, size) == size
+            except OSError as e:
+                if e.errno not in _UNSUPPORTED:
+                    raise
+                _mark_unsupported(_no_copy_range, devices)
+            if not done:
+                os.lseek(src_fd, 0, os.SEEK_SET)
+                os.ftruncate(dst_fd, 0)
+                os.lseek(dst_fd, 0, os.SEEK_SET)
+
+        if not done and size and hasattr(os, 'sendfile') and devices not in _no_sendfile:
+            try:
+                done = _try_sendfile(src_fd, dst_fd, size) == size
+            except OSError as e:
+                if e.errno not in _UNSUPPORTED:
+                    raise
+                _mark_unsupported(_no_sendfile, devices)
+            if not done:
+                os.lseek(src_fd, 0, os.SEEK_SET)
+                os.ftruncate(dst_fd, 0)
+                os.lseek(dst_fd, 0, os.SEEK_SET)
+
+        if not done and size:
+            if buffer_pool is None:
+                shutil.copyfileobj(fsrc, fdst, 1024 * 1024)
+            else:
+                with buffer_pool.buffer() as buffer:
+                    _copy_through(fsrc, fdst, buffer)
+    shutil.copystat(src, dst)
+    return size
+
+
+class CopyStats:
+    """Counts of what a tree copy or sync did."""
+
+    def __init__(self):
+        self.files_copied = 0
+        self.bytes_copied = 0
+        self.files_unchanged = 0
+        self.entries_removed = 0
+        self._lock = threading.Lock()
+
+    def add_copy(self, size: int):
+        with self._lock:
+            self.files_copied += 1
+            self.bytes_copied += size
+
+    def add_unchanged(self):
+        with self._lock:
+            self.files_unchanged += 1
+
+    def to_dict(self):
+        """Convert stats to dictionary."""
+        return {
+            'files_copied': self.files_copied,
+            'bytes_copied': self.bytes_copied,
+            'files_unchanged': self.files_unchanged,
+            'entries_removed': self.entries_removed
+        }
+
+
+class _Pool:
+    """Runs file jobs on a thread pool and re-raises the first failure."""
+
+    def __init__(self, max_workers: int):
+        self.executor = ThreadPoolExecutor(max_workers=max(1, max_workers))
+        self.futures = []
+
+    def submit(self, func: Callable, *args):
+        self.futures.append(self.executor.submit(func, *args))
+
+    def finish(self):
+        try:
+            for future in self.futures:
+                future.result()
+        finally:
+            self.executor.shutdown(wait=True)
+
+
+def _remove(path: str):
+    if os.path.isdir(path) and not os.path.islink(path):
+        shutil.rmtree(path)
+    else:
+        os.unlink(path)
+
+
+def _report(metrics: Optional[Metrics], component: str, stats: CopyStats):
+    if metrics is not None and metrics.enabled:
+        metrics.count('ota_bytes_read_total', stats.bytes_copied, component=component)
+        metrics.count('ota_bytes_written_total', stats.bytes_copied, component=component)
+        metrics.count('ota_files_touched_total', stats.files_copied, component=component)
+
+
+def copy_tree(src: str, dst: str, max_workers: int = DEFAULT_COPY_WORKERS,
+              metrics: Optional[Metrics] = None, component: str = "copy",
+              buffer_pool: Optional[BufferPool] = None) -> CopyStats:
+    """Copy directory ``src`` to a new directory ``dst`` like ``shutil.copytree``.
+
+    Symlinks are copied as symlinks, and file and directory metadata is
+    preserved. Bytes and files copied are counted under ``component``.
+    """
+    stats = CopyStats()
+    pool = _Pool(max_workers)
+    directories: List[Tuple[str, str]] = []
+
+    def copy_one(src_path: str, dst_path: str):
+        stats.add_copy(copy_file(src_path, dst_path, buffer_pool))
+
+    try:
+        os.makedirs(dst)
+        stack = [(src, dst)]
+        while stack:
+            src_dir, dst_dir = stack.pop()
+            directories.append((src_dir, dst_dir))
+            with os.scandir(src_dir) as entries:
+                for entry in entries:
+                    target = os.path.join(dst_dir, entry.name)
+                    if entry.is_symlink():
+                        os.symlink(os.readlink(entry.path), target)
+                    elif entry.is_dir():
+                        os.mkdir(target)
+                        stack.append((entry.path, target))
+                    else:
+                        pool.submit(copy_one, entry.path, target)
+    finally:
+        pool.finish()
+
+    # Directory times change while their contents are written, so set them last
+    for src_dir, dst_dir in reversed(directories):
+        shutil.copystat(src_dir, dst_dir)
+    _report(metrics, component, stats)
+    return stats
+
+
+def sync_tree(src: str, dst: str, max_workers: int = DEFAULT_COPY_WORKERS,
+              compare_hash: bool = False, metrics: Optional[Metrics] = None,
+              component: str = "sync",
+              buffer_pool: Optional[BufferPool] = None) -> CopyStats:
+    """Make ``dst`` an exact copy of ``src``, rewriting only what differs.
+
+    A file is copied when it is missing or its type or size differs, or
+    when its mtime differs (``compare_hash`` unset) or its SHA256 differs
+    (``compare_hash`` set, which also catches edits that kept the mtime).
+    Entries in ``dst`` that are not in ``src`` are removed.
+    """
+    stats = CopyStats()
+    pool = _Pool(max_workers)
+    directories: List[Tuple[str, str]] = []
+
+    def copy_one(src_path: str, dst_path: str):
+        # Never write through an existing inode; it may be a hardlink
+        if os.path.lexists(dst_path):
+            os.unlink(dst_path)
+        stats.add_copy(copy_file(src_path, dst_path, buffer_pool))
+
+    def compare_one(src_path: str, dst_path: str, src_st: os.stat_result):
+        if (calculate_file_hash(src_path, pool=buffer_pool)
+                != calculate_file_hash(dst_path, pool=buffer_pool)):
+            copy_one(src_path, dst_path)
+            return
+        if os.lstat(dst_path).st_mtime_ns != src_st.st_mtime_ns:
+            shutil.copystat(src_path, dst_path)
+        stats.add_unchanged()
+
+    try:
+        if not os.path.isdir(dst) or os.path.islink(dst):
+            if os.path.lexists(dst):
+                os.unlink(dst)
+            os.makedirs(dst)
+        stack = [(src, dst)]
+        while stack:
+            src_dir, dst_dir = stack.pop()
+            directories.append((src_dir, dst_dir))
+            existing = {}
+            with os.scandir(dst_dir) as entries:
+                for entry in entries:
+                    existing[entry.name] = entry
+            with os.scandir(src_dir) as entries:
+                for entry in entries:
+                    target = os.path.join(dst_dir, entry.name)
+                    current = existing.pop(entry.name, None)
+                    if entry.is_symlink():
+                        link = os.readlink(entry.path)
+                        if current is not None:
+                            if current.is_symlink() and os.readlink(target) == link:
+                                continue
+                            _remove(target)
+                        os.symlink(link, target)
+                    elif entry.is_dir():
+                        if current is not None and (current.is_symlink() or not current.is_dir()):
+                            _remove(target)
+                            current = None
+                        if current is None:
+                            os.mkdir(target)
+                        stack.append((entry.path, target))
+                    else:
+                        src_st = entry.stat(follow_symlinks=False)
+                        if current is None or current.is_symlink() or not current.is_file():
+                            if current is not None:
+                                _remove(target)
+                            pool.submit(copy_one, entry.path, target)
+                            continue
+                        dst_st = current.stat(follow_symlinks=False)
+                        if dst_st.st_size != src_st.st_size:
+                            pool.submit(copy_one, entry.path, target)
+                        elif compare_hash:
+                            pool.submit(compare_one, entry.path, target, src_st)
+                        elif dst_st.st_mtime_ns != src_st.st_mtime_ns:
+                            pool.submit(copy_one, entry.path, target)
+                        else:
+                            stats.add_unchanged()
+            for name in existing:
+                _remove(os.path.join(dst_dir, name))
+                stats.entries_removed += 1
+    finally:
+        pool.finish()
+
+    for src_dir, dst_dir in reversed(directories):
+        shutil.copystat(src_dir, dst_dir)
+    _report(metrics, component, stats)
+    return stats
@@ -0,0 +1,483 @@
+"""
+Fetcher Module
+
+Downloads package payload files over HTTP Range requests.
+
+Files are split into ranges fetched in parallel over a bounded pool of
+keep-alive connections. Files with chunk hashes in the manifest are
+fetched chunk by chunk and every chunk is checked as it arrives; every
+file is checked against its full hash before it is moved into place.
+
+Each file downloads into '<dst>.part' with a '<dst>.part.json' progress
+record listing the ranges already written (checkpointed after an fsync),
+so an interrupted fetch resumes where it stopped.
+
+Usage:
+    python -m src.fetcher manifest.json --url http://host:8000/my-package \\
+        --dest my-package --connections 8 --rate-limit 5000000
+"""
+
+import argparse
+import hmac
+import http.client
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import quote, urlsplit
+from .buffer_pool import BufferPool
+from .merkle import leaf_hash, leaf_hasher
+from .metrics import Metrics
+from .ota_package import OTAPackage, calculate_file_hash
+from .verifier import (FileVerificationResult, STATUS_OK, STATUS_MISMATCH,
+                       STATUS_ERROR)
+
+DEFAULT_FETCH_CHUNK = 1024 * 1024
+DEFAULT_CONNECTIONS = 4
+PART_SUFFIX = ".part"
+PROGRESS_SUFFIX = ".part.json"
+# Chunks written between progress checkpoints
+CHECKPOINT_INTERVAL = 16
+READ_BLOCK = 64 * 1024
+
+
+class FetchError(Exception):
+    """A range could not be fetched or did not match the manifest."""
+
+
+class TokenBucket:
+    """Thread-safe byte rate limiter.
+
+    Consumers may overdraw the bucket; the debt is paid by sleeping, so
+    the long-run rate stays at ``rate`` bytes per second.
+    """
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = rate
+        self.capacity = burst if burst is not None else rate
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def consume(self, amount: int):
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            self._tokens -= amount
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if wait:
+            time.sleep(wait)
+
+
+class FetchResult:
+    """Outcome of fetching one package."""
+
+    def __init__(self):
+        self.results: List[FileVerificationResult] = []
+        self.bytes_fetched = 0
+        self.chunks_fetched = 0
+        self.chunks_resumed = 0
+        self.files_skipped = 0
+        self.duration = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return all(result.ok for result in self.results)
+
+    def to_dict(self) -> Dict:
+        return {
+            'ok': self.ok,
+            'files': len(self.results),
+            'failed': [result.path for result in self.results if not result.ok],
+            'bytes_fetched': self.bytes_fetched,
+            'chunks_fetched': self.chunks_fetched,
+            'chunks_resumed': self.chunks_resumed,
+            'files_skipped': self.files_skipped,
+            'duration': round(self.duration, 6),
+        }
+
+
+class _PartialFile:
+    """A '.part' download plus its persisted set of completed chunks.
+
+    The '.part' file is only held open while its chunks are being
+    fetched: it is opened by the first write and closed once the last
+    pending chunk is handled, so a package of many files never holds
+    more descriptors than there are files in flight.
+    """
+
+    def __init__(self, dst_path: str, file_info: Dict, size: int, chunk_size: int):
+        self.dst_path = dst_path
+        self.part_path = dst_path + PART_SUFFIX
+        self.progress_path = dst_path + PROGRESS_SUFFIX
+        self.file_info = file_info
+        self.size = size
+        self.chunk_size = chunk_size
+        self.count = (size + chunk_size - 1) // chunk_size
+        self.done = set()
+        self.failed: Optional[Tuple[str, str]] = None
+        self._unsaved = 0
+        self._lock = threading.Lock()
+        self._fd: Optional[int] = None
+
+        self._load()
+        self._remaining = len(self.pending())  # chunks not yet handled in this run
+
+    def _load(self):
+        try:
+            with open(self.progress_path, 'r') as f:
+                progress = json.load(f)
+        except (OSError, ValueError):
+            return
+        if (progress.get('hash') == self.file_info['hash'] and progress.get('size') == self.size
+                and progress.get('chunk_size') == self.chunk_size
+                and os.path.isfile(self.part_path)):
+            self.done = {index for index in progress.get('done', ()) if 0 <= index < self.count}
+
+    def pending(self) -> List[int]:
+        return [index for index in range(self.count) if index not in self.done]
+
+    def _open(self):
+        if self._fd is None:
+            self._fd = os.open(self.part_path, os.O_RDWR | os.O_CREAT, 0o644)
+            os.ftruncate(self._fd, self.size)
+
+    def _release(self):
+        if self._fd is not None:
+            if self._unsaved:
+                self._checkpoint()
+            os.close(self._fd)
+            self._fd = None
+
+    def write_at(self, offset: int, data):
+        with self._lock:
+            self._open()
+            os.lseek(self._fd, offset, os.SEEK_SET)
+            view = memoryview(data)
+            while view:
+                view = view[os.write(self._fd, view):]
+
+    def mark_done(self, index: int):
+        """Record a chunk whose data has been written and verified."""
+        with self._lock:
+            self.done.add(index)
+            self._unsaved += 1
+            if self._unsaved >= CHECKPOINT_INTERVAL:
+                self._checkpoint()
+
+    def chunk_handled(self):
+        """Count one pending chunk as fetched or given up; close after the last."""
+        with self._lock:
+            self._remaining -= 1
+            if self._remaining <= 0:
+                self._release()
+
+    def fail(self, status: str, error: str):
+        with self._lock:
+            if self.failed is None:
+                self.failed = (status, error)
+
+    def _checkpoint(self):
+        """Make written chunks durable, then record them as done."""
+        os.fsync(self._fd)
+        directory = os.path.dirname(os.path.abspath(self.progress_path))
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.fetch_')
+        with os.fdopen(fd, 'w') as f:
+            json.dump({'hash': self.file_info['hash'], 'size': self.size,
+                       'chunk_size': self.chunk_size, 'done': sorted(self.done)}, f)
+        os.replace(temp_path, self.progress_path)
+        self._unsaved = 0
+
+    def close(self):
+        """Checkpoint and close, leaving a '.part' file of full size behind."""
+        with self._lock:
+            self._open()
+            self._release()
+
+    def discard(self):
+        for path in (self.part_path, self.progress_path):
+            if os.path.exists(path):
+                os.unlink(path)
+
+
+class PackageFetcher:
+    """Fetches a package's payload files from ``base_url``.
+
+    File URLs are ``base_url`` plus the manifest path. At most
+    ``max_connections`` requests are in flight, each worker thread keeping
+    one keep-alive connection. ``rate_limit`` caps the combined download
+    rate in bytes per second. A failed range is retried ``retries`` times.
+
+    Ranges are normally read whole into memory before they are written.
+    With ``buffer_pool`` set they are streamed through a pooled buffer
+    straight into the partial file, so at most the pool's capacity is held
+    in memory whatever the chunk size or connection count.
+    """
+
+    def __init__(self, base_url: str, max_connections: int = DEFAULT_CONNECTIONS,
+                 chunk_size: int = DEFAULT_FETCH_CHUNK, rate_limit: Optional[float] = None,
+                 timeout: float = 30.0, retries: int = 3, metrics: Optional[Metrics] = None,
+                 buffer_pool: Optional[BufferPool] = None):
+        parts = urlsplit(base_url)
+        if parts.scheme not in ('http', 'https'):
+            raise ValueError(f"Unsupported URL: {base_url}")
+        self.scheme = parts.scheme
+        self.netloc = parts.netloc
+        self.base_path = parts.path.rstrip('/')
+        self.max_connections = max(1, max_connections)
+        self.chunk_size = chunk_size
+        self.limiter = TokenBucket(rate_limit) if rate_limit else None
+        self.timeout = timeout
+        self.retries = retries
+        self.metrics = metrics or Metrics()
+        self.buffer_pool = buffer_pool
+        self._local = threading.local()
+        self._connections: List[http.client.HTTPConnection] = []
+        self._connections_lock = threading.Lock()
+
+    def _connection(self) -> http.client.HTTPConnection:
+        """Return this thread's keep-alive connection."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            factory = (http.client.HTTPSConnection if self.scheme == 'https'
+                       else http.client.HTTPConnection)
+            conn = factory(self.netloc, timeout=self.timeout)
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    def _drop_connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def _url_path(self, rel_path: str) -> str:
+        return f"{self.base_path}/{quote(rel_path)}"
+
+    def _request(self, method: str, rel_path: str, headers: Dict[str, str]):
+        conn = self._connection()
+        try:
+            conn.request(method, self._url_path(rel_path), headers=headers)
+            return conn.getresponse()
+        except (OSError, http.client.HTTPException):
+            self._drop_connection()
+            raise
+
+    def remote_size(self, rel_path: str) -> int:
+        """Return a file's size from a HEAD request."""
+        response = self._request('HEAD', rel_path, {})
+        response.read()
+        if response.status != 200:
+            raise FetchError(f"HEAD {rel_path}: HTTP {response.status}")
+        return int(response.getheader('Content-Length'))
+
+    def fetch_range(self, rel_path: str, start: int, end: int) -> bytes:
+        """Return bytes [start, end) of a remote file."""
+        data = bytearray()
+        self.fetch_range_into(rel_path, start, end, bytearray(READ_BLOCK), data.extend)
+        return bytes(data)
+
+    def fetch_range_into(self, rel_path: str, start: int, end: int, buffer: bytearray,
+                         sink: Callable[[memoryview], object]):
+        """Read bytes [start, end) of a remote file through ``buffer``.
+
+        Each filled piece of the buffer is passed to ``sink`` in order.
+        """
+        response = self._request('GET', rel_path, {'Range': f"bytes={start}-{end - 1}"})
+        try:
+            if response.status != 206:
+                response.read()
+                raise FetchError(f"GET {rel_path} [{start}-{end}): HTTP {response.status}")
+            content_range = response.getheader('Content-Range', '')
+            if not content_range.startswith(f"bytes {start}-{end - 1}/"):
+                raise FetchError(f"GET {rel_path}: unexpected Content-Range {content_range!r}")
+            view = memoryview(buffer)
+            remaining = end - start
+            while remaining > 0:
+                n = response.readinto(view[:min(len(view), remaining)])
+                if not n:
+                    raise FetchError(f"GET {rel_path} [{start}-{end}): connection closed early")
+                if self.limiter is not None:
+                    self.limiter.consume(n)
+                sink(view[:n])
+                remaining -= n
+        except (OSError, http.client.HTTPException, FetchError):
+            self._drop_connection()
+            raise
+
+    def _download(self, partial: _PartialFile, rel_path: str, start: int, end: int) -> str:
+        """Write bytes [start, end) into the partial file and return their leaf hash."""
+        if self.buffer_pool is None:
+            data = self.fetch_range(rel_path, start, end)
+            partial.write_at(start, data)
+            return leaf_hash(data)
+        leaf = leaf_hasher()
+        offset = start
+
+        def sink(piece: memoryview):
+            nonlocal offset
+            leaf.update(piece)
+            partial.write_at(offset, piece)
+            offset += len(piece)
+
+        with self.buffer_pool.buffer() as buffer:
+            self.fetch_range_into(rel_path, start, end, buffer, sink)
+        return leaf.hexdigest()
+
+    def _fetch_chunk(self, partial: _PartialFile, index: int, result: FetchResult,
+                     stats_lock: threading.Lock):
+        try:
+            self._get_chunk(partial, index, result, stats_lock)
+        finally:
+            try:
+                partial.chunk_handled()
+            except OSError as e:
+                partial.fail(STATUS_ERROR, str(e))
+
+    def _get_chunk(self, partial: _PartialFile, index: int, result: FetchResult,
+                   stats_lock: threading.Lock):
+        if partial.failed is not None:
+            return
+        rel_path = partial.file_info['path']
+        start = index * partial.chunk_size
+        end = min(start + partial.chunk_size, partial.size)
+        chunks = partial.file_info.get('chunks')
+        error = None
+        for attempt in range(self.retries + 1):
+            try:
+                actual = self._download(partial, rel_path, start, end)
+            except (OSError, http.client.HTTPException, FetchError) as e:
+                error = (STATUS_ERROR, str(e))
+            else:
+                # Unverified bytes may sit in the '.part' file, but a chunk
+                # only counts as done (and survives a resume) once it matches
+                if chunks is None or hmac.compare_digest(actual, chunks[index]):
+                    try:
+                        partial.mark_done(index)
+                    except OSError as e:
+                        partial.fail(STATUS_ERROR, str(e))
+                        return
+                    with stats_lock:
+                        result.bytes_fetched += end - start
+                        result.chunks_fetched += 1
+                    self.metrics.count('ota_fetch_bytes_total', end - start)
+                    self.metrics.count('ota_fetch_chunks_total', 1, result='ok')
+                    return
+                error = (STATUS_MISMATCH, f"chunk {index} does not match")
+            self.metrics.count('ota_fetch_chunks_total', 1, result='retry')
+        partial.fail(*error)
+
+    def _prepare(self, file_info: Dict, dst_path: str,
+                 result: FetchResult) -> Optional[_PartialFile]:
+        """Return the partial download for a file, or None if it is already in place."""
+        if os.path.isfile(dst_path) and hmac.compare_digest(calculate_file_hash(dst_path),
+                                                            file_info['hash']):
+            result.files_skipped += 1
+            return None
+        size = file_info.get('size')
+        size = int(size) if size is not None else self.remote_size(file_info['path'])
+        chunk_size = file_info['chunk_size'] if 'chunks' in file_info else self.chunk_size
+        os.makedirs(os.path.dirname(os.path.abspath(dst_path)), exist_ok=True)
+        partial = _PartialFile(dst_path, file_info, size, chunk_size)
+        if 'chunks' in file_info and len(file_info['chunks']) != partial.count:
+            partial.fail(STATUS_MISMATCH, "chunk count does not match size")
+        return partial
+
+    def _finish(self, partial: _PartialFile, file_result: FileVerificationResult):
+        partial.close()
+        if partial.failed is not None:
+            file_result.status, file_result.error = partial.failed
+            return
+        file_result.actual_hash = calculate_file_hash(partial.part_path)
+        if not hmac.compare_digest(file_result.actual_hash, partial.file_info['hash']):
+            file_result.status = STATUS_MISMATCH
+            partial.discard()
+            return
+        os.replace(partial.part_path, partial.dst_path)
+        if os.path.exists(partial.progress_path):
+            os.unlink(partial.progress_path)
+        file_result.status = STATUS_OK
+
+    def fetch(self, package: OTAPackage, dest_dir: Optional[str] = None) -> FetchResult:
+        """Download every payload file of ``package`` into ``dest_dir``.
+
+        ``dest_dir`` defaults to ``package.package_id``, where the updater
+        expects the payload. Files already present with the right hash are
+        skipped; interrupted downloads resume from their progress record.
+        """
+        dest_dir = package.package_id if dest_dir is None else dest_dir
+        start = time.perf_counter()
+        result = FetchResult()
+        stats_lock = threading.Lock()
+        partials: List[Tuple[_PartialFile, FileVerificationResult]] = []
+
+        try:
+            for file_info in package.files:
+                dst_path = os.path.join(dest_dir, file_info['path'])
+                file_result = FileVerificationResult(dst_path, file_info['hash'])
+                result.results.append(file_result)
+                try:
+                    partial = self._prepare(file_info, dst_path, result)
+                except (OSError, http.client.HTTPException, FetchError) as e:
+                    file_result.status = STATUS_ERROR
+                    file_result.error = str(e)
+                    continue
+                if partial is None:
+                    file_result.status = STATUS_OK
+                    file_result.actual_hash = file_info['hash']
+                    continue
+                result.chunks_resumed += len(partial.done)
+                partials.append((partial, file_result))
+
+            with ThreadPoolExecutor(max_workers=self.max_connections) as pool:
+                futures = [pool.submit(self._fetch_chunk, partial, index, result, stats_lock)
+                           for partial, _ in partials for index in partial.pending()]
+                for future in futures:
+                    future.result()
+
+            for partial, file_result in partials:
+                try:
+                    self._finish(partial, file_result)
+                except OSError as e:
+                    file_result.status = STATUS_ERROR
+                    file_result.error = str(e)
+        finally:
+            with self._connections_lock:
+                for conn in self._connections:
+                    conn.close()
+                self._connections.clear()
+            self._local = threading.local()
+
+        result.duration = time.perf_counter() - start
+        self.metrics.timing('ota_fetch_seconds', result.duration)
+        return result
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Fetch an OTA package payload over HTTP.")
+    parser.add_argument('manifest', help="Package manifest (JSON)")
+    parser.add_argument('--url', required=True, help="Base URL of the payload files")
+    parser.add_argument('--dest', help="Destination directory (default: package ID)")
+    parser.add_argument('--connections', type=int, default=DEFAULT_CONNECTIONS)
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_FETCH_CHUNK)
+    parser.add_argument('--rate-limit', type=float, help="Bytes per second")
+    args = parser.parse_args(argv)
+
+    package = OTAPackage.from_manifest(args.manifest)
+    fetcher = PackageFetcher(args.url, args.connections, args.chunk_size, args.rate_limit)
+    result = fetcher.fetch(package, args.dest)
+    print(json.dumps(result.to_dict(), indent=2))
+    return 0 if result.ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,255 @@
+"""
+Fleet Module
+
+Simulates update campaigns across large fleets of vehicles.
+
+Vehicles are updated by a bounded pool of asyncio workers, stage by
+stage, with configurable per-vehicle latency and failure injection.
+A campaign aborts by itself once its failure rate crosses a threshold.
+"""
+
+import asyncio
+import math
+import random
+import time
+from datetime import datetime
+from typing import Callable, Dict, Iterator, List, Optional, Sequence
+from .fleet_store import FleetStore
+from .metrics import Metrics
+from .ota_package import DeltaPackage, OTAPackage
+from .vehicle import Vehicle
+from .version import package_applies, parse_version, try_parse_version
+
+# Vehicle outcome states
+VEHICLE_UPDATED = "updated"
+VEHICLE_FAILED = "failed"
+VEHICLE_SKIPPED = "skipped"
+VEHICLE_INVALID_VERSION = "invalid_version"
+
+
+def generate_fleet(count: int, version: str = "1.0.0", prefix: str = "VIN") -> List[Vehicle]:
+    """Create ``count`` simulated vehicles running ``version``."""
+    width = len(str(max(count - 1, 0)))
+    return [Vehicle(f"{prefix}{index:0{width}d}", version) for index in range(count)]
+
+
+def percentile(sorted_values: Sequence[float], fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted sequence."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(fraction * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+class CampaignReport:
+    """Outcome, throughput and latency of a fleet campaign."""
+
+    def __init__(self, campaign_id: str, total: int):
+        self.campaign_id = campaign_id
+        self.total = total
+        self.updated = 0
+        self.failed = 0
+        self.skipped = 0
+        self.invalid_versions: List[str] = []  # skipped: current version unparseable
+        self.stages_completed = 0
+        self.aborted = False
+        self.abort_reason: Optional[str] = None
+        self.duration = 0.0
+        self.latencies: List[float] = []
+        self.failed_vehicles: List[str] = []
+        self.errors: Dict[str, str] = {}  # vehicle ID -> exception raised by its update
+
+    @property
+    def attempted(self) -> int:
+        return self.updated + self.failed
+
+    @property
+    def failure_rate(self) -> float:
+        return self.failed / self.attempted if self.attempted else 0.0
+
+    @property
+    def throughput(self) -> float:
+        """Vehicles processed (updated, failed or skipped) per second."""
+        processed = self.attempted + self.skipped
+        return processed / self.duration if self.duration else 0.0
+
+    def latency_percentiles(self) -> Dict[str, float]:
+        """Return p50/p95/p99/max per-vehicle latency in seconds."""
+        latencies = sorted(self.latencies)
+        return {
+            'p50': percentile(latencies, 0.50),
+            'p95': percentile(latencies, 0.95),
+            'p99': percentile(latencies, 0.99),
+            'max': latencies[-1] if latencies else 0.0,
+        }
+
+    def to_dict(self) -> Dict:
+        """Convert report to dictionary."""
+        return {
+            'campaign_id': self.campaign_id,
+            'total': self.total,
+            'attempted': self.attempted,
+            'updated': self.updated,
+            'failed': self.failed,
+            'skipped': self.skipped,
+            'invalid_versions': len(self.invalid_versions),
+            'errors': len(self.errors),
+            'failure_rate': self.failure_rate,
+            'stages_completed': self.stages_completed,
+            'aborted': self.aborted,
+            'abort_reason': self.abort_reason,
+            'duration': self.duration,
+            'throughput': self.throughput,
+            'latency': self.latency_percentiles(),
+        }
+
+
+class FleetCampaign:
+    """Rolls one package out to a fleet in stages.
+
+    ``stages`` are cumulative fractions of the fleet, e.g. ``[0.01, 0.1,
+    1.0]`` for a canary, an early wave and everyone; ``[0.2]`` is a plain
+    20% rollout. Up to ``max_concurrency`` vehicles update at once.
+
+    Without ``update_func`` each vehicle sleeps for a simulated latency
+    (``latency`` +/- ``latency_jitter`` seconds) and fails with
+    probability ``failure_rate``. ``update_func(vehicle, package)`` runs a
+    real update, e.g. through an ``Updater``, in the default executor.
+
+    Once at least ``min_samples`` vehicles have finished, a failure rate
+    above ``failure_threshold`` aborts the campaign: running updates
+    finish, nothing new starts and later stages are not entered.
+
+    Vehicles whose current version cannot be parsed are skipped and listed
+    in the report's ``invalid_versions``; updates that raise count as
+    failures, with the exception text in ``errors``. Nothing is printed
+    per vehicle.
+
+    With a ``store``, successful updates are written to it in one
+    transaction per stage.
+    """
+
+    def __init__(self, package: OTAPackage, stages: Sequence[float] = (1.0,),
+                 max_concurrency: int = 100, failure_threshold: float = 0.05,
+                 min_samples: int = 20, latency: float = 0.0, latency_jitter: float = 0.0,
+                 failure_rate: float = 0.0, seed: Optional[int] = None, shuffle: bool = True,
+                 stage_pause: float = 0.0,
+                 update_func: Optional[Callable[[Vehicle, OTAPackage], bool]] = None,
+                 campaign_id: Optional[str] = None, metrics: Optional[Metrics] = None,
+                 store: Optional[FleetStore] = None):
+        if not stages or any(b <= a for a, b in zip(stages, stages[1:])):
+            raise ValueError("stages must be increasing fractions of the fleet")
+        if stages[0] <= 0 or stages[-1] > 1:
+            raise ValueError("stages must lie in (0, 1]")
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency must be at least 1")
+        parse_version(package.version)
+        if isinstance(package, DeltaPackage):
+            parse_version(package.base_version)
+        self.package = package
+        self.stages = list(stages)
+        self.max_concurrency = max_concurrency
+        self.failure_threshold = failure_threshold
+        self.min_samples = min_samples
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.failure_rate = failure_rate
+        self.shuffle = shuffle
+        self.stage_pause = stage_pause
+        self.update_func = update_func
+        self.campaign_id = campaign_id or f"campaign_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        self.metrics = metrics or Metrics()
+        self.store = store
+        self._pending: List[tuple] = []
+        self._rng = random.Random(seed)
+
+    def run(self, vehicles: List[Vehicle]) -> CampaignReport:
+        """Run the campaign to completion (or abort) and return its report."""
+        return asyncio.run(self.run_async(vehicles))
+
+    async def run_async(self, vehicles: List[Vehicle]) -> CampaignReport:
+        """Coroutine version of ``run`` for use inside an event loop."""
+        report = CampaignReport(self.campaign_id, len(vehicles))
+        order = list(vehicles)
+        if self.shuffle:
+            self._rng.shuffle(order)
+        timestamp = datetime.now().isoformat()
+
+        start = time.perf_counter()
+        done = 0
+        for index, fraction in enumerate(self.stages):
+            end = math.ceil(fraction * len(order))
+            await self._run_stage(iter(order[done:end]), report, timestamp)
+            done = end
+            if self.store is not None and self._pending:
+                self.store.record_updates(self._pending)
+                self._pending = []
+            if report.aborted:
+                break
+            report.stages_completed += 1
+            self.metrics.count('ota_fleet_stages_total', campaign=self.campaign_id)
+            if self.stage_pause and index + 1 < len(self.stages):
+                await asyncio.sleep(self.stage_pause)
+        report.duration = time.perf_counter() - start
+        return report
+
+    async def _run_stage(self, cohort: Iterator[Vehicle], report: CampaignReport, timestamp: str):
+        async def worker():
+            # Workers share one iterator, so at most max_concurrency
+            # vehicles are in flight without a task per vehicle.
+            for vehicle in cohort:
+                if report.aborted:
+                    return
+                await self._update_vehicle(vehicle, report, timestamp)
+
+        await asyncio.gather(*(worker() for _ in range(self.max_concurrency)))
+
+    async def _update_vehicle(self, vehicle: Vehicle, report: CampaignReport, timestamp: str):
+        if try_parse_version(vehicle.current_version) is None:
+            report.skipped += 1
+            report.invalid_versions.append(vehicle.vehicle_id)
+            self.metrics.count('ota_fleet_updates_total', result=VEHICLE_INVALID_VERSION)
+            return
+        if not package_applies(self.package, vehicle.current_version):
+            report.skipped += 1
+            self.metrics.count('ota_fleet_updates_total', result=VEHICLE_SKIPPED)
+            return
+
+        began = time.perf_counter()
+        try:
+            if self.update_func is not None:
+                loop = asyncio.get_running_loop()
+                ok = await loop.run_in_executor(None, self.update_func, vehicle, self.package)
+            else:
+                ok = await self._simulate()
+        except Exception as e:
+            report.errors[vehicle.vehicle_id] = str(e) or type(e).__name__
+            ok = False
+        report.latencies.append(time.perf_counter() - began)
+
+        if ok:
+            vehicle.record_update(self.package.package_id, self.package.version, timestamp)
+            if self.store is not None:
+                self._pending.append((vehicle.vehicle_id, self.package.package_id,
+                                      self.package.version, timestamp))
+            report.updated += 1
+        else:
+            report.failed += 1
+            report.failed_vehicles.append(vehicle.vehicle_id)
+        self.metrics.count('ota_fleet_updates_total',
+                           result=VEHICLE_UPDATED if ok else VEHICLE_FAILED)
+
+        if (not report.aborted and report.attempted >= self.min_samples
+                and report.failure_rate > self.failure_threshold):
+            report.aborted = True
+            report.abort_reason = (
+                f"failure rate {report.failure_rate:.1%} exceeded "
+                f"{self.failure_threshold:.1%} after {report.attempted} vehicles"
+            )
+
+    async def _simulate(self) -> bool:
+        delay = self.latency
+        if self.latency_jitter:
+            delay += self._rng.uniform(-self.latency_jitter, self.latency_jitter)
+        await asyncio.sleep(max(delay, 0.0))
+        return self._rng.random() >= self.failure_rate
@@ -0,0 +1,274 @@
+"""
+Fleet Store Module
+
+Persists the software state of many vehicles in one SQLite database.
+
+Recording an update appends a history row and updates one indexed
+vehicle row instead of rewriting a per-vehicle JSON document, and
+fleet-wide questions ("who runs version X?") are index lookups.
+"""
+
+import json
+import sqlite3
+import threading
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from .vehicle import Vehicle
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS vehicles (
+    vehicle_id TEXT PRIMARY KEY,
+    current_version TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS components (
+    vehicle_id TEXT NOT NULL,
+    component TEXT NOT NULL,
+    version TEXT NOT NULL,
+    PRIMARY KEY (vehicle_id, component)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS history (
+    id INTEGER PRIMARY KEY,
+    vehicle_id TEXT NOT NULL,
+    package_id TEXT NOT NULL,
+    previous_version TEXT,
+    new_version TEXT,
+    components TEXT,
+    timestamp TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_vehicles_version ON vehicles (current_version);
+CREATE INDEX IF NOT EXISTS idx_components_version ON components (component, version);
+CREATE INDEX IF NOT EXISTS idx_history_vehicle ON history (vehicle_id, id);
+"""
+
+DEFAULT_BATCH_SIZE = 1000
+
+
+class FleetStore:
+    """SQLite-backed store of vehicle versions, components and history.
+
+    History is append-only. Writes that touch several rows run in one
+    transaction, so a crash never leaves a vehicle's version and its
+    history out of step.
+    """
+
+    def __init__(self, path: str = ":memory:"):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._lock = threading.RLock()
+        if path != ":memory:":
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    def _transaction(self):
+        return _Transaction(self._conn, self._lock)
+
+    def upsert_vehicles(self, vehicles: Iterable[Vehicle], include_history: bool = False):
+        """Insert or replace vehicles and their components in one transaction.
+
+        With ``include_history`` each vehicle's in-memory history is
+        appended too, which suits one-off imports of existing state.
+        """
+        with self._transaction() as conn:
+            for vehicle in vehicles:
+                conn.execute(
+                    "INSERT INTO vehicles (vehicle_id, current_version) VALUES (?, ?) "
+                    "ON CONFLICT (vehicle_id) DO UPDATE SET current_version = excluded.current_version",
+                    (vehicle.vehicle_id, vehicle.current_version)
+                )
+                conn.execute("DELETE FROM components WHERE vehicle_id = ?", (vehicle.vehicle_id,))
+                conn.executemany(
+                    "INSERT INTO components (vehicle_id, component, version) VALUES (?, ?, ?)",
+                    [(vehicle.vehicle_id, c, v) for c, v in vehicle.installed_components.items()]
+                )
+                if include_history:
+                    conn.executemany(
+                        "INSERT INTO history (vehicle_id, package_id, previous_version, "
+                        "new_version, components, timestamp) VALUES (?, ?, ?, ?, ?, ?)",
+                        [_history_row(vehicle.vehicle_id, entry) for entry in vehicle.update_history]
+                    )
+
+    def import_state_files(self, paths: Iterable[str]) -> int:
+        """Import ``Vehicle.save_state`` JSON files, history included."""
+        vehicles = [Vehicle.load_state(path) for path in paths]
+        self.upsert_vehicles(vehicles, include_history=True)
+        return len(vehicles)
+
+    def record_update(self, vehicle_id: str, package_id: str, new_version: str, timestamp: str):
+        """Append one update to history and set the vehicle's version."""
+        self.record_updates([(vehicle_id, package_id, new_version, timestamp)])
+
+    def record_updates(self, updates: Iterable[Tuple[str, str, str, str]]):
+        """Record many ``(vehicle_id, package_id, new_version, timestamp)`` updates at once."""
+        with self._transaction() as conn:
+            for vehicle_id, package_id, new_version, timestamp in updates:
+                row = conn.execute(
+                    "SELECT current_version FROM vehicles WHERE vehicle_id = ?", (vehicle_id,)
+                ).fetchone()
+                previous = row[0] if row else None
+                conn.execute(
+                    "INSERT INTO history (vehicle_id, package_id, previous_version, new_version, "
+                    "timestamp) VALUES (?, ?, ?, ?, ?)",
+                    (vehicle_id, package_id, previous, new_version, timestamp)
+                )
+                conn.execute(
+                    "INSERT INTO vehicles (vehicle_id, current_version) VALUES (?, ?) "
+                    "ON CONFLICT (vehicle_id) DO UPDATE SET current_version = excluded.current_version",
+                    (vehicle_id, new_version)
+                )
+
+    def record_component_update(self, vehicle_id: str, package_id: str,
+                                versions: Dict[str, str], timestamp: str):
+        """Append a multi-component update and set the component versions."""
+        with self._transaction() as conn:
+            previous = dict(conn.execute(
+                "SELECT component, version FROM components WHERE vehicle_id = ?", (vehicle_id,)
+            ).fetchall())
+            components = {
+                component: {'previous_version': previous.get(component), 'new_version': version}
+                for component, version in versions.items()
+            }
+            conn.execute(
+                "INSERT INTO history (vehicle_id, package_id, components, timestamp) "
+                "VALUES (?, ?, ?, ?)",
+                (vehicle_id, package_id, json.dumps(components), timestamp)
+            )
+            conn.executemany(
+                "INSERT INTO components (vehicle_id, component, version) VALUES (?, ?, ?) "
+                "ON CONFLICT (vehicle_id, component) DO UPDATE SET version = excluded.version",
+                [(vehicle_id, c, v) for c, v in versions.items()]
+            )
+
+    def get_vehicle(self, vehicle_id: str, with_history: bool = False) -> Optional[Vehicle]:
+        """Load one vehicle, optionally with its full update history."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT vehicle_id, current_version FROM vehicles WHERE vehicle_id = ?",
+                (vehicle_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            vehicle = Vehicle(row[0], row[1])
+            vehicle.installed_components = dict(self._conn.execute(
+                "SELECT component, version FROM components WHERE vehicle_id = ?", (vehicle_id,)
+            ).fetchall())
+        if with_history:
+            vehicle.update_history = self.history(vehicle_id)
+        return vehicle
+
+    def iter_vehicles(self, batch_size: int = DEFAULT_BATCH_SIZE) -> Iterator[Vehicle]:
+        """Yield every vehicle (without history), loading ``batch_size`` at a time."""
+        last_id = ""
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT vehicle_id, current_version FROM vehicles WHERE vehicle_id > ? "
+                    "ORDER BY vehicle_id LIMIT ?", (last_id, batch_size)
+                ).fetchall()
+                if not rows:
+                    return
+                components: Dict[str, Dict[str, str]] = {}
+                for vehicle_id, component, version in self._conn.execute(
+                    "SELECT vehicle_id, component, version FROM components "
+                    "WHERE vehicle_id >= ? AND vehicle_id <= ?", (rows[0][0], rows[-1][0])
+                ):
+                    components.setdefault(vehicle_id, {})[component] = version
+            for vehicle_id, current_version in rows:
+                vehicle = Vehicle(vehicle_id, current_version)
+                vehicle.installed_components = components.get(vehicle_id, {})
+                yield vehicle
+            last_id = rows[-1][0]
+
+    def history(self, vehicle_id: str, limit: Optional[int] = None) -> List[Dict]:
+        """Return a vehicle's history, oldest first (the latest ``limit`` entries)."""
+        query = ("SELECT package_id, previous_version, new_version, components, timestamp "
+                 "FROM history WHERE vehicle_id = ? ORDER BY id DESC")
+        params: Tuple = (vehicle_id,)
+        if limit is not None:
+            query += " LIMIT ?"
+            params += (limit,)
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        return [_history_entry(row) for row in reversed(rows)]
+
+    def vehicles_on_version(self, version: str) -> List[str]:
+        """Return IDs of vehicles whose current version is ``version``."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT vehicle_id FROM vehicles WHERE current_version = ? ORDER BY vehicle_id",
+                (version,)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def vehicles_with_component(self, component: str, version: Optional[str] = None) -> List[str]:
+        """Return IDs of vehicles with ``component`` installed (at ``version``)."""
+        if version is None:
+            query, params = "SELECT vehicle_id FROM components WHERE component = ?", (component,)
+        else:
+            query = "SELECT vehicle_id FROM components WHERE component = ? AND version = ?"
+            params = (component, version)
+        with self._lock:
+            rows = self._conn.execute(query + " ORDER BY vehicle_id", params).fetchall()
+        return [row[0] for row in rows]
+
+    def version_counts(self) -> Dict[str, int]:
+        """Return the number of vehicles on each version."""
+        with self._lock:
+            return dict(self._conn.execute(
+                "SELECT current_version, COUNT(*) FROM vehicles GROUP BY current_version"
+            ).fetchall())
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM vehicles").fetchone()[0]
+
+
+class _Transaction:
+    """Holds the store lock and wraps a block in BEGIN/COMMIT."""
+
+    def __init__(self, conn: sqlite3.Connection, lock: threading.RLock):
+        self.conn = conn
+        self.lock = lock
+
+    def __enter__(self) -> sqlite3.Connection:
+        self.lock.acquire()
+        try:
+            self.conn.execute("BEGIN")
+        except BaseException:
+            self.lock.release()
+            raise
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+        finally:
+            self.lock.release()
+        return False
+
+
+def _history_row(vehicle_id: str, entry: Dict) -> Tuple:
+    components = entry.get('components')
+    return (
+        vehicle_id, entry['package_id'], entry.get('previous_version'), entry.get('new_version'),
+        json.dumps(components) if components is not None else None, entry['timestamp']
+    )
+
+
+def _history_entry(row: Tuple) -> Dict:
+    package_id, previous_version, new_version, components, timestamp = row
+    if components is not None:
+        return {'package_id': package_id, 'components': json.loads(components),
+                'timestamp': timestamp}
+    return {'package_id': package_id, 'previous_version': previous_version,
+            'new_version': new_version, 'timestamp': timestamp}
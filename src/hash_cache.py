@@ -0,0 +1,130 @@
+"""
+Hash Cache Module
+
+Persistent cache of file digests keyed on file identity.
+"""
+
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Optional
+
+# Files modified this recently are not cached: a second write within the
+# same mtime tick would otherwise go unnoticed.
+RACY_WINDOW_NS = 2 * 1_000_000_000
+
+
+class HashCache:
+    """LRU cache of SHA256 digests keyed by (device, inode, size, mtime_ns)."""
+
+    def __init__(self, path: Optional[str] = None, max_entries: int = 10000):
+        if max_entries < 1:
+            raise ValueError("max_entries must be at least 1")
+        self.path = path
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._dirty = False
+        if path and os.path.exists(path):
+            self.load()
+
+    @staticmethod
+    def file_key(file_path: str) -> str:
+        """Build the identity key for a file from a single stat."""
+        st = os.stat(file_path)
+        return f"{st.st_dev}:{st.st_ino}:{st.st_size}:{st.st_mtime_ns}"
+
+    def get(self, file_path: str) -> Optional[str]:
+        """Return the cached digest for an unchanged file, if any."""
+        return self._lookup(self.file_key(file_path))
+
+    def put(self, file_path: str, digest: str):
+        """Cache the digest of a file in its current state."""
+        st = os.stat(file_path)
+        if st.st_mtime_ns >= time.time_ns() - RACY_WINDOW_NS:
+            return
+        self._store(f"{st.st_dev}:{st.st_ino}:{st.st_size}:{st.st_mtime_ns}", digest)
+
+    def get_or_compute(self, file_path: str,
+                       compute: Callable[[str], Optional[str]]) -> Optional[str]:
+        """Return the cached digest or compute and cache it."""
+        key = self.file_key(file_path)
+        digest = self._lookup(key)
+        if digest is not None:
+            return digest
+
+        digest = compute(file_path)
+        if digest is None:
+            return None
+        # Only cache if the file did not change while it was being hashed
+        if self.file_key(file_path) == key:
+            self.put(file_path, digest)
+        return digest
+
+    def _lookup(self, key: str) -> Optional[str]:
+        with self._lock:
+            digest = self._entries.get(key)
+            if digest is not None:
+                self._entries.move_to_end(key)
+            return digest
+
+    def _store(self, key: str, digest: str):
+        with self._lock:
+            self._entries[key] = digest
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._dirty = True
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def clear(self):
+        """Drop all cached digests."""
+        with self._lock:
+            self._entries.clear()
+            self._dirty = True
+
+    def load(self):
+        """Load cache entries from disk, starting empty if the file is unreadable."""
+        try:
+            with open(self.path, 'r') as f:
+                entries = OrderedDict(json.load(f).get('entries', []))
+        except (OSError, ValueError, TypeError, AttributeError) as e:
+            print(f"Ignoring unreadable hash cache {self.path}: {e}")
+            entries = OrderedDict()
+        with self._lock:
+            self._entries = entries
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._dirty = False
+
+    def save(self):
+        """Atomically write cache entries to disk."""
+        if not self.path:
+            return
+        with self._lock:
+            data = {'entries': list(self._entries.items())}
+            self._dirty = False
+
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.hash_cache_')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(data, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, self.path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            raise
+
+    def flush(self):
+        """Save to disk if there are unsaved changes."""
+        if self._dirty:
+            self.save()
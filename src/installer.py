@@ -0,0 +1,311 @@
+"""
+Installer Module
+
+Streams package files into the target directory, verifying while copying.
+"""
+
+import errno
+import hashlib
+import hmac
+import os
+import shutil
+import tempfile
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+from .buffer_pool import BufferPool
+from .fastcopy import copy_file
+from .merkle import read_leaf
+from .metrics import Metrics
+from .ota_package import OTAPackage
+from .verifier import (FileVerificationResult, DEFAULT_BUFFER_SIZE, STATUS_OK,
+                       STATUS_MISMATCH, STATUS_MISSING, STATUS_ERROR)
+
+PARTIAL_SUFFIX = ".ota-partial"
+
+
+def _fsync_dir(path: str):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class StreamingInstaller:
+    """Installs package files in a single read pass.
+
+    Each file is read once through ``package.open_payload`` (the
+    ``package_id`` directory, or a container member), hashed and written
+    to a temporary file next to its destination at the same time. The
+    temporary file is fsynced and renamed over the destination only if the
+    digest matches the manifest, so a bad file never lands in the target.
+
+    Files with chunk hashes in the manifest are written to a fixed
+    '<dst>.ota-partial' path and checked chunk by chunk; an interrupted or
+    failed install keeps the verified prefix and the next attempt resumes
+    after it. With ``partial_dir`` set, partial copies are kept there
+    (under their package path) instead, so rolling back the target does
+    not throw them away.
+    """
+
+    def __init__(self, buffer_size: int = DEFAULT_BUFFER_SIZE, metrics: Optional[Metrics] = None,
+                 buffer_pool: Optional[BufferPool] = None, partial_dir: Optional[str] = None):
+        self.partial_dir = partial_dir
+        self.buffer_pool = buffer_pool
+        self.buffer_size = buffer_pool.buffer_size if buffer_pool else buffer_size
+        self.metrics = metrics or Metrics()
+        self._local = threading.local()
+
+    @contextmanager
+    def _buffer(self) -> Iterator[bytearray]:
+        """Borrow a buffer from ``buffer_pool``, or use this thread's own."""
+        if self.buffer_pool is None:
+            yield self._get_buffer()
+        else:
+            with self.buffer_pool.buffer() as buffer:
+                yield buffer
+
+    def _get_buffer(self) -> bytearray:
+        """Return this thread's reusable copy buffer."""
+        buffer = getattr(self._local, 'buffer', None)
+        if buffer is None or len(buffer) != self.buffer_size:
+            buffer = bytearray(self.buffer_size)
+            self._local.buffer = buffer
+        return buffer
+
+    def partial_path(self, dst_path: str, rel_path: str) -> str:
+        """Return where the partial copy of a chunked file is kept."""
+        if self.partial_dir is None:
+            return dst_path + PARTIAL_SUFFIX
+        return os.path.join(self.partial_dir, rel_path + PARTIAL_SUFFIX)
+
+    def _move_into_place(self, partial_path: str, dst_path: str):
+        """Rename a finished partial copy over ``dst_path``, copying across filesystems."""
+        try:
+            os.replace(partial_path, dst_path)
+            return
+        except OSError as e:
+            if e.errno != errno.EXDEV:
+                raise
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(dst_path)),
+                                         prefix='.ota_install_')
+        os.close(fd)
+        try:
+            copy_file(partial_path, temp_path, self.buffer_pool)
+            with open(temp_path, 'rb') as f:
+                os.fsync(f.fileno())
+            os.replace(temp_path, dst_path)
+        except OSError:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            raise
+        os.unlink(partial_path)
+
+    @staticmethod
+    def _open_source(src_path: str, package: Optional[OTAPackage], rel_path: Optional[str]):
+        if package is None:
+            return open(src_path, 'rb', buffering=0)
+        return package.open_payload(rel_path)
+
+    @staticmethod
+    def _copy_mode(src_path: str, dst_path: str, package: Optional[OTAPackage],
+                   rel_path: Optional[str]):
+        if package is None:
+            shutil.copymode(src_path, dst_path)
+        else:
+            os.chmod(dst_path, package.payload_mode(rel_path))
+
+    def install_file(self, src_path: str, dst_path: str, expected_hash: str,
+                     package: Optional[OTAPackage] = None,
+                     rel_path: Optional[str] = None) -> FileVerificationResult:
+        """Copy one file into place if its content matches ``expected_hash``.
+
+        With ``package`` set, the content is read from ``rel_path`` through
+        ``package.open_payload`` and ``src_path`` is only used in the result.
+        """
+        result = FileVerificationResult(src_path, expected_hash)
+        if package is None and not os.path.isfile(src_path):
+            result.status = STATUS_MISSING
+            return result
+        try:
+            src = self._open_source(src_path, package, rel_path)
+        except FileNotFoundError:
+            result.status = STATUS_MISSING
+            return result
+        except OSError as e:
+            result.status = STATUS_ERROR
+            result.error = str(e)
+            return result
+
+        directory = os.path.dirname(os.path.abspath(dst_path))
+        os.makedirs(directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.ota_install_')
+        try:
+            hash_sha256 = hashlib.sha256()
+            copied = 0
+            with src, os.fdopen(fd, 'wb') as dst, self._buffer() as buffer:
+                view = memoryview(buffer)
+                while True:
+                    n = src.readinto(buffer)
+                    if not n:
+                        break
+                    hash_sha256.update(view[:n])
+                    dst.write(view[:n])
+                    copied += n
+                dst.flush()
+                os.fsync(dst.fileno())
+            self._count(copied, copied)
+
+            result.actual_hash = hash_sha256.hexdigest()
+            if not hmac.compare_digest(result.actual_hash, expected_hash):
+                result.status = STATUS_MISMATCH
+                os.unlink(temp_path)
+                return result
+
+            self._copy_mode(src_path, temp_path, package, rel_path)
+            os.replace(temp_path, dst_path)
+            _fsync_dir(directory)
+            self.metrics.count('ota_files_touched_total', 1, component='installer')
+            result.status = STATUS_OK
+            return result
+
+        except OSError as e:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            result.status = STATUS_ERROR
+            result.error = str(e)
+            return result
+
+    def install_chunked_file(self, src_path: str, dst_path: str, file_info: Dict,
+                             package: Optional[OTAPackage] = None) -> FileVerificationResult:
+        """Copy one chunked file into place, resuming from a verified partial copy.
+
+        ``package`` works as in ``install_file``, with ``file_info['path']``
+        as the relative path.
+        """
+        result = FileVerificationResult(src_path, file_info['hash'])
+        rel_path = file_info['path']
+        if package is None and not os.path.isfile(src_path):
+            result.status = STATUS_MISSING
+            return result
+        try:
+            src = self._open_source(src_path, package, rel_path)
+        except FileNotFoundError:
+            result.status = STATUS_MISSING
+            return result
+        except OSError as e:
+            result.status = STATUS_ERROR
+            result.error = str(e)
+            return result
+
+        chunks = file_info['chunks']
+        chunk_size = file_info['chunk_size']
+        directory = os.path.dirname(os.path.abspath(dst_path))
+        os.makedirs(directory, exist_ok=True)
+        partial_path = self.partial_path(dst_path, rel_path)
+        os.makedirs(os.path.dirname(os.path.abspath(partial_path)), exist_ok=True)
+        hash_sha256 = hashlib.sha256()
+
+        # Chunks are streamed through the buffer in pieces, so it may be
+        # smaller than chunk_size. A chunk only counts toward the file hash
+        # once its leaf hash matches.
+        try:
+            with self._buffer() as buffer:
+                view = memoryview(buffer)
+                # Re-check what a previous attempt already wrote
+                verified = 0
+                read = 0
+                written = 0
+                if os.path.exists(partial_path):
+                    with open(partial_path, 'rb', buffering=0) as partial:
+                        while verified < len(chunks):
+                            pending = hash_sha256.copy()
+                            n, actual = read_leaf(partial, view, chunk_size, pending.update)
+                            read += n
+                            if not n or not hmac.compare_digest(actual, chunks[verified]):
+                                break
+                            hash_sha256 = pending
+                            verified += 1
+
+                mode = 'r+b' if os.path.exists(partial_path) else 'wb'
+                with src, open(partial_path, mode) as dst:
+                    offset = verified * chunk_size
+                    dst.truncate(offset)
+                    dst.seek(offset)
+                    src.seek(offset)
+                    for index in range(verified, len(chunks)):
+                        pending = hash_sha256.copy()
+                        n, actual = read_leaf(src, view, chunk_size, pending.update, dst.write)
+                        read += n
+                        written += n
+                        if not n or not hmac.compare_digest(actual, chunks[index]):
+                            # Drop the bad chunk so the partial copy stays a verified prefix
+                            dst.truncate(index * chunk_size)
+                            result.status = STATUS_MISMATCH
+                            result.error = f"chunk {index} does not match"
+                            break
+                        hash_sha256 = pending
+                    else:
+                        if src.read(1):
+                            result.status = STATUS_MISMATCH
+                            result.error = "data past last chunk"
+                    dst.flush()
+                    os.fsync(dst.fileno())
+            self._count(read, written)
+
+            if result.status == STATUS_MISMATCH:
+                return result
+
+            result.actual_hash = hash_sha256.hexdigest()
+            if not hmac.compare_digest(result.actual_hash, file_info['hash']):
+                result.status = STATUS_MISMATCH
+                os.unlink(partial_path)
+                return result
+
+            self._copy_mode(src_path, partial_path, package, rel_path)
+            self._move_into_place(partial_path, dst_path)
+            _fsync_dir(directory)
+            self.metrics.count('ota_files_touched_total', 1, component='installer')
+            result.status = STATUS_OK
+            return result
+
+        except OSError as e:
+            result.status = STATUS_ERROR
+            result.error = str(e)
+            return result
+
+    def _count(self, read: int, written: int):
+        self.metrics.count('ota_bytes_read_total', read, component='installer')
+        self.metrics.count('ota_bytes_written_total', written, component='installer')
+
+    def install(self, package: OTAPackage, target_dir: str, skip: Iterable[str] = (),
+                on_installed: Optional[Callable[[str], None]] = None
+                ) -> List[FileVerificationResult]:
+        """Install every package file, stopping at the first failure.
+
+        Paths in ``skip`` were already installed by an interrupted attempt
+        and are left alone. ``on_installed`` is called with the path of
+        each file put in place.
+        """
+        results = []
+        skip = set(skip)
+        for file_info in package.files:
+            if file_info['path'] in skip:
+                continue
+            src_path = os.path.join(package.package_id, file_info['path'])
+            dst_path = os.path.join(target_dir, file_info['path'])
+            if 'chunks' in file_info:
+                result = self.install_chunked_file(src_path, dst_path, file_info, package)
+            else:
+                result = self.install_file(src_path, dst_path, file_info['hash'],
+                                           package, file_info['path'])
+            results.append(result)
+            if not result.ok:
+                break
+            if on_installed is not None:
+                on_installed(file_info['path'])
+        return results
+
+    def __call__(self, package: OTAPackage, target_dir: str) -> bool:
+        return all(result.ok for result in self.install(package, target_dir))
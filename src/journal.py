@@ -0,0 +1,209 @@
+"""
+Journal Module
+
+Write-ahead journal of update progress for crash recovery.
+
+The journal is an append-only file of one record per line, each prefixed
+with its CRC32 so a torn or corrupted tail left by a power loss is
+detected and ignored on replay. A fresh update writes a ``begin`` record
+naming the package (by manifest digest) and target; the updater then
+appends phase boundaries, verified files, installed files, and the start
+and end of each step, and finally an ``end`` record with the outcome.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import zlib
+from typing import Dict, List, Optional
+from .compact_manifest import CompactManifest
+
+RECORD_BEGIN = "begin"
+RECORD_PHASE = "phase"
+RECORD_VERIFIED = "verified"
+RECORD_INSTALLED = "installed"
+RECORD_STEP = "step"
+RECORD_END = "end"
+
+OUTCOME_COMMITTED = "committed"
+OUTCOME_ROLLED_BACK = "rolled_back"
+
+# Installed-file records appended between fsyncs. Losing unsynced ones
+# only means reinstalling those files, which is idempotent.
+SYNC_INTERVAL = 64
+
+
+def manifest_digest(package) -> str:
+    """Return the SHA256 of a package's canonical manifest.
+
+    Compact manifests are hashed as stored rather than serialized whole.
+    """
+    if isinstance(package, CompactManifest):
+        return package.digest()
+    return hashlib.sha256(package.canonical_manifest()).hexdigest()
+
+
+def _fsync_dir(path: str):
+    fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def encode_record(record: Dict) -> bytes:
+    body = json.dumps(record, separators=(',', ':'), sort_keys=True).encode('utf-8')
+    return b"%08x %s\n" % (zlib.crc32(body), body)
+
+
+def decode_record(line: bytes) -> Optional[Dict]:
+    """Return the record on a journal line, or None if it is torn or corrupt."""
+    if not line.endswith(b"\n") or len(line) < 10 or line[8:9] != b" ":
+        return None
+    body = line[9:-1]
+    try:
+        if int(line[:8], 16) != zlib.crc32(body):
+            return None
+        record = json.loads(body)
+    except ValueError:
+        return None
+    return record if isinstance(record, dict) else None
+
+
+class JournalState:
+    """What a journal says about the last update."""
+
+    def __init__(self):
+        self.begin: Optional[Dict] = None
+        self.started = set()    # phases that began
+        self.phases = set()     # phases that completed
+        self.verified: Dict[str, List] = {}  # path -> source key when verified
+        self.installed = set()
+        self.steps = set()      # steps that finished
+        self.steps_started = set()
+        self.outcome: Optional[str] = None
+        self.valid_length = 0   # bytes of intact records
+
+    @property
+    def in_progress(self) -> bool:
+        """True if an update began and never recorded its outcome."""
+        return self.begin is not None and self.outcome is None
+
+    @property
+    def interrupted_steps(self) -> set:
+        """Steps that started but never finished."""
+        return self.steps_started - self.steps
+
+    def matches(self, package_digest: str, target_dir: str) -> bool:
+        return (self.begin is not None and self.begin.get('manifest') == package_digest
+                and self.begin.get('target_dir') == os.path.abspath(target_dir))
+
+    def apply(self, record: Dict):
+        kind = record.get('type')
+        if kind == RECORD_BEGIN:
+            self.begin = record
+        elif kind == RECORD_PHASE:
+            (self.phases if record.get('done') else self.started).add(record['name'])
+        elif kind == RECORD_VERIFIED:
+            self.verified.update(record['files'])
+        elif kind == RECORD_INSTALLED:
+            self.installed.update(record['paths'])
+        elif kind == RECORD_STEP:
+            (self.steps if record.get('done', True) else self.steps_started).add(record['name'])
+        elif kind == RECORD_END:
+            self.outcome = record['outcome']
+
+
+class UpdateJournal:
+    """Append-only, fsynced journal of one update at a time."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+        self._unsynced = 0
+        self._lock = threading.Lock()
+
+    @property
+    def active(self) -> bool:
+        """True while an update is being journaled."""
+        return self._file is not None
+
+    def replay(self) -> JournalState:
+        """Rebuild the state from the journal, stopping at the first bad record."""
+        state = JournalState()
+        try:
+            f = open(self.path, 'rb')
+        except FileNotFoundError:
+            return state
+        with f:
+            offset = 0
+            for line in f:
+                record = decode_record(line)
+                if record is None:
+                    break
+                state.apply(record)
+                offset += len(line)
+                state.valid_length = offset
+        return state
+
+    def begin(self, package, target_dir: str, backup_dir: str, backup_mode: str):
+        """Start a new journal for an update, replacing any previous one."""
+        self.close()
+        self._file = open(self.path, 'wb')
+        self._write({'type': RECORD_BEGIN, 'package_id': package.package_id,
+                     'version': package.version, 'manifest': manifest_digest(package),
+                     'target_dir': os.path.abspath(target_dir), 'backup_dir': backup_dir,
+                     'backup_mode': backup_mode}, sync=True)
+        _fsync_dir(self.path)
+
+    def resume(self, state: JournalState):
+        """Reopen the journal for appending after its last intact record."""
+        self.close()
+        self._file = open(self.path, 'r+b')
+        self._file.truncate(state.valid_length)
+        self._file.seek(state.valid_length)
+
+    def phase_started(self, name: str):
+        self._write({'type': RECORD_PHASE, 'name': name, 'done': False}, sync=True)
+
+    def phase_done(self, name: str):
+        self._write({'type': RECORD_PHASE, 'name': name, 'done': True}, sync=True)
+
+    def verified(self, files: Dict[str, List]):
+        self._write({'type': RECORD_VERIFIED, 'files': files}, sync=True)
+
+    def installed(self, path: str):
+        self._write({'type': RECORD_INSTALLED, 'paths': [path]}, sync=False)
+
+    def step_started(self, name: str):
+        self._write({'type': RECORD_STEP, 'name': name, 'done': False}, sync=True)
+
+    def step_done(self, name: str):
+        self._write({'type': RECORD_STEP, 'name': name, 'done': True}, sync=True)
+
+    def end(self, outcome: str):
+        self._write({'type': RECORD_END, 'outcome': outcome}, sync=True)
+        self.close()
+
+    def _write(self, record: Dict, sync: bool):
+        with self._lock:
+            if self._file is None:
+                raise ValueError("Journal is not open")
+            self._file.write(encode_record(record))
+            self._unsynced += 1
+            if sync or self._unsynced >= SYNC_INTERVAL:
+                self._sync()
+
+    def _sync(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._unsynced = 0
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                if self._unsynced:
+                    self._sync()
+                self._file.close()
+                self._file = None
@@ -0,0 +1,136 @@
+"""
+Merkle Module
+
+Chunk hashes and Merkle roots for OTA manifests.
+
+A chunked file entry carries 'chunk_size', 'chunks' (one leaf hash per
+chunk) and 'merkle_root'. The package root is a Merkle tree over the
+manifest header and every file entry, so one signature over it covers all
+content.
+"""
+
+import hashlib
+import json
+from typing import Callable, Dict, Iterable, List, Tuple
+
+DEFAULT_CHUNK_SIZE = 1024 * 1024
+
+# Domain separation prefixes
+_LEAF = b"\x00"
+_NODE = b"\x01"
+_HEADER = b"\x02"
+_ENTRY = b"\x03"
+
+# Manifest keys not covered by the package root
+UNSIGNED_KEYS = ('files', 'merkle_root', 'root_signature')
+
+
+def leaf_hasher():
+    """Return a hash object for a chunk fed in several pieces."""
+    return hashlib.sha256(_LEAF)
+
+
+def leaf_hash(chunk) -> str:
+    """Return the hex leaf hash of one chunk of file data."""
+    h = leaf_hasher()
+    h.update(chunk)
+    return h.hexdigest()
+
+
+def merkle_root(leaves: List[str]) -> str:
+    """Return the hex Merkle root of hex leaf hashes.
+
+    An odd node at the end of a level is promoted unchanged.
+    """
+    if not leaves:
+        return hashlib.sha256(_NODE).hexdigest()
+    level = [bytes.fromhex(leaf) for leaf in leaves]
+    while len(level) > 1:
+        next_level = [
+            hashlib.sha256(_NODE + level[i] + level[i + 1]).digest()
+            for i in range(0, len(level) - 1, 2)
+        ]
+        if len(level) % 2:
+            next_level.append(level[-1])
+        level = next_level
+    return level[0].hex()
+
+
+def read_chunk(f, view: memoryview) -> int:
+    """Fill ``view`` from ``f`` as far as possible; return bytes read."""
+    pos = 0
+    while pos < len(view):
+        n = f.readinto(view[pos:])
+        if not n:
+            break
+        pos += n
+    return pos
+
+
+def read_leaf(f, view: memoryview, chunk_size: int, *sinks: Callable) -> Tuple[int, str]:
+    """Read one chunk of up to ``chunk_size`` bytes and return (size, leaf hash).
+
+    The chunk is read through ``view`` in pieces, so the buffer may be
+    smaller than the chunk; each piece is also passed to every ``sinks``
+    callable (e.g. a file hash's ``update`` or an output's ``write``).
+    """
+    leaf = leaf_hasher()
+    total = 0
+    while total < chunk_size:
+        wanted = min(len(view), chunk_size - total)
+        n = read_chunk(f, view[:wanted])
+        piece = view[:n]
+        leaf.update(piece)
+        for sink in sinks:
+            sink(piece)
+        total += n
+        if n < wanted:
+            break
+    return total, leaf.hexdigest()
+
+
+def chunk_hashes(file_path: str, chunk_size: int = DEFAULT_CHUNK_SIZE) -> List[str]:
+    """Return the leaf hash of every chunk of a file."""
+    buffer = bytearray(chunk_size)
+    view = memoryview(buffer)
+    chunks = []
+    with open(file_path, 'rb', buffering=0) as f:
+        while True:
+            n = read_chunk(f, view)
+            if not n:
+                break
+            chunks.append(leaf_hash(view[:n]))
+            if n < chunk_size:
+                break
+    return chunks
+
+
+def add_chunk_hashes(file_info: Dict, file_path: str, chunk_size: int = DEFAULT_CHUNK_SIZE):
+    """Add 'chunk_size', 'chunks' and 'merkle_root' to a manifest file entry."""
+    chunks = chunk_hashes(file_path, chunk_size)
+    file_info['chunk_size'] = chunk_size
+    file_info['chunks'] = chunks
+    file_info['merkle_root'] = merkle_root(chunks)
+
+
+def _canonical(value) -> bytes:
+    return json.dumps(value, sort_keys=True, separators=(',', ':')).encode('utf-8')
+
+
+def package_root(manifest: Dict) -> str:
+    """Return the Merkle root over a manifest's header and file entries."""
+    return manifest_root(manifest, manifest['files'])
+
+
+def manifest_root(header: Dict, files: Iterable[Dict]) -> str:
+    """Return the package root from a manifest header and its file entries.
+
+    ``files`` may come in any order and is read once; only (path, leaf)
+    pairs are kept, so lazily loaded manifests need not be materialized.
+    """
+    header = {k: v for k, v in header.items() if k not in UNSIGNED_KEYS}
+    entries = sorted((file_info['path'], hashlib.sha256(_ENTRY + _canonical(file_info)).hexdigest())
+                     for file_info in files)
+    leaves = [hashlib.sha256(_HEADER + _canonical(header)).hexdigest()]
+    leaves.extend(leaf for _, leaf in entries)
+    return merkle_root(leaves)
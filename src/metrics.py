@@ -0,0 +1,214 @@
+"""
+Metrics Module
+
+Timing and counter instrumentation for the update pipeline.
+
+Components take an optional ``Metrics`` object and report through it.
+With no sinks attached every call returns immediately, so instrumented
+code paths cost next to nothing when nobody is listening.
+"""
+
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, List, Optional, Tuple
+
+KIND_TIMING = "timing"
+KIND_COUNTER = "counter"
+
+
+class MetricsSink(ABC):
+    """Receives metric records from a ``Metrics`` object."""
+
+    @abstractmethod
+    def record(self, kind: str, name: str, value: float, labels: Dict[str, str]):
+        """Handle one record; called from whichever thread reports it."""
+
+
+class InMemorySink(MetricsSink):
+    """Keeps every record in a list, mainly for tests and debugging."""
+
+    def __init__(self):
+        self.records: List[Dict] = []
+        self._lock = threading.Lock()
+
+    def record(self, kind: str, name: str, value: float, labels: Dict[str, str]):
+        with self._lock:
+            self.records.append({'kind': kind, 'name': name, 'value': value, 'labels': labels})
+
+    def values(self, name: str, **labels) -> List[float]:
+        """Return recorded values for a metric, filtered by labels."""
+        return [
+            r['value'] for r in self.records
+            if r['name'] == name and all(r['labels'].get(k) == v for k, v in labels.items())
+        ]
+
+    def total(self, name: str, **labels) -> float:
+        """Return the sum of recorded values for a metric."""
+        return sum(self.values(name, **labels))
+
+
+class JsonLinesSink(MetricsSink):
+    """Appends one JSON object per record to a file."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def record(self, kind: str, name: str, value: float, labels: Dict[str, str]):
+        line = json.dumps({
+            'ts': time.time(), 'kind': kind, 'name': name, 'value': value, 'labels': labels
+        })
+        with self._lock:
+            with open(self.path, 'a') as f:
+                f.write(line + "\n")
+
+
+def _escape_label(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class PrometheusTextSink(MetricsSink):
+    """Aggregates records and renders them in Prometheus text format.
+
+    Counters are summed; timings become summaries with _sum and _count.
+    """
+
+    def __init__(self):
+        self._counters: Dict[Tuple[str, Tuple], float] = {}
+        self._timings: Dict[Tuple[str, Tuple], List] = {}  # [sum of seconds, count]
+        self._lock = threading.Lock()
+
+    def record(self, kind: str, name: str, value: float, labels: Dict[str, str]):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            if kind == KIND_TIMING:
+                total = self._timings.setdefault(key, [0.0, 0])
+                total[0] += value
+                total[1] += 1
+            else:
+                self._counters[key] = self._counters.get(key, 0) + value
+
+    @staticmethod
+    def _format_labels(labels: Tuple) -> str:
+        if not labels:
+            return ""
+        return "{" + ",".join(f'{k}="{_escape_label(v)}"' for k, v in labels) + "}"
+
+    def render(self) -> str:
+        """Return all metrics in Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            counters = sorted(self._counters.items())
+            timings = sorted(self._timings.items())
+
+        typed = set()
+        for (name, labels), value in counters:
+            if name not in typed:
+                lines.append(f"# TYPE {name} counter")
+                typed.add(name)
+            lines.append(f"{name}{self._format_labels(labels)} {value}")
+        for (name, labels), (total, count) in timings:
+            if name not in typed:
+                lines.append(f"# TYPE {name} summary")
+                typed.add(name)
+            lines.append(f"{name}_sum{self._format_labels(labels)} {total}")
+            lines.append(f"{name}_count{self._format_labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: str):
+        """Atomically write the rendered metrics, e.g. for a textfile collector."""
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.metrics_')
+        with os.fdopen(fd, 'w') as f:
+            f.write(self.render())
+        os.replace(temp_path, path)
+
+
+class _Timer:
+    """Context manager that reports its elapsed time on exit."""
+
+    __slots__ = ('metrics', 'name', 'labels', 'start')
+
+    def __init__(self, metrics: 'Metrics', name: str, labels: Dict[str, str]):
+        self.metrics = metrics
+        self.name = name
+        self.labels = labels
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.metrics.emit(KIND_TIMING, self.name, time.perf_counter() - self.start, self.labels)
+        return False
+
+
+class _NullTimer:
+    """Shared no-op timer used when no sinks are attached."""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class Metrics:
+    """Fans timings and counters out to pluggable sinks."""
+
+    def __init__(self, sinks: Optional[List[MetricsSink]] = None):
+        self.sinks: List[MetricsSink] = list(sinks or [])
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.sinks)
+
+    def add_sink(self, sink: MetricsSink):
+        """Attach another sink."""
+        self.sinks.append(sink)
+
+    def timer(self, name: str, **labels):
+        """Return a context manager that times its block."""
+        if not self.sinks:
+            return _NULL_TIMER
+        return _Timer(self, name, labels)
+
+    def count(self, name: str, value: float = 1, **labels):
+        """Add ``value`` to a counter."""
+        if self.sinks:
+            self.emit(KIND_COUNTER, name, value, labels)
+
+    def timing(self, name: str, seconds: float, **labels):
+        """Report an already measured duration."""
+        if self.sinks:
+            self.emit(KIND_TIMING, name, seconds, labels)
+
+    def copy_function(self, component: str) -> Callable:
+        """Return a ``shutil.copy2`` replacement that counts bytes and files."""
+        if not self.sinks:
+            return shutil.copy2
+
+        def copy(src, dst, *, follow_symlinks=True):
+            result = shutil.copy2(src, dst, follow_symlinks=follow_symlinks)
+            size = os.lstat(src).st_size
+            self.count('ota_bytes_read_total', size, component=component)
+            self.count('ota_bytes_written_total', size, component=component)
+            self.count('ota_files_touched_total', 1, component=component)
+            return result
+
+        return copy
+
+    def emit(self, kind: str, name: str, value: float, labels: Dict[str, str]):
+        for sink in self.sinks:
+            sink.record(kind, name, value, labels)
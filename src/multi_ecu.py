@@ -0,0 +1,190 @@
+"""
+Multi-ECU Module
+
+Updates several software components of one vehicle in parallel.
+"""
+
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+from .ota_package import OTAPackage
+from .updater import Updater
+from .vehicle import Vehicle
+from .verifier import Verifier
+
+# Component result states
+COMPONENT_SUCCESS = "success"
+COMPONENT_FAILED = "failed"
+COMPONENT_SKIPPED = "skipped"
+COMPONENT_ROLLED_BACK = "rolled_back"
+
+
+class ComponentUpdate:
+    """One component's package within a multi-component campaign.
+
+    ``bus`` names the shared resource the component is flashed over; at
+    most ``bus_limits[bus]`` components on the same bus update at once.
+    A failed optional (``required=False``) component is rolled back on
+    its own without failing the campaign.
+    """
+
+    def __init__(self, component: str, package: OTAPackage, target_dir: str,
+                 bus: Optional[str] = None, required: bool = True,
+                 steps: Optional[List[Callable]] = None):
+        self.component = component
+        self.package = package
+        self.target_dir = target_dir
+        self.bus = bus
+        self.required = required
+        self.steps = list(steps or [])
+
+
+class ComponentResult:
+    """Outcome of one component update."""
+
+    def __init__(self, component: str, status: str = COMPONENT_SKIPPED,
+                 duration: float = 0.0, error: Optional[str] = None):
+        self.component = component
+        self.status = status
+        self.duration = duration
+        self.error = error
+
+    def to_dict(self) -> Dict:
+        """Convert result to dictionary."""
+        return {
+            'component': self.component,
+            'status': self.status,
+            'duration': self.duration,
+            'error': self.error
+        }
+
+
+class CampaignResult:
+    """Outcome of a multi-component campaign."""
+
+    def __init__(self, campaign_id: str, success: bool, results: Dict[str, ComponentResult],
+                 duration: float):
+        self.campaign_id = campaign_id
+        self.success = success
+        self.results = results
+        self.duration = duration
+
+    def to_dict(self) -> Dict:
+        """Convert result to dictionary."""
+        return {
+            'campaign_id': self.campaign_id,
+            'success': self.success,
+            'duration': self.duration,
+            'results': {name: result.to_dict() for name, result in self.results.items()}
+        }
+
+
+class MultiComponentUpdater:
+    """Verifies, installs and rolls back component packages in parallel.
+
+    Each component gets its own ``Updater`` (and backup directory under
+    ``backup_root``), built by ``updater_factory`` if given. Components
+    wait in a queue per bus and are handed to a worker only when their bus
+    has capacity, so a busy bus never holds up components on other buses.
+    Vehicle component versions change only after every required component
+    has succeeded; otherwise all components are rolled back.
+    """
+
+    def __init__(self, verifier: Verifier, backup_root: str = "/tmp/ota_component_backups",
+                 bus_limits: Optional[Dict[str, int]] = None, max_workers: int = 4,
+                 updater_factory: Optional[Callable[[ComponentUpdate], Updater]] = None,
+                 **updater_options):
+        if any(limit < 1 for limit in (bus_limits or {}).values()):
+            raise ValueError("bus limits must be at least 1")
+        self.verifier = verifier
+        self.backup_root = backup_root
+        self.bus_limits = dict(bus_limits or {})
+        self.max_workers = max_workers
+        self.updater_factory = updater_factory or self._default_updater
+        self.updater_options = updater_options
+
+    def _default_updater(self, update: ComponentUpdate) -> Updater:
+        return Updater(self.verifier, os.path.join(self.backup_root, update.component),
+                       **self.updater_options)
+
+    def apply(self, vehicle: Vehicle, updates: List[ComponentUpdate],
+              campaign_id: Optional[str] = None,
+              timestamp: Optional[str] = None) -> CampaignResult:
+        """Update every component and commit or roll back as one unit."""
+        campaign_id = campaign_id or f"campaign_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        names = [update.component for update in updates]
+        if len(set(names)) != len(names):
+            raise ValueError("Each component may appear only once per campaign")
+
+        start = time.perf_counter()
+        abort = threading.Event()
+        results = {update.component: ComponentResult(update.component) for update in updates}
+        updaters: Dict[str, Updater] = {}
+
+        def run(update: ComponentUpdate):
+            if abort.is_set():
+                return
+            result = results[update.component]
+            updater = self.updater_factory(update)
+            for step in update.steps:
+                updater.add_update_step(step)
+            updaters[update.component] = updater
+
+            began = time.perf_counter()
+            try:
+                ok = updater.apply_update(update.package, update.target_dir, keep_backup=True)
+            except Exception as e:
+                ok = False
+                result.error = str(e)
+            result.duration = time.perf_counter() - began
+            result.status = COMPONENT_SUCCESS if ok else COMPONENT_FAILED
+            if not ok and update.required:
+                abort.set()
+
+        # Components queue per bus (None for no bus) in campaign order
+        queues: Dict[Optional[str], deque] = {}
+        for update in updates:
+            queues.setdefault(update.bus, deque()).append(update)
+        busy: Dict[Optional[str], int] = {bus: 0 for bus in queues}
+        running = {}
+
+        workers = max(1, min(self.max_workers, len(updates)))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            while running or (any(queues.values()) and not abort.is_set()):
+                if not abort.is_set():
+                    for bus, queue in queues.items():
+                        limit = self.bus_limits.get(bus, 1) if bus is not None else workers
+                        while queue and busy[bus] < limit and len(running) < workers:
+                            busy[bus] += 1
+                            update = queue.popleft()
+                            running[pool.submit(run, update)] = update
+
+                done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+                for future in done:
+                    busy[running.pop(future).bus] -= 1
+                    future.result()
+
+        success = all(
+            results[update.component].status == COMPONENT_SUCCESS
+            for update in updates if update.required
+        )
+        if success:
+            versions = {}
+            for update in updates:
+                if results[update.component].status == COMPONENT_SUCCESS:
+                    updaters[update.component].discard_backup()
+                    versions[update.component] = update.package.version
+            vehicle.record_component_update(
+                campaign_id, versions, timestamp or datetime.now().isoformat()
+            )
+        else:
+            for update in updates:
+                if results[update.component].status == COMPONENT_SUCCESS:
+                    if updaters[update.component].rollback(update.target_dir):
+                        results[update.component].status = COMPONENT_ROLLED_BACK
+
+        return CampaignResult(campaign_id, success, results, time.perf_counter() - start)
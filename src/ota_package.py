@@ -4,9 +4,18 @@ OTA Package Module
 Handles OTA update packages and manifests.
 """
 
+import base64
 import json
 import hashlib
-from typing import Dict, List, Optional
+import os
+import stat
+from typing import Dict, Iterator, List, Optional, Tuple
+from .buffer_pool import BufferPool
+from .hash_cache import HashCache
+from .merkle import package_root
+
+SIGNATURE_SUFFIX = ".sig"
+HASH_BUFFER_SIZE = 64 * 1024
 
 
 class OTAPackage:
@@ -16,14 +25,68 @@ class OTAPackage:
         self.package_id = package_id
         self.version = version
         self.files = files  # List of dicts with 'path', 'hash', 'size'
+        self.merkle_root: Optional[str] = None
+        self.root_signature: Optional[str] = None  # base64 signature over merkle_root
 
     def to_manifest(self) -> Dict:
         """Generate manifest dictionary."""
-        return {
+        manifest = {
             'package_id': self.package_id,
             'version': self.version,
             'files': self.files
         }
+        if self.merkle_root is not None:
+            manifest['merkle_root'] = self.merkle_root
+        if self.root_signature is not None:
+            manifest['root_signature'] = self.root_signature
+        return manifest
+
+    def manifest_header(self) -> Dict:
+        """Return the manifest dictionary without its file entries."""
+        manifest = self.to_manifest()
+        del manifest['files']
+        return manifest
+
+    def canonical_manifest(self) -> bytes:
+        """Return the byte-exact manifest serialization that gets signed."""
+        return json.dumps(self.to_manifest(), sort_keys=True, separators=(',', ':'),
+                          ensure_ascii=True).encode('utf-8')
+
+    def sign(self, signer) -> bytes:
+        """Return a detached ``Signer`` signature over the canonical manifest."""
+        return signer.sign(self.canonical_manifest())
+
+    def save_signed_manifest(self, path: str, signer) -> str:
+        """Save the manifest and its detached signature; return the signature path."""
+        self.save_manifest(path)
+        signature_path = path + SIGNATURE_SUFFIX
+        with open(signature_path, 'wb') as f:
+            f.write(self.sign(signer))
+        return signature_path
+
+    def compute_merkle_root(self) -> str:
+        """Compute and store the package Merkle root over header and file entries."""
+        self.merkle_root = package_root(self.to_manifest())
+        return self.merkle_root
+
+    def sign_root(self, signer) -> str:
+        """Sign the package Merkle root with a ``Signer``."""
+        root = self.compute_merkle_root()
+        self.root_signature = base64.b64encode(signer.sign(bytes.fromhex(root))).decode('ascii')
+        return self.root_signature
+
+    def payload_files(self) -> Iterator[Tuple[str, str]]:
+        """Yield (relative path, hash) of each payload file shipped in the package."""
+        for file_info in self.files:
+            yield file_info['path'], file_info['hash']
+
+    def open_payload(self, rel_path: str):
+        """Open a payload file for binary reading."""
+        return open(os.path.join(self.package_id, rel_path), 'rb', buffering=0)
+
+    def payload_mode(self, rel_path: str) -> int:
+        """Return the permission bits of a payload file."""
+        return stat.S_IMODE(os.stat(os.path.join(self.package_id, rel_path)).st_mode)
 
     def save_manifest(self, path: str):
         """Save manifest to JSON file."""
@@ -35,15 +98,98 @@ class OTAPackage:
         """Load package from manifest file."""
         with open(path, 'r') as f:
             data = json.load(f)
-        return cls(data['package_id'], data['version'], data['files'])
+        return cls.from_dict(data)
 
+    @staticmethod
+    def load_signature(manifest_path: str) -> bytes:
+        """Load the detached signature saved next to a manifest."""
+        with open(manifest_path + SIGNATURE_SUFFIX, 'rb') as f:
+            return f.read()
 
-def calculate_file_hash(file_path: str) -> str:
-    """Calculate SHA256 hash of a file."""
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'OTAPackage':
+        """Create package from a manifest dictionary."""
+        package = cls(data['package_id'], data['version'], data['files'])
+        package._load_optional_fields(data)
+        return package
+
+    def _load_optional_fields(self, data: Dict):
+        self.merkle_root = data.get('merkle_root')
+        self.root_signature = data.get('root_signature')
+
+
+class DeltaPackage(OTAPackage):
+    """OTA package holding block-level deltas against a base version.
+
+    Each file entry describes the target file ('path', 'hash', 'size') and
+    how to rebuild it from the installed copy: 'ops' is a list of
+    ['copy', base_offset, length] and ['insert', delta_offset, length]
+    operations, with inserted bytes read from the payload at 'delta_path'
+    (hash 'delta_hash'). 'base_hash' is the hash of the installed copy the
+    ops apply to, or None for a new file. ``deleted`` lists the paths
+    removed since the base version.
+    """
+
+    def __init__(self, package_id: str, version: str, base_version: str,
+                 files: List[Dict], deleted: Optional[List[str]] = None):
+        super().__init__(package_id, version, files)
+        self.base_version = base_version
+        self.deleted: List[str] = list(deleted or [])
+
+    def to_manifest(self) -> Dict:
+        """Generate manifest dictionary."""
+        manifest = super().to_manifest()
+        manifest['type'] = 'delta'
+        manifest['base_version'] = self.base_version
+        if self.deleted:
+            manifest['deleted'] = self.deleted
+        return manifest
+
+    def payload_files(self) -> Iterator[Tuple[str, str]]:
+        """Yield (relative path, hash) of each delta payload."""
+        for file_info in self.files:
+            yield file_info['delta_path'], file_info['delta_hash']
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'DeltaPackage':
+        """Create package from a manifest dictionary."""
+        if data.get('type') != 'delta':
+            raise ValueError("Manifest is not a delta package")
+        package = cls(data['package_id'], data['version'], data['base_version'], data['files'],
+                      data.get('deleted'))
+        package._load_optional_fields(data)
+        return package
+
+
+def calculate_file_hash(file_path: str, cache: Optional[HashCache] = None,
+                        pool: Optional[BufferPool] = None) -> str:
+    """Calculate SHA256 hash of a file, using ``cache`` if given.
+
+    The file is read into one reused buffer, borrowed from ``pool`` if given.
+    """
+    if cache is not None:
+        digest = cache.get_or_compute(file_path, lambda path: _sha256_file(path, pool))
+        cache.flush()
+        return digest
+    return _sha256_file(file_path, pool)
+
+
+def _sha256_file(file_path: str, pool: Optional[BufferPool] = None) -> str:
+    if pool is not None:
+        with pool.buffer() as buffer:
+            return _sha256_into(file_path, buffer)
+    return _sha256_into(file_path, bytearray(HASH_BUFFER_SIZE))
+
+
+def _sha256_into(file_path: str, buffer: bytearray) -> str:
     hash_sha256 = hashlib.sha256()
-    with open(file_path, 'rb') as f:
-        for chunk in iter(lambda: f.read(4096), b""):
-            hash_sha256.update(chunk)
+    view = memoryview(buffer)
+    with open(file_path, 'rb', buffering=0) as f:
+        while True:
+            n = f.readinto(buffer)
+            if not n:
+                break
+            hash_sha256.update(view[:n])
     return hash_sha256.hexdigest()
 
 
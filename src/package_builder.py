@@ -0,0 +1,218 @@
+"""
+Package Builder Module
+
+Builds OTA package manifests from a payload directory.
+
+Files are hashed on a thread pool. Given the previous release's
+manifest, files whose size and mtime are unchanged reuse their recorded
+hash (and chunk hashes), so rebuilding after a small change only reads
+the changed files. Files modified within ``RACY_WINDOW_NS`` of being
+hashed get no recorded mtime, since a later edit could keep both size
+and mtime, and are hashed again by the next build.
+
+Usage:
+    python -m src.package_builder my-package --version 1.2.0 --output manifest.json
+    python -m src.package_builder my-package --version 1.3.0 --output new.json \\
+        --previous manifest.json --sign-key private_key.pem
+    python -m src.package_builder my-package --version 1.3.0 --output new.json \\
+        --container my-package.otac --compression lzma
+"""
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from .compact_manifest import MAGIC, CompactManifest, write_compact_manifest
+from .container import METHOD_ZLIB, METHODS, write_container
+from .hash_cache import RACY_WINDOW_NS
+from .merkle import add_chunk_hashes
+from .ota_package import SIGNATURE_SUFFIX, OTAPackage, calculate_file_hash
+
+DEFAULT_BUILD_WORKERS = 8
+
+
+class BuildResult:
+    """A built package and what it took to build it."""
+
+    def __init__(self, package: OTAPackage, hashed: int, reused: int, duration: float):
+        self.package = package
+        self.hashed = hashed
+        self.reused = reused
+        self.duration = duration
+
+
+def scan_payload(payload_dir: str) -> Iterator[Tuple[str, os.stat_result]]:
+    """Yield (relative path, stat) of each regular file, in sorted path order."""
+    stack = [""]
+    while stack:
+        rel_dir = stack.pop()
+        entries = []
+        with os.scandir(os.path.join(payload_dir, rel_dir)) as it:
+            for entry in it:
+                rel_path = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+                if entry.is_symlink():
+                    print(f"Skipping symlink {rel_path}")
+                elif entry.is_dir():
+                    entries.append((rel_path, None))
+                elif entry.is_file():
+                    entries.append((rel_path, entry.stat(follow_symlinks=False)))
+        # Push directories in reverse so files come out in sorted order
+        subdirs = []
+        for rel_path, st in sorted(entries):
+            if st is None:
+                subdirs.append(rel_path)
+            else:
+                yield rel_path, st
+        stack.extend(reversed(subdirs))
+
+
+def load_previous_files(manifest_path: str) -> Dict[str, Dict]:
+    """Map path -> file entry from a JSON or compact manifest."""
+    with open(manifest_path, 'rb') as f:
+        magic = f.read(len(MAGIC))
+    if magic == MAGIC:
+        with CompactManifest(manifest_path) as manifest:
+            return {entry.path: entry.to_dict() for entry in manifest}
+    package = OTAPackage.from_manifest(manifest_path)
+    return {file_info['path']: file_info for file_info in package.files}
+
+
+def _reusable(previous: Optional[Dict], st: os.stat_result, chunk_size: Optional[int]) -> bool:
+    if previous is None or 'mtime_ns' not in previous:
+        return False
+    try:
+        size = int(previous.get('size'))
+    except (TypeError, ValueError):
+        return False
+    if size != st.st_size or previous['mtime_ns'] != st.st_mtime_ns:
+        return False
+    return chunk_size is None or previous.get('chunk_size') == chunk_size
+
+
+def build_package(payload_dir: str, version: str, package_id: Optional[str] = None,
+                  previous: Optional[Dict[str, Dict]] = None,
+                  max_workers: int = DEFAULT_BUILD_WORKERS,
+                  chunk_size: Optional[int] = None, exclude: Iterable[str] = ()) -> BuildResult:
+    """Build an ``OTAPackage`` for every file under ``payload_dir``.
+
+    ``package_id`` defaults to ``payload_dir``, which is where the
+    updater looks for package files. ``previous`` maps paths to the
+    previous release's file entries (see ``load_previous_files``).
+    With ``chunk_size`` set, entries also get chunk hashes and a root.
+    Relative paths in ``exclude`` are left out.
+    """
+    start = time.perf_counter()
+    previous = previous or {}
+    excluded = set(exclude)
+    files: List[Dict] = []
+    to_hash: List[Tuple[Dict, str]] = []
+    reused = 0
+
+    for rel_path, st in scan_payload(payload_dir):
+        if rel_path in excluded:
+            continue
+        old = previous.get(rel_path)
+        if _reusable(old, st, chunk_size):
+            file_info = dict(old)
+            reused += 1
+        else:
+            file_info = {'path': rel_path, 'size': st.st_size, 'mtime_ns': st.st_mtime_ns}
+            to_hash.append((file_info, os.path.join(payload_dir, rel_path)))
+        files.append(file_info)
+
+    def hash_one(item: Tuple[Dict, str]):
+        file_info, path = item
+        file_info['hash'] = calculate_file_hash(path)
+        if chunk_size is not None:
+            add_chunk_hashes(file_info, path, chunk_size)
+        # Too recent to tell from a same-size edit made in the same tick
+        if file_info['mtime_ns'] >= time.time_ns() - RACY_WINDOW_NS:
+            del file_info['mtime_ns']
+
+    if to_hash:
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+            list(pool.map(hash_one, to_hash))
+
+    # Keep 'hash' right after 'path' as in hand-written manifests
+    files = [_ordered(file_info) for file_info in files]
+    package = OTAPackage(package_id or payload_dir, version, files)
+    return BuildResult(package, len(to_hash), reused, time.perf_counter() - start)
+
+
+def _ordered(file_info: Dict) -> Dict:
+    ordered = {'path': file_info['path'], 'hash': file_info['hash'], 'size': file_info['size']}
+    ordered.update(file_info)
+    return ordered
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Build an OTA package manifest.")
+    parser.add_argument('payload_dir', help="Directory holding the package files")
+    parser.add_argument('--version', required=True, help="Package version")
+    parser.add_argument('--output', required=True, help="Manifest path to write")
+    parser.add_argument('--package-id', help="Package ID (default: payload_dir)")
+    parser.add_argument('--previous', help="Previous release manifest to reuse hashes from")
+    parser.add_argument('--workers', type=int, default=DEFAULT_BUILD_WORKERS)
+    parser.add_argument('--chunk-size', type=int, help="Add chunk hashes of this size")
+    parser.add_argument('--merkle-root', action='store_true', help="Add the package Merkle root")
+    parser.add_argument('--sign-key', help="Private key for a detached manifest signature")
+    parser.add_argument('--compact', action='store_true', help="Write the compact binary format")
+    parser.add_argument('--container', help="Also pack manifest and payload into this file")
+    parser.add_argument('--compression', choices=METHODS, default=METHOD_ZLIB,
+                        help="Container member compression")
+    args = parser.parse_args(argv)
+
+    if not os.path.isdir(args.payload_dir):
+        print(f"Payload directory {args.payload_dir} does not exist")
+        return 1
+
+    # Never package our own output if it is written inside the payload
+    exclude = []
+    outputs = [args.output, args.output + SIGNATURE_SUFFIX]
+    if args.container:
+        outputs.append(args.container)
+    for path in outputs:
+        rel_path = os.path.relpath(os.path.abspath(path), os.path.abspath(args.payload_dir))
+        if not rel_path.startswith(os.pardir):
+            exclude.append(rel_path.replace(os.sep, '/'))
+
+    previous = load_previous_files(args.previous) if args.previous else None
+    result = build_package(args.payload_dir, args.version, args.package_id, previous,
+                           args.workers, args.chunk_size, exclude)
+    package = result.package
+
+    signer = None
+    if args.sign_key:
+        from .signer import Signer
+        signer = Signer(args.sign_key)
+    if args.merkle_root:
+        if signer is not None:
+            package.sign_root(signer)
+        else:
+            package.compute_merkle_root()
+
+    if args.compact:
+        if signer is not None and not args.merkle_root:
+            print("Compact manifests are signed through the Merkle root; add --merkle-root")
+            return 1
+        write_compact_manifest(package.to_manifest(), args.output)
+    elif signer is not None:
+        package.save_signed_manifest(args.output, signer)
+    else:
+        package.save_manifest(args.output)
+
+    if args.container:
+        signature = package.sign(signer) if signer is not None else None
+        write_container(package, args.container, args.payload_dir, args.compression,
+                        signature=signature)
+        print(f"Wrote {args.container}: {os.path.getsize(args.container)} bytes")
+
+    print(f"Wrote {args.output}: {len(package.files)} files, {result.hashed} hashed, "
+          f"{result.reused} reused in {result.duration:.2f}s")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,164 @@
+"""
+Package Server Module
+
+Minimal HTTP package server for offline testing of the fetcher.
+
+Serves a directory over HTTP/1.1 with keep-alive and single-range
+``Range: bytes=`` requests, which is all ``PackageFetcher`` needs.
+
+Usage:
+    python -m src.package_server packages --port 8000
+"""
+
+import argparse
+import os
+import re
+import shutil
+import sys
+import threading
+from functools import partial
+from http import HTTPStatus
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+COPY_BLOCK = 64 * 1024
+
+
+class RangeRequestHandler(SimpleHTTPRequestHandler):
+    """Static file handler that also answers single byte-range requests."""
+
+    protocol_version = "HTTP/1.1"
+    quiet = True
+
+    def log_message(self, format, *args):
+        if not self.quiet:
+            super().log_message(format, *args)
+
+    def end_headers(self):
+        self.send_header("Accept-Ranges", "bytes")
+        super().end_headers()
+
+    def do_GET(self):
+        source = self.send_head()
+        if source is None:
+            return
+        try:
+            remaining = getattr(self, '_range_length', None)
+            if remaining is None:
+                shutil.copyfileobj(source, self.wfile)
+                return
+            while remaining > 0:
+                block = source.read(min(COPY_BLOCK, remaining))
+                if not block:
+                    break
+                self.wfile.write(block)
+                remaining -= len(block)
+        finally:
+            source.close()
+
+    def send_head(self):
+        self._range_length = None
+        match = _RANGE.match(self.headers.get("Range", "").strip())
+        if match is None:
+            return super().send_head()
+
+        path = self.translate_path(self.path)
+        if not os.path.isfile(path):
+            self.send_error(HTTPStatus.NOT_FOUND, "File not found")
+            return None
+        size = os.path.getsize(path)
+        first, last = match.groups()
+        if first:
+            start = int(first)
+            end = min(int(last), size - 1) if last else size - 1
+        elif last:
+            start = max(0, size - int(last))
+            end = size - 1
+        else:
+            start, end = 0, -1
+        if start > end or start >= size:
+            self.send_response(HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE)
+            self.send_header("Content-Range", f"bytes */{size}")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return None
+
+        f = open(path, 'rb')
+        f.seek(start)
+        self.send_response(HTTPStatus.PARTIAL_CONTENT)
+        self.send_header("Content-Type", self.guess_type(path))
+        self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        self.send_header("Content-Length", str(end - start + 1))
+        self.end_headers()
+        self._range_length = end - start + 1
+        return f
+
+
+class PackageServer:
+    """Serve ``root`` from a background thread.
+
+    ``port`` 0 picks a free port; ``url`` has the actual address once the
+    server is started. Usable as a context manager.
+    """
+
+    def __init__(self, root: str, host: str = "127.0.0.1", port: int = 0):
+        self.root = root
+        self.host = host
+        self.port = port
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def start(self) -> 'PackageServer':
+        handler = partial(RangeRequestHandler, directory=self.root)
+        self._server = ThreadingHTTPServer((self.host, self.port), handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        kwargs={'poll_interval': 0.1}, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._thread.join()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+        return False
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Serve OTA packages over HTTP with Range support.")
+    parser.add_argument('root', help="Directory to serve")
+    parser.add_argument('--host', default="127.0.0.1")
+    parser.add_argument('--port', type=int, default=8000)
+    args = parser.parse_args(argv)
+
+    if not os.path.isdir(args.root):
+        print(f"Directory {args.root} does not exist")
+        return 1
+    RangeRequestHandler.quiet = False
+    server = PackageServer(args.root, args.host, args.port).start()
+    print(f"Serving {args.root} at {server.url}")
+    try:
+        server._thread.join()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
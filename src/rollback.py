@@ -4,18 +4,127 @@ Rollback Module
 Handles rollback functionality for failed updates.
 """
 
+import hashlib
+import json
 import os
 import shutil
-from typing import Optional, Dict, List
+import tempfile
+import time
+from typing import Optional, Dict, Iterable, List, Tuple
 from datetime import datetime
+from .fastcopy import DEFAULT_COPY_WORKERS, copy_tree, sync_tree
+from .hash_cache import HashCache
+from .metrics import Metrics
+from .ota_package import calculate_file_hash
+
+OBJECTS_DIR = ".objects"
+CATALOG_FILE = "catalog.json"
+CATALOG_VERSION = 1
+
+# Retention policies: evict the oldest-created or the least recently used first
+RETENTION_AGE = "age"
+RETENTION_LRU = "lru"
+
+
+class SnapshotCatalog:
+    """Durable record of snapshots, stored as JSON next to them.
+
+    Each entry holds creation and last-use times, file count and size, so
+    a restarted process knows its snapshots without walking their trees.
+    Writes go to a temporary file that atomically replaces the catalog.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.entries: Dict[str, Dict] = {}
+        self.objects_bytes = 0  # bytes held by the content-addressed store
+        self.load()
+
+    def load(self):
+        """Load the catalog, starting empty if it is missing or unreadable."""
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Ignoring unreadable snapshot catalog {self.path}: {e}")
+            return
+        if data.get('version') != CATALOG_VERSION:
+            return
+        self.entries = data.get('snapshots', {})
+        self.objects_bytes = data.get('objects_bytes', 0)
+
+    def save(self):
+        """Atomically write the catalog to disk."""
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.catalog_')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump({
+                    'version': CATALOG_VERSION,
+                    'objects_bytes': self.objects_bytes,
+                    'snapshots': self.entries
+                }, f, indent=2)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, self.path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            raise
 
 
 class RollbackManager:
-    """Manages rollback operations for OTA updates."""
+    """Manages rollback operations for OTA updates.
 
-    def __init__(self, backup_dir: str = "/tmp/ota_backups"):
+    With ``content_addressed`` set, file contents are stored once under
+    ``<backup_dir>/.objects`` by SHA256 and each snapshot is a tree of
+    hardlinks into that store, so unchanged files cost no extra space.
+
+    Snapshot, rollback and cleanup timings plus bytes and files copied are
+    reported through ``metrics``. Trees are copied by ``copy_workers``
+    threads.
+
+    Snapshots are recorded in ``<backup_dir>/catalog.json`` and reloaded
+    on start. After each new snapshot, older ones are evicted (per
+    ``retention_policy``) until at most ``max_snapshots`` remain and the
+    backup directory holds at most ``max_bytes``.
+    """
+
+    def __init__(self, backup_dir: str = "/tmp/ota_backups", content_addressed: bool = False,
+                 hash_cache: Optional[HashCache] = None, metrics: Optional[Metrics] = None,
+                 copy_workers: int = DEFAULT_COPY_WORKERS, max_snapshots: Optional[int] = None,
+                 max_bytes: Optional[int] = None, retention_policy: str = RETENTION_AGE):
+        if retention_policy not in (RETENTION_AGE, RETENTION_LRU):
+            raise ValueError(f"Unknown retention policy: {retention_policy}")
         self.backup_dir = backup_dir
+        self.metrics = metrics or Metrics()
+        self.copy_workers = copy_workers
+        self.content_addressed = content_addressed
+        self.hash_cache = hash_cache
+        self.max_snapshots = max_snapshots
+        self.max_bytes = max_bytes
+        self.retention_policy = retention_policy
         self.snapshots: Dict[str, str] = {}  # snapshot_id -> path
+        self.objects_dir = os.path.join(backup_dir, OBJECTS_DIR)
+        self.catalog = SnapshotCatalog(os.path.join(backup_dir, CATALOG_FILE))
+        self._load_catalog()
+
+    def _load_catalog(self):
+        """Register cataloged snapshots whose directories still exist."""
+        stale = []
+        for snapshot_id in self.catalog.entries:
+            path = os.path.join(self.backup_dir, snapshot_id)
+            if os.path.isdir(path):
+                self.snapshots[snapshot_id] = path
+            else:
+                stale.append(snapshot_id)
+        for snapshot_id in stale:
+            del self.catalog.entries[snapshot_id]
+        if stale:
+            self.catalog.save()
 
     def create_snapshot(self, source_dir: str, snapshot_id: Optional[str] = None) -> str:
         """Create a snapshot of the current state."""
@@ -23,15 +132,131 @@ class RollbackManager:
             snapshot_id = f"snapshot_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
 
         snapshot_path = os.path.join(self.backup_dir, snapshot_id)
-        if os.path.exists(snapshot_path):
-            shutil.rmtree(snapshot_path)
+        with self.metrics.timer('ota_snapshot_seconds', operation='create'):
+            if os.path.exists(snapshot_path):
+                shutil.rmtree(snapshot_path)
 
-        shutil.copytree(source_dir, snapshot_path)
+            if self.content_addressed:
+                files, size = self._create_linked_snapshot(source_dir, snapshot_path)
+            else:
+                stats = copy_tree(source_dir, snapshot_path, self.copy_workers,
+                                  metrics=self.metrics, component='snapshot')
+                files, size = stats.files_copied, stats.bytes_copied
         self.snapshots[snapshot_id] = snapshot_path
+
+        now = time.time()
+        self.catalog.entries[snapshot_id] = {
+            'created_at': datetime.fromtimestamp(now).isoformat(),
+            'created_ts': now,
+            'last_used_ts': now,
+            'source_dir': os.path.abspath(source_dir),
+            'files': files,
+            'size': size,
+            'content_addressed': self.content_addressed
+        }
+        self.catalog.save()
+        if self.max_snapshots is not None or self.max_bytes is not None:
+            self.enforce_retention(self.max_snapshots, self.max_bytes, protect=[snapshot_id])
         return snapshot_id
 
-    def rollback_to_snapshot(self, snapshot_id: str, target_dir: str) -> bool:
-        """Rollback to a specific snapshot."""
+    def _create_linked_snapshot(self, source_dir: str, snapshot_path: str) -> Tuple[int, int]:
+        """Build a snapshot as a tree of hardlinks into the object store.
+
+        Returns the number and total size of files in the snapshot.
+        """
+        count = 0
+        total = 0
+        for root, dirs, files in os.walk(source_dir):
+            rel_root = os.path.relpath(root, source_dir)
+            dst_root = os.path.normpath(os.path.join(snapshot_path, rel_root))
+            os.makedirs(dst_root, exist_ok=True)
+
+            for name in dirs:
+                src = os.path.join(root, name)
+                if os.path.islink(src):
+                    os.symlink(os.readlink(src), os.path.join(dst_root, name))
+
+            for name in files:
+                src = os.path.join(root, name)
+                dst = os.path.join(dst_root, name)
+                if os.path.islink(src):
+                    os.symlink(os.readlink(src), dst)
+                    continue
+                blob = self._store_blob(src)
+                try:
+                    os.link(blob, dst)
+                except OSError:
+                    # e.g. too many links to one inode
+                    shutil.copy2(blob, dst)
+                count += 1
+                total += os.lstat(dst).st_size
+
+        if self.hash_cache is not None:
+            self.hash_cache.flush()
+        return count, total
+
+    def _blob_path(self, digest: str) -> str:
+        return os.path.join(self.objects_dir, digest[:2], digest[2:])
+
+    def _store_blob(self, file_path: str) -> str:
+        """Store a file's content in the object store, copying only new content."""
+        if self.hash_cache is not None:
+            digest = self.hash_cache.get_or_compute(file_path, calculate_file_hash)
+        else:
+            digest = calculate_file_hash(file_path)
+        blob = self._blob_path(digest)
+        if os.path.exists(blob):
+            return blob
+
+        # Name the blob by what was actually copied, in case the file changed
+        os.makedirs(self.objects_dir, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=self.objects_dir, prefix='.blob_')
+        try:
+            hash_sha256 = hashlib.sha256()
+            with open(file_path, 'rb') as src, os.fdopen(fd, 'wb') as dst:
+                for chunk in iter(lambda: src.read(1024 * 1024), b""):
+                    hash_sha256.update(chunk)
+                    dst.write(chunk)
+            shutil.copystat(file_path, temp_path)
+            size = os.path.getsize(temp_path)
+            self.metrics.count('ota_bytes_read_total', size, component='snapshot')
+            self.metrics.count('ota_bytes_written_total', size, component='snapshot')
+            blob = self._blob_path(hash_sha256.hexdigest())
+            os.makedirs(os.path.dirname(blob), exist_ok=True)
+            if not os.path.exists(blob):
+                self.catalog.objects_bytes += size
+            os.replace(temp_path, blob)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            raise
+        return blob
+
+    def collect_garbage(self) -> int:
+        """Remove stored blobs no snapshot links to. Returns bytes freed."""
+        freed = 0
+        if not os.path.isdir(self.objects_dir):
+            return freed
+        for root, _, files in os.walk(self.objects_dir):
+            for name in files:
+                blob = os.path.join(root, name)
+                st = os.lstat(blob)
+                if st.st_nlink <= 1:
+                    os.unlink(blob)
+                    freed += st.st_size
+        self.metrics.count('ota_snapshot_bytes_freed_total', freed)
+        if freed:
+            self.catalog.objects_bytes = max(0, self.catalog.objects_bytes - freed)
+            self.catalog.save()
+        return freed
+
+    def rollback_to_snapshot(self, snapshot_id: str, target_dir: str,
+                             differential: bool = False, compare_hash: bool = False) -> bool:
+        """Rollback to a specific snapshot.
+
+        With ``differential`` set only files whose size or mtime (or, with
+        ``compare_hash``, content) differ from the snapshot are rewritten.
+        """
         if snapshot_id not in self.snapshots:
             print(f"Snapshot {snapshot_id} not found")
             return False
@@ -41,50 +266,123 @@ class RollbackManager:
             print(f"Snapshot path {snapshot_path} does not exist")
             return False
 
+        entry = self.catalog.entries.get(snapshot_id)
+        if entry is not None:
+            entry['last_used_ts'] = time.time()
+            self.catalog.save()
+
         try:
-            # Remove current state
-            for item in os.listdir(target_dir):
-                item_path = os.path.join(target_dir, item)
-                if os.path.isfile(item_path) or os.path.islink(item_path):
-                    os.unlink(item_path)
-                elif os.path.isdir(item_path):
-                    shutil.rmtree(item_path)
-
-            # Restore from snapshot
-            for item in os.listdir(snapshot_path):
-                src = os.path.join(snapshot_path, item)
-                dst = os.path.join(target_dir, item)
-                if os.path.isdir(src):
-                    shutil.copytree(src, dst)
-                else:
-                    shutil.copy2(src, dst)
+            with self.metrics.timer('ota_snapshot_seconds', operation='rollback'):
+                if differential:
+                    sync_tree(snapshot_path, target_dir, self.copy_workers,
+                              compare_hash=compare_hash, metrics=self.metrics,
+                              component='snapshot_rollback')
+                    return True
+
+                # Remove current state
+                for item in os.listdir(target_dir):
+                    item_path = os.path.join(target_dir, item)
+                    if os.path.isfile(item_path) or os.path.islink(item_path):
+                        os.unlink(item_path)
+                    elif os.path.isdir(item_path):
+                        shutil.rmtree(item_path)
+
+                # Restore from snapshot
+                sync_tree(snapshot_path, target_dir, self.copy_workers,
+                          metrics=self.metrics, component='snapshot_rollback')
 
             return True
 
         except Exception as e:
             print(f"Rollback failed: {e}")
+            self.metrics.count('ota_snapshot_failures_total', operation='rollback')
             return False
 
     def list_snapshots(self) -> List[str]:
         """List available snapshots."""
         return list(self.snapshots.keys())
 
-    def delete_snapshot(self, snapshot_id: str) -> bool:
-        """Delete a snapshot."""
+    def delete_snapshot(self, snapshot_id: str, collect: bool = True) -> bool:
+        """Delete a snapshot and, unless ``collect`` is False, unreferenced blobs."""
         if snapshot_id not in self.snapshots:
             return False
 
         snapshot_path = self.snapshots[snapshot_id]
-        if os.path.exists(snapshot_path):
-            shutil.rmtree(snapshot_path)
+        with self.metrics.timer('ota_snapshot_seconds', operation='delete'):
+            if os.path.exists(snapshot_path):
+                shutil.rmtree(snapshot_path)
 
-        del self.snapshots[snapshot_id]
+            del self.snapshots[snapshot_id]
+            if self.catalog.entries.pop(snapshot_id, None) is not None:
+                self.catalog.save()
+            if collect and self.content_addressed:
+                self.collect_garbage()
         return True
 
+    def snapshot_info(self, snapshot_id: str) -> Optional[Dict]:
+        """Return the catalog entry of a snapshot."""
+        entry = self.catalog.entries.get(snapshot_id)
+        return dict(entry) if entry is not None else None
+
+    def disk_usage(self) -> int:
+        """Bytes used by snapshots, counting shared content once."""
+        usage = self.catalog.objects_bytes
+        for snapshot_id in self.snapshots:
+            entry = self.catalog.entries.get(snapshot_id, {})
+            if not entry.get('content_addressed'):
+                usage += entry.get('size', 0)
+        return usage
+
+    def _eviction_order(self) -> List[str]:
+        """Snapshot IDs, first to evict first."""
+        key = 'last_used_ts' if self.retention_policy == RETENTION_LRU else 'created_ts'
+        return sorted(
+            self.snapshots,
+            key=lambda sid: (self.catalog.entries.get(sid, {}).get(key, 0), sid)
+        )
+
+    def enforce_retention(self, max_count: Optional[int] = None, max_bytes: Optional[int] = None,
+                          protect: Iterable[str] = ()) -> List[str]:
+        """Evict snapshots until both limits hold. Returns the deleted IDs.
+
+        Snapshots in ``protect`` are never evicted, even if that leaves a
+        limit exceeded.
+        """
+        protected = set(protect)
+        candidates = [sid for sid in self._eviction_order() if sid not in protected]
+        deleted: List[str] = []
+
+        if max_count is not None:
+            excess = len(self.snapshots) - max_count
+            for snapshot_id in candidates[:max(excess, 0)]:
+                self.delete_snapshot(snapshot_id, collect=False)
+                deleted.append(snapshot_id)
+            if deleted and self.content_addressed:
+                self.collect_garbage()
+
+        if max_bytes is not None:
+            remaining = candidates[len(deleted):]
+            usage = self.disk_usage()
+            while usage > max_bytes and remaining:
+                # Count each snapshot's catalog size as freed and collect blobs
+                # once per pass. Blobs shared with kept snapshots are not freed,
+                # so a content-addressed store may need another pass.
+                evicted = 0
+                while usage > max_bytes and remaining:
+                    snapshot_id = remaining.pop(0)
+                    usage -= self.catalog.entries.get(snapshot_id, {}).get('size', 0)
+                    self.delete_snapshot(snapshot_id, collect=False)
+                    deleted.append(snapshot_id)
+                    evicted += 1
+                if evicted and self.content_addressed:
+                    self.collect_garbage()
+                usage = self.disk_usage()
+            if usage > max_bytes:
+                print(f"Snapshots use {usage} bytes, over the {max_bytes} byte budget")
+
+        self.metrics.count('ota_snapshots_evicted_total', len(deleted))
+        return deleted
+
     def cleanup_old_snapshots(self, keep_count: int = 5):
         """Keep only the most recent snapshots."""
-        sorted_snapshots = sorted(self.snapshots.keys(), reverse=True)
-        to_delete = sorted_snapshots[keep_count:]
-
-        for snapshot_id in to_delete:
-            self.delete_snapshot(snapshot_id)
\ No newline at end of file
+        self.enforce_retention(max_count=keep_count)
\ No newline at end of file
@@ -0,0 +1,171 @@
+"""
+Scheduler Module
+
+Runs update steps as a dependency graph on a bounded thread pool.
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Callable, Dict, Iterable, List, Optional
+from .metrics import Metrics
+
+
+class UpdateStep:
+    """An update step with a name, dependencies and resource tags.
+
+    ``depends_on`` lists the names of steps that must succeed first; None
+    means "after the previously added step", which keeps plain steps
+    sequential. Steps sharing a resource tag (e.g. a CAN bus) never run at
+    the same time. A ``cancellable`` step is called with a ``cancel_event``
+    keyword argument that is set when another step fails.
+
+    A journaled update that crashed while a step was running only resumes
+    by running that step again if it is ``idempotent``; otherwise the
+    target is rolled back to its backup and the update starts over.
+    """
+
+    def __init__(self, func: Callable, name: Optional[str] = None,
+                 depends_on: Optional[Iterable[str]] = None,
+                 resources: Iterable[str] = (), cancellable: bool = False,
+                 idempotent: bool = False):
+        self.func = func
+        self.name = name or getattr(func, '__name__', type(func).__name__)
+        self.depends_on = list(depends_on) if depends_on is not None else None
+        self.resources = frozenset(resources or ())
+        self.cancellable = cancellable
+        self.idempotent = idempotent
+        self.__name__ = self.name
+
+    def __call__(self, package, target_dir: str,
+                 cancel_event: Optional[threading.Event] = None) -> bool:
+        if self.cancellable:
+            return self.func(package, target_dir, cancel_event=cancel_event)
+        return self.func(package, target_dir)
+
+    def __repr__(self) -> str:
+        return f"UpdateStep({self.name!r})"
+
+
+def resolve_steps(steps: List[Callable]) -> List[UpdateStep]:
+    """Wrap plain callables and fill in implicit "previous step" dependencies."""
+    resolved: List[UpdateStep] = []
+    names = set()
+    for step in steps:
+        if not isinstance(step, UpdateStep):
+            step = UpdateStep(step)
+        name = step.name
+        suffix = 2
+        while name in names:
+            name = f"{step.name}#{suffix}"
+            suffix += 1
+        depends_on = step.depends_on
+        if depends_on is None:
+            depends_on = [resolved[-1].name] if resolved else []
+        resolved_step = UpdateStep(step.func, name, depends_on, step.resources, step.cancellable,
+                                   step.idempotent)
+        resolved.append(resolved_step)
+        names.add(name)
+
+    for step in resolved:
+        for dependency in step.depends_on:
+            if dependency not in names:
+                raise ValueError(f"Step {step.name} depends on unknown step {dependency}")
+    _check_acyclic(resolved)
+    return resolved
+
+
+def _check_acyclic(steps: List[UpdateStep]):
+    remaining = {step.name: set(step.depends_on) for step in steps}
+    while remaining:
+        ready = [name for name, deps in remaining.items() if not deps]
+        if not ready:
+            raise ValueError(f"Update steps have a dependency cycle: {sorted(remaining)}")
+        for name in ready:
+            del remaining[name]
+        for deps in remaining.values():
+            deps.difference_update(ready)
+
+
+class StepScheduler:
+    """Runs update steps concurrently, respecting dependencies and resources."""
+
+    def __init__(self, max_workers: int = 4, metrics: Optional[Metrics] = None):
+        if max_workers < 1:
+            raise ValueError("max_workers must be at least 1")
+        self.max_workers = max_workers
+        self.metrics = metrics or Metrics()
+
+    def run(self, steps: List[Callable], package, target_dir: str,
+            completed: Iterable[str] = (),
+            on_complete: Optional[Callable[[str], None]] = None,
+            on_start: Optional[Callable[[str], None]] = None) -> bool:
+        """Run all steps; stop launching new ones after the first failure.
+
+        Steps named in ``completed`` (finished by an earlier, interrupted
+        run) count as succeeded without being called. ``on_start`` is
+        called with the name of each step just before it runs and
+        ``on_complete`` with the name of each step that succeeds.
+
+        Returns True only if every step returned a truthy value.
+        """
+        resolved = resolve_steps(steps)
+        if not resolved:
+            return True
+
+        dependents: Dict[str, List[UpdateStep]] = {step.name: [] for step in resolved}
+        waiting: Dict[str, int] = {}
+        for step in resolved:
+            waiting[step.name] = len(step.depends_on)
+            for dependency in step.depends_on:
+                dependents[dependency].append(step)
+
+        completed = set(completed)
+        ready = [step for step in resolved if not step.depends_on]
+        cancel = threading.Event()
+        held = set()
+        running = {}
+        failed = False
+
+        def execute(step: UpdateStep) -> bool:
+            if cancel.is_set():
+                return False
+            if step.name in completed:
+                return True
+            if on_start is not None:
+                on_start(step.name)
+            with self.metrics.timer('ota_update_step_seconds', step=step.name):
+                return bool(step(package, target_dir, cancel_event=cancel))
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            while (ready and not failed) or running:
+                if not failed:
+                    for step in list(ready):
+                        if len(running) >= self.max_workers:
+                            break
+                        if step.resources & held:
+                            continue
+                        ready.remove(step)
+                        held |= step.resources
+                        running[pool.submit(execute, step)] = step
+
+                done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+                for future in done:
+                    step = running.pop(future)
+                    held -= step.resources
+                    try:
+                        ok = future.result()
+                    except Exception as e:
+                        print(f"Update step {step.name} failed: {e}")
+                        ok = False
+                    if not ok:
+                        failed = True
+                        cancel.set()
+                        continue
+                    if on_complete is not None and step.name not in completed:
+                        on_complete(step.name)
+                    for dependent in dependents[step.name]:
+                        waiting[dependent.name] -= 1
+                        if not waiting[dependent.name]:
+                            ready.append(dependent)
+
+        return not failed
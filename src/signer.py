@@ -0,0 +1,28 @@
+"""
+Signer Module
+
+Handles signing of OTA package data on the build side.
+"""
+
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric import padding
+from cryptography.hazmat.primitives import serialization
+
+
+class Signer:
+    """Signs data with an RSA private key using RSA-PSS/SHA256."""
+
+    def __init__(self, private_key_path: str, password: bytes = None):
+        with open(private_key_path, 'rb') as f:
+            self.private_key = serialization.load_pem_private_key(f.read(), password=password)
+
+    def sign(self, data: bytes) -> bytes:
+        """Sign data; verifiable with Verifier.verify_signature."""
+        return self.private_key.sign(
+            data,
+            padding.PSS(
+                mgf=padding.MGF1(hashes.SHA256()),
+                salt_length=padding.PSS.MAX_LENGTH
+            ),
+            hashes.SHA256()
+        )
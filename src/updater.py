@@ -4,76 +4,592 @@ Updater Module
 Handles the logic for applying OTA updates.
 """
 
+import json
 import os
 import shutil
-from typing import List, Dict, Callable
-from .ota_package import OTAPackage
-from .verifier import Verifier
+from typing import List, Dict, Callable, Iterator, Optional
+from .ota_package import OTAPackage, DeltaPackage
+from .buffer_pool import BufferPool
+from .container import ContainerPackage
+from .delta import install_delta
+from .fastcopy import DEFAULT_COPY_WORKERS, copy_tree, sync_tree
+from .slots import ABSlots
+from .installer import StreamingInstaller
+from .journal import (OUTCOME_COMMITTED, OUTCOME_ROLLED_BACK, JournalState, UpdateJournal,
+                      manifest_digest)
+from .metrics import Metrics
+from .scheduler import StepScheduler, UpdateStep, resolve_steps
+from .verifier import Verifier, FileVerificationResult, VerificationSummary, STATUS_OK
+
+BACKUP_FULL = "full"
+BACKUP_INCREMENTAL = "incremental"
+BACKUP_MANIFEST = ".ota_backup_manifest.json"
+PARTIAL_DIR_SUFFIX = ".partial"
+
+INSTALL_IN_PLACE = "in_place"
+INSTALL_AB = "ab"
+
+# Files handed to the verifier at a time, so huge manifests are streamed
+VERIFY_BATCH_SIZE = 1024
+
+RECOVERY_NONE = "none"
+RECOVERY_COMPLETED = "completed"
+RECOVERY_ROLLED_BACK = "rolled_back"
+
+
+class RecoveryError(RuntimeError):
+    """An interrupted update cannot be undone; its journal stays in progress."""
 
 
 class Updater:
-    """Manages OTA update application."""
+    """Manages OTA update application.
+
+    ``backup_mode`` selects what is saved before an update: ``full`` copies
+    the whole target directory, ``incremental`` saves only the paths listed
+    in the package and records which ones it will create.
+
+    ``install_mode`` ``ab`` builds the new tree in the inactive slot of an
+    A/B pair (see ``ABSlots``) and activates it with a symlink swap; no
+    backup is taken because the previous slot is kept intact.
+
+    With ``streaming_install`` set, package files are copied into place by
+    a built-in ``StreamingInstaller`` that verifies them in the same pass,
+    instead of being read once for verification and again by a step.
+    Packages opened from a container (``ContainerPackage``) are always
+    installed this way, decompressing each member as it is copied.
+
+    Phase and step timings, bytes and files touched, and failures are
+    reported through ``metrics``; pass the same ``Metrics`` to the
+    ``Verifier`` to include hashing throughput.
+
+    Steps added with a name, dependencies or resource tags run as a graph
+    on up to ``max_parallel_steps`` threads; plain steps keep running one
+    after another in the order they were added.
+
+    Full backups are copied by ``copy_workers`` threads. With
+    ``differential_rollback`` set, rolling back from a full backup
+    rewrites only the files whose size or mtime changed.
 
-    def __init__(self, verifier: Verifier, backup_dir: str = "/tmp/ota_backup"):
+    With ``journal_path`` set, in-place updates keep a write-ahead journal
+    (see ``UpdateJournal``). If the process dies mid-update, applying the
+    same package again resumes it: a finished backup is kept, files already
+    verified (and unchanged since) or installed are skipped, and finished
+    steps are not run again. ``recover`` does the same at startup, or rolls
+    the target back when the package is not given.
+
+    The verification inside ``apply_update`` rereads every file, since it
+    guards what gets installed; pass ``strict_verification=False`` to let
+    it trust the verifier's hash cache. ``verify_package``, for explicit
+    pre-checks and retries, uses the cache unless told to be strict.
+
+    Partial copies of chunked files are kept in ``<backup_dir>.partial``,
+    outside the target, so a rollback leaves them in place and retrying
+    the update resumes them. Packages carrying a signed Merkle root have
+    it checked before anything is installed when the verifier has a key.
+
+    With ``buffer_pool`` set, the streaming installer and backup/rollback
+    copies borrow their I/O buffers from it, so the update's buffer memory
+    stays within the pool's capacity (pass the same pool to the
+    ``Verifier`` to cover hashing too). Workers wait for a free buffer
+    rather than allocating their own.
+    """
+
+    def __init__(self, verifier: Verifier, backup_dir: str = "/tmp/ota_backup",
+                 strict_verification: bool = True, backup_mode: str = BACKUP_FULL,
+                 install_mode: str = INSTALL_IN_PLACE, streaming_install: bool = False,
+                 metrics: Optional[Metrics] = None, max_parallel_steps: int = 4,
+                 copy_workers: int = DEFAULT_COPY_WORKERS, differential_rollback: bool = False,
+                 journal_path: Optional[str] = None,
+                 buffer_pool: Optional[BufferPool] = None):
+        if backup_mode not in (BACKUP_FULL, BACKUP_INCREMENTAL):
+            raise ValueError(f"Unknown backup mode: {backup_mode}")
+        if install_mode not in (INSTALL_IN_PLACE, INSTALL_AB):
+            raise ValueError(f"Unknown install mode: {install_mode}")
         self.verifier = verifier
         self.backup_dir = backup_dir
+        self.backup_mode = backup_mode
+        self.partial_dir = os.path.normpath(backup_dir) + PARTIAL_DIR_SUFFIX
+        self.install_mode = install_mode
+        self.metrics = metrics or Metrics()
+        self.copy_workers = copy_workers
+        self.differential_rollback = differential_rollback
+        self.buffer_pool = buffer_pool
+        self.scheduler = StepScheduler(max_parallel_steps, self.metrics)
+        self.installer = StreamingInstaller(verifier.buffer_size, self.metrics, buffer_pool,
+                                            self.partial_dir) if streaming_install else None
+        self.strict_verification = strict_verification  # bypass the hash cache in apply_update
+        self.journal = UpdateJournal(journal_path) if journal_path else None
+        self._journal_state = JournalState()  # progress of the update being applied
         self.update_steps: List[Callable] = []
+        self.last_verification = VerificationSummary()
+
+    def add_update_step(self, step: Callable, name: Optional[str] = None,
+                        depends_on: Optional[List[str]] = None,
+                        resources: Optional[List[str]] = None, cancellable: bool = False,
+                        idempotent: bool = False):
+        """Add a step to the update process.
 
-    def add_update_step(self, step: Callable):
-        """Add a step to the update process."""
+        ``depends_on`` names the steps this one waits for (an empty list
+        means it can start right away); ``resources`` tags steps that must
+        not overlap. Only an ``idempotent`` step is re-run when resuming an
+        update that crashed inside it. See ``UpdateStep``.
+        """
+        if name is not None or depends_on is not None or resources or cancellable or idempotent:
+            step = UpdateStep(step, name, depends_on, resources or (), cancellable, idempotent)
         self.update_steps.append(step)
 
-    def apply_update(self, package: OTAPackage, target_dir: str) -> bool:
-        """Apply the OTA update package."""
+    def apply_update(self, package: OTAPackage, target_dir: str, keep_backup: bool = False) -> bool:
+        """Apply the OTA update package.
+
+        With ``keep_backup`` set, a successful update keeps its backup so a
+        caller coordinating several updates can still ``rollback`` it, and
+        must call ``discard_backup`` once everything has committed.
+        """
+        if self.install_mode == INSTALL_AB:
+            return self._apply_ab_update(package, target_dir)
+
+        state = self._start_journal(package, target_dir)
         try:
             # Create backup
-            self._create_backup(target_dir)
+            if 'backup' not in state.phases:
+                with self._phase('backup'):
+                    self._create_backup(target_dir, package)
+                self._journal_phase('backup')
 
             # Verify package
-            if not self._verify_package(package):
-                self._rollback(target_dir)
-                return False
-
-            # Apply update steps
-            for step in self.update_steps:
-                if not step(package, target_dir):
+            if 'verify' not in state.phases:
+                if not self._pre_verify(package):
+                    self._fail('verification')
                     self._rollback(target_dir)
+                    self._end_journal(OUTCOME_ROLLED_BACK)
                     return False
+                self._journal_phase('verify')
+
+            # Install and run update steps
+            if not self._install(package, target_dir):
+                self._fail('install')
+                self._rollback(target_dir)
+                self._end_journal(OUTCOME_ROLLED_BACK)
+                return False
 
+            self._end_journal(OUTCOME_COMMITTED)
             # Clean up backup on success
-            self._cleanup_backup()
+            with self._phase('cleanup'):
+                if not keep_backup:
+                    self._cleanup_backup()
+                self._cleanup_partials()
+            self.metrics.count('ota_updates_total', result='success')
             return True
 
         except Exception as e:
             print(f"Update failed: {e}")
+            self._fail('exception')
             self._rollback(target_dir)
+            self._end_journal(OUTCOME_ROLLED_BACK)
             return False
 
-    def _verify_package(self, package: OTAPackage) -> bool:
-        """Verify all files in the package."""
-        for file_info in package.files:
-            file_path = os.path.join(package.package_id, file_info['path'])
-            if not os.path.exists(file_path):
-                print(f"File not found: {file_path}")
+        finally:
+            self._journal_state = JournalState()
+
+    def recover(self, package: Optional[OTAPackage] = None) -> str:
+        """Finish or undo an update the journal shows was interrupted.
+
+        If ``package`` is the interrupted update's package, the update is
+        resumed; otherwise the target is rolled back. Returns
+        ``RECOVERY_NONE`` when there was nothing to recover,
+        ``RECOVERY_COMPLETED`` or ``RECOVERY_ROLLED_BACK``.
+
+        Rolling back restores from the backup directory and mode recorded
+        in the journal, not this updater's. Raises ``RecoveryError`` if the
+        target was touched and that backup is gone.
+        """
+        if self.journal is None:
+            return RECOVERY_NONE
+        state = self.journal.replay()
+        if not state.in_progress:
+            return RECOVERY_NONE
+        target_dir = state.begin['target_dir']
+        if package is not None and self._can_resume(state, package, target_dir):
+            if self.apply_update(package, target_dir):
+                return RECOVERY_COMPLETED
+            return RECOVERY_ROLLED_BACK
+        self._recover_rollback(state)
+        return RECOVERY_ROLLED_BACK
+
+    def _start_journal(self, package: OTAPackage, target_dir: str) -> JournalState:
+        """Begin journaling an update, or pick up an interrupted run of it."""
+        if self.journal is None:
+            return self._journal_state
+        state = self.journal.replay()
+        if state.in_progress:
+            if self._can_resume(state, package, target_dir):
+                print(f"Resuming interrupted update {package.package_id}")
+                self.journal.resume(state)
+                self.metrics.count('ota_journal_recoveries_total', action='resumed')
+                self._journal_state = state
+                return state
+            self._recover_rollback(state)
+        self.journal.begin(package, target_dir, self.backup_dir, self.backup_mode)
+        return self._journal_state
+
+    def _can_resume(self, state: JournalState, package: OTAPackage, target_dir: str) -> bool:
+        """True if ``state`` is an interrupted run of this update that can continue.
+
+        Continuing needs the same backup, and any step the crash interrupted
+        must be safe to run again.
+        """
+        if not (state.matches(manifest_digest(package), target_dir)
+                and state.begin.get('backup_dir') == self.backup_dir
+                and state.begin.get('backup_mode') == self.backup_mode):
+            return False
+        idempotent = {step.name for step in resolve_steps(self.update_steps) if step.idempotent}
+        unsafe = state.interrupted_steps - idempotent
+        if unsafe:
+            print(f"Update was interrupted during steps {sorted(unsafe)}, which cannot be re-run")
+            return False
+        return True
+
+    def _recover_rollback(self, state: JournalState):
+        """Undo an interrupted update that will not be resumed."""
+        begin = state.begin
+        target_dir = begin['target_dir']
+        backup_dir = begin.get('backup_dir', self.backup_dir)
+        # Before install or steps started the target was never touched
+        touched = 'backup' in state.phases and bool(state.started & {'install', 'steps'})
+        if touched and not _backup_exists(backup_dir, begin.get('backup_mode', BACKUP_FULL)):
+            self.metrics.count('ota_journal_recoveries_total', action='failed')
+            raise RecoveryError(f"Backup {backup_dir} of interrupted update {begin['package_id']} "
+                                f"is missing; {target_dir} was left as it is")
+        print(f"Rolling back interrupted update {begin['package_id']} of {target_dir}")
+        self.journal.resume(state)
+        if touched:
+            self._rollback(target_dir, backup_dir)
+        self._cleanup_backup(backup_dir)
+        self.journal.end(OUTCOME_ROLLED_BACK)
+        self.metrics.count('ota_journal_recoveries_total', action='rolled_back')
+
+    def _journaling(self) -> bool:
+        return self.journal is not None and self.journal.active
+
+    def _journal_phase(self, name: str, done: bool = True):
+        if self._journaling():
+            if done:
+                self.journal.phase_done(name)
+            else:
+                self.journal.phase_started(name)
+
+    def _journal_step_started(self, name: str):
+        if self._journaling():
+            self.journal.step_started(name)
+
+    def _journal_step(self, name: str):
+        if self._journaling():
+            self.journal.step_done(name)
+
+    def _journal_installed(self, rel_path: str):
+        if self._journaling():
+            self.journal.installed(rel_path)
+
+    def _end_journal(self, outcome: str):
+        if self._journaling():
+            self.journal.end(outcome)
+
+    def _phase(self, name: str):
+        """Time one phase of the update."""
+        return self.metrics.timer('ota_update_phase_seconds', phase=name)
+
+    def _fail(self, reason: str):
+        self.metrics.count('ota_updates_total', result='failure')
+        self.metrics.count('ota_update_failures_total', reason=reason)
+
+    def _apply_ab_update(self, package: OTAPackage, target_dir: str) -> bool:
+        """Stage the update in the inactive slot and switch to it."""
+        slots = ABSlots(target_dir)
+        try:
+            slots.initialize()
+            if not self._pre_verify(package):
+                self._fail('verification')
                 return False
-            if not self.verifier.verify_hash(file_path, file_info['hash']):
-                print(f"Hash verification failed for: {file_path}")
+
+            with self._phase('stage'):
+                staging = slots.prepare_staging(self.buffer_pool)
+            if not self._install(package, staging):
+                self._fail('install')
+                with self._phase('rollback'):
+                    slots.discard_staging()
                 return False
+
+            with self._phase('activate'):
+                slots.activate(slots.inactive_slot())
+            self._cleanup_partials()
+            self.metrics.count('ota_updates_total', result='success')
+            return True
+
+        except Exception as e:
+            print(f"Update failed: {e}")
+            self._fail('exception')
+            if slots.active_slot() is not None:
+                slots.discard_staging()
+            return False
+
+    def _install(self, package: OTAPackage, install_dir: str) -> bool:
+        """Write the package into ``install_dir`` and run the update steps."""
+        state = self._journal_state
+        if 'install' not in state.phases:
+            with self._phase('install'):
+                # Reconstruct files from deltas against the installed tree
+                if isinstance(package, DeltaPackage):
+                    if 'install' in state.started:
+                        # Deltas only apply to the original files; start again from the backup
+                        self._rollback(install_dir)
+                    self._journal_phase('install', done=False)
+                    if not install_delta(package, install_dir):
+                        return False
+                elif self.installer is not None or isinstance(package, ContainerPackage):
+                    # Container members can only be reached through the installer
+                    installer = self.installer or StreamingInstaller(
+                        self.verifier.buffer_size, self.metrics, self.buffer_pool,
+                        self.partial_dir)
+                    self._journal_phase('install', done=False)
+                    self.last_verification = VerificationSummary(installer.install(
+                        package, install_dir, skip=state.installed,
+                        on_installed=self._journal_installed
+                    ))
+                    if not self.last_verification.ok:
+                        return False
+            self._journal_phase('install')
+
+        with self._phase('steps'):
+            if self.update_steps:
+                self._journal_phase('steps', done=False)
+            if any(isinstance(step, UpdateStep) for step in self.update_steps):
+                return self.scheduler.run(self.update_steps, package, install_dir,
+                                          completed=state.steps, on_complete=self._journal_step,
+                                          on_start=self._journal_step_started)
+            names = [step.name for step in resolve_steps(self.update_steps)]
+            for name, step in zip(names, self.update_steps):
+                if name in state.steps:
+                    continue
+                self._journal_step_started(name)
+                with self.metrics.timer('ota_update_step_seconds', step=_step_name(step)):
+                    if not step(package, install_dir):
+                        return False
+                self._journal_step(name)
         return True
 
-    def _create_backup(self, target_dir: str):
+    def rollback(self, target_dir: str) -> bool:
+        """Undo a successful update whose backup was kept."""
+        if self.install_mode == INSTALL_AB:
+            return self.rollback_slot(target_dir)
+        if not os.path.exists(self.backup_dir):
+            return False
+        self._rollback(target_dir)
+        self._cleanup_backup()
+        return True
+
+    def discard_backup(self):
+        """Drop a kept backup once the update is final."""
+        if self.install_mode != INSTALL_AB:
+            self._cleanup_backup()
+
+    def rollback_slot(self, target_dir: str) -> bool:
+        """Switch an A/B target back to its previous slot."""
+        return ABSlots(target_dir).switch_back()
+
+    def verify_package(self, package: OTAPackage,
+                       strict: bool = False) -> VerificationSummary:
+        """Verify all files in the package and return a summary.
+
+        Only failed and skipped results are kept; see ``iter_verify_package``
+        for the per-file results.
+        """
+        return VerificationSummary(self.iter_verify_package(package, strict))
+
+    def iter_verify_package(self, package: OTAPackage,
+                            strict: bool = False) -> Iterator[FileVerificationResult]:
+        """Verify all files in the package, yielding per-file results.
+
+        Hashes come from the verifier's cache where it has them, unless
+        ``strict`` is set.
+
+        Files are verified in batches straight from ``payload_files()``, so
+        lazily loaded manifests are never materialized; verification stops
+        after the first batch with a failure. Container packages are
+        verified by streaming their members.
+        """
+        verified = self._journal_state.verified
+        batch = []
+        for rel_path, expected_hash in package.payload_files():
+            # Verified by an interrupted run and unchanged since
+            if rel_path in verified and verified[rel_path] == _source_key(package, rel_path):
+                if not isinstance(package, ContainerPackage):
+                    rel_path = os.path.join(package.package_id, rel_path)
+                result = FileVerificationResult(rel_path, expected_hash)
+                result.status = STATUS_OK
+                result.actual_hash = expected_hash
+                yield result
+                continue
+            batch.append((rel_path, expected_hash))
+            if len(batch) == VERIFY_BATCH_SIZE:
+                batch_results = self._verify_batch(package, batch, strict)
+                yield from batch_results
+                batch = []
+                if not all(result.ok for result in batch_results):
+                    return
+        if batch:
+            yield from self._verify_batch(package, batch, strict)
+
+    def _verify_batch(self, package: OTAPackage, batch: List,
+                      strict: bool) -> List[FileVerificationResult]:
+        """Verify (relative path, hash) pairs and journal the ones that passed."""
+        if isinstance(package, ContainerPackage):
+            results = self.verifier.verify_files(batch, strict=strict,
+                                                 opener=package.open_payload)
+        else:
+            results = self.verifier.verify_files(
+                [(os.path.join(package.package_id, rel_path), expected_hash)
+                 for rel_path, expected_hash in batch],
+                strict=strict
+            )
+        if self._journaling():
+            self.journal.verified({
+                rel_path: _source_key(package, rel_path)
+                for (rel_path, _), result in zip(batch, results) if result.ok
+            })
+        return results
+
+    def _pre_verify(self, package: OTAPackage) -> bool:
+        """Verify the package up front unless it is verified while installing."""
+        if package.root_signature and self.verifier.public_key_pem is not None:
+            with self._phase('verify_root'):
+                if not self.verifier.verify_package_root(package):
+                    print("Package Merkle root or its signature is invalid")
+                    return False
+        if self.installer is not None and not isinstance(package, DeltaPackage):
+            return True
+        with self._phase('verify'):
+            return self._verify_package(package)
+
+    def _verify_package(self, package: OTAPackage) -> bool:
+        """Verify all files in the package."""
+        self.last_verification = self.verify_package(package, self.strict_verification)
+        return self.last_verification.ok
+
+    def _create_backup(self, target_dir: str, package: Optional[OTAPackage] = None):
         """Create backup of current state."""
         if os.path.exists(self.backup_dir):
             shutil.rmtree(self.backup_dir)
-        shutil.copytree(target_dir, self.backup_dir)
+        if self.backup_mode == BACKUP_INCREMENTAL and package is not None:
+            self._create_incremental_backup(target_dir, package)
+        else:
+            copy_tree(target_dir, self.backup_dir, self.copy_workers,
+                      metrics=self.metrics, component='backup', buffer_pool=self.buffer_pool)
 
-    def _rollback(self, target_dir: str):
-        """Rollback to previous state."""
-        if os.path.exists(self.backup_dir):
-            shutil.rmtree(target_dir)
-            shutil.copytree(self.backup_dir, target_dir)
+    def _create_incremental_backup(self, target_dir: str, package: OTAPackage):
+        """Back up only the files the package will write or delete."""
+        saved: List[str] = []
+        created: List[str] = []
+        created_dirs: List[str] = []
+        rel_paths = [file_info['path'] for file_info in package.files]
+        if isinstance(package, DeltaPackage):
+            rel_paths.extend(package.deleted)
+        for rel_path in rel_paths:
+            src = os.path.join(target_dir, rel_path)
+            if os.path.lexists(src):
+                dst = os.path.join(self.backup_dir, 'files', rel_path)
+                os.makedirs(os.path.dirname(dst), exist_ok=True)
+                self.metrics.copy_function('backup')(src, dst, follow_symlinks=False)
+                saved.append(rel_path)
+                continue
+
+            created.append(rel_path)
+            parent = os.path.dirname(rel_path)
+            while parent and not os.path.isdir(os.path.join(target_dir, parent)) \
+                    and parent not in created_dirs:
+                created_dirs.append(parent)
+                parent = os.path.dirname(parent)
+
+        os.makedirs(self.backup_dir, exist_ok=True)
+        with open(os.path.join(self.backup_dir, BACKUP_MANIFEST), 'w') as f:
+            json.dump({
+                'mode': BACKUP_INCREMENTAL,
+                'saved': saved,
+                'created': created,
+                'created_dirs': created_dirs
+            }, f)
+
+    def _rollback(self, target_dir: str, backup_dir: Optional[str] = None):
+        """Rollback to previous state from ``backup_dir`` (default ``self.backup_dir``)."""
+        backup_dir = backup_dir or self.backup_dir
+        with self._phase('rollback'):
+            manifest_path = os.path.join(backup_dir, BACKUP_MANIFEST)
+            if os.path.exists(manifest_path):
+                self._rollback_incremental(target_dir, manifest_path, backup_dir)
+            elif os.path.exists(backup_dir):
+                if not self.differential_rollback:
+                    shutil.rmtree(target_dir)
+                sync_tree(backup_dir, target_dir, self.copy_workers,
+                          metrics=self.metrics, component='rollback',
+                          buffer_pool=self.buffer_pool)
+
+    def _rollback_incremental(self, target_dir: str, manifest_path: str, backup_dir: str):
+        """Restore saved files and remove files the update created."""
+        with open(manifest_path, 'r') as f:
+            manifest = json.load(f)
 
-    def _cleanup_backup(self):
+        for rel_path in manifest['created']:
+            path = os.path.join(target_dir, rel_path)
+            if os.path.isdir(path) and not os.path.islink(path):
+                shutil.rmtree(path)
+            elif os.path.lexists(path):
+                os.unlink(path)
+
+        for rel_path in manifest['saved']:
+            src = os.path.join(backup_dir, 'files', rel_path)
+            dst = os.path.join(target_dir, rel_path)
+            os.makedirs(os.path.dirname(dst), exist_ok=True)
+            if os.path.lexists(dst) and (os.path.islink(dst) or not os.path.isdir(dst)):
+                os.unlink(dst)
+            self.metrics.copy_function('rollback')(src, dst, follow_symlinks=False)
+
+        # Deepest directories first
+        for rel_dir in sorted(manifest['created_dirs'], key=len, reverse=True):
+            try:
+                os.rmdir(os.path.join(target_dir, rel_dir))
+            except OSError:
+                pass
+
+    def _cleanup_partials(self):
+        """Remove partial copies left by earlier attempts once an update succeeded."""
+        if os.path.exists(self.partial_dir):
+            shutil.rmtree(self.partial_dir)
+
+    def _cleanup_backup(self, backup_dir: Optional[str] = None):
         """Clean up backup after successful update."""
-        if os.path.exists(self.backup_dir):
-            shutil.rmtree(self.backup_dir)
\ No newline at end of file
+        backup_dir = backup_dir or self.backup_dir
+        if os.path.exists(backup_dir):
+            shutil.rmtree(backup_dir)
+
+
+def _backup_exists(backup_dir: str, backup_mode: str) -> bool:
+    """True if a complete ``backup_mode`` backup is present in ``backup_dir``."""
+    if backup_mode == BACKUP_INCREMENTAL:
+        return os.path.isfile(os.path.join(backup_dir, BACKUP_MANIFEST))
+    return os.path.isdir(backup_dir)
+
+
+def _source_key(package: OTAPackage, rel_path: str) -> Optional[List[int]]:
+    """Size and mtime of the file a payload path is read from."""
+    if isinstance(package, ContainerPackage):
+        path = package.container.path
+    else:
+        path = os.path.join(package.package_id, rel_path)
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return [st.st_size, st.st_mtime_ns]
+
+
+def _step_name(step: Callable) -> str:
+    return getattr(step, '__name__', type(step).__name__)
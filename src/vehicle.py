@@ -6,11 +6,15 @@ Represents the vehicle's software state and configuration.
 
 from typing import Dict, List, Optional
 import json
+from .version import parse_version, try_parse_version
 
 
 class Vehicle:
     """Represents a vehicle's software state."""
 
+    # Fleet-scale tools keep many vehicles in memory at once
+    __slots__ = ('vehicle_id', 'current_version', 'installed_components', 'update_history')
+
     def __init__(self, vehicle_id: str, current_version: str):
         self.vehicle_id = vehicle_id
         self.current_version = current_version
@@ -25,6 +29,31 @@ class Vehicle:
         """Get version of a specific component."""
         return self.installed_components.get(component)
 
+    def update_components(self, versions: Dict[str, str]):
+        """Set several component versions at once.
+
+        The new mapping is built first and swapped in with a single
+        assignment, so readers never see a partial update.
+        """
+        installed = dict(self.installed_components)
+        installed.update(versions)
+        self.installed_components = installed
+
+    def record_component_update(self, package_id: str, versions: Dict[str, str], timestamp: str):
+        """Record a multi-component update in history and apply its versions."""
+        self.update_history.append({
+            'package_id': package_id,
+            'components': {
+                component: {
+                    'previous_version': self.installed_components.get(component),
+                    'new_version': version
+                }
+                for component, version in versions.items()
+            },
+            'timestamp': timestamp
+        })
+        self.update_components(versions)
+
     def record_update(self, package_id: str, new_version: str, timestamp: str):
         """Record an update in history."""
         self.update_history.append({
@@ -36,9 +65,13 @@ class Vehicle:
         self.current_version = new_version
 
     def is_update_applicable(self, target_version: str) -> bool:
-        """Check if an update is applicable to this vehicle."""
-        # Simple version comparison - in real implementation, this would be more complex
-        return target_version > self.current_version
+        """Check if an update is applicable to this vehicle.
+
+        An unparseable current version is never updated over, since it
+        cannot be ordered against ``target_version``.
+        """
+        current = try_parse_version(self.current_version)
+        return current is not None and parse_version(target_version) > current
 
     def to_dict(self) -> Dict:
         """Convert vehicle state to dictionary."""
@@ -58,8 +91,12 @@ class Vehicle:
     def load_state(cls, path: str) -> 'Vehicle':
         """Load vehicle state from file."""
         with open(path, 'r') as f:
-            data = json.load(f)
+            return cls.from_dict(json.load(f))
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'Vehicle':
+        """Create vehicle from a ``to_dict`` dictionary."""
         vehicle = cls(data['vehicle_id'], data['current_version'])
-        vehicle.installed_components = data['installed_components']
-        vehicle.update_history = data['update_history']
+        vehicle.installed_components = data.get('installed_components', {})
+        vehicle.update_history = data.get('update_history', [])
         return vehicle
\ No newline at end of file
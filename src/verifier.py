@@ -4,54 +4,466 @@ Verifier Module
 Handles hash and signature verification for OTA updates.
 """
 
+import base64
 import hashlib
 import hmac
-from typing import Optional
-from cryptography.hazmat.primitives import hashes
-from cryptography.hazmat.primitives.asymmetric import rsa, padding
-from cryptography.hazmat.primitives import serialization
+import os
+import threading
+import time
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from typing import BinaryIO, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+from .buffer_pool import BufferPool
+from .hash_cache import HashCache
+from .merkle import manifest_root, merkle_root, read_leaf
+from .metrics import Metrics
+
+
+DEFAULT_BUFFER_SIZE = 1024 * 1024
+DEFAULT_MAX_WORKERS = 4
+
+# Verification result states
+STATUS_OK = "ok"
+STATUS_MISMATCH = "mismatch"
+STATUS_MISSING = "missing"
+STATUS_ERROR = "error"
+STATUS_SKIPPED = "skipped"
+
+
+class FileVerificationResult:
+    """Outcome of verifying a single file."""
+
+    def __init__(self, path: str, expected_hash: str, status: str = STATUS_SKIPPED,
+                 actual_hash: Optional[str] = None, error: Optional[str] = None):
+        self.path = path
+        self.expected_hash = expected_hash
+        self.status = status
+        self.actual_hash = actual_hash
+        self.error = error
+
+    @property
+    def ok(self) -> bool:
+        return self.status == STATUS_OK
+
+    def to_dict(self) -> dict:
+        """Convert result to dictionary."""
+        return {
+            'path': self.path,
+            'expected_hash': self.expected_hash,
+            'actual_hash': self.actual_hash,
+            'status': self.status,
+            'error': self.error
+        }
+
+    def __repr__(self) -> str:
+        return f"FileVerificationResult({self.path!r}, status={self.status!r})"
+
+
+class VerificationSummary:
+    """Counts of a package verification, keeping only the results that failed.
+
+    Files that passed are counted but not kept, so memory grows with the
+    number of failures rather than the size of the package. Files left
+    unchecked after a failure are listed in ``skipped``.
+    """
+
+    def __init__(self, results: Iterable[FileVerificationResult] = ()):
+        self.checked = 0
+        self.failures: List[FileVerificationResult] = []
+        self.skipped: List[FileVerificationResult] = []
+        for result in results:
+            self.add(result)
+
+    def add(self, result: FileVerificationResult):
+        if result.status == STATUS_SKIPPED:
+            self.skipped.append(result)
+            return
+        self.checked += 1
+        if not result.ok:
+            self.failures.append(result)
+
+    @property
+    def passed(self) -> int:
+        return self.checked - len(self.failures)
+
+    @property
+    def ok(self) -> bool:
+        return not self.failures and not self.skipped
+
+    def to_dict(self) -> dict:
+        """Convert summary to dictionary."""
+        return {
+            'checked': self.checked,
+            'failed': [result.to_dict() for result in self.failures],
+            'skipped': [result.path for result in self.skipped]
+        }
+
+    def __repr__(self) -> str:
+        return (f"VerificationSummary(checked={self.checked}, "
+                f"failed={len(self.failures)}, skipped={len(self.skipped)})")
+
+
+class SignatureResult:
+    """Outcome of verifying one package's manifest signature."""
+
+    def __init__(self, name: str, valid: bool, error: Optional[str] = None):
+        self.name = name
+        self.valid = valid
+        self.error = error
+
+    def to_dict(self) -> dict:
+        """Convert result to dictionary."""
+        return {'name': self.name, 'valid': self.valid, 'error': self.error}
+
+    def __repr__(self) -> str:
+        return f"SignatureResult({self.name!r}, valid={self.valid!r})"
+
+
+# Parsed public keys by fingerprint; one cache per process
+_KEY_CACHE: Dict[str, object] = {}
+_KEY_CACHE_LOCK = threading.Lock()
+
+
+def key_fingerprint(public_key_pem: bytes) -> str:
+    """Return the SHA256 fingerprint of a PEM public key."""
+    return hashlib.sha256(b"".join(public_key_pem.split())).hexdigest()
+
+
+def load_cached_public_key(public_key_pem: bytes):
+    """Parse a PEM public key, reusing an earlier parse of the same key."""
+    fingerprint = key_fingerprint(public_key_pem)
+    key = _KEY_CACHE.get(fingerprint)
+    if key is None:
+        # cryptography takes longer to import than everything else a
+        # hash-only check needs, so it is loaded on first use
+        from cryptography.hazmat.primitives import serialization
+        key = serialization.load_pem_public_key(public_key_pem)
+        with _KEY_CACHE_LOCK:
+            _KEY_CACHE[fingerprint] = key
+    return key
+
+
+def _pss_verify(public_key, data: bytes, signature: bytes) -> bool:
+    from cryptography.exceptions import InvalidSignature
+    from cryptography.hazmat.primitives import hashes
+    from cryptography.hazmat.primitives.asymmetric import padding
+    try:
+        public_key.verify(
+            signature,
+            data,
+            padding.PSS(
+                mgf=padding.MGF1(hashes.SHA256()),
+                salt_length=padding.PSS.MAX_LENGTH
+            ),
+            hashes.SHA256()
+        )
+        return True
+    except (InvalidSignature, ValueError, TypeError):
+        return False
+
+
+def _verify_signature_batch(public_key_pem: bytes,
+                            items: List[Tuple[bytes, bytes]]) -> List[Tuple[bool, Optional[str]]]:
+    """Verify (data, signature) pairs with one key; runs in pool workers."""
+    try:
+        public_key = load_cached_public_key(public_key_pem)
+    except ValueError as e:
+        return [(False, f"Invalid public key: {e}")] * len(items)
+    return [(_pss_verify(public_key, data, signature), None) for data, signature in items]
 
 
 class Verifier:
     """Handles verification of OTA packages."""
 
-    def __init__(self, public_key_path: Optional[str] = None):
-        self.public_key = None
+    def __init__(self, public_key_path: Optional[str] = None,
+                 max_workers: int = DEFAULT_MAX_WORKERS,
+                 buffer_size: int = DEFAULT_BUFFER_SIZE,
+                 hash_cache: Optional[HashCache] = None,
+                 metrics: Optional[Metrics] = None,
+                 buffer_pool: Optional[BufferPool] = None):
+        if max_workers < 1:
+            raise ValueError("max_workers must be at least 1")
+        if buffer_size < 1:
+            raise ValueError("buffer_size must be at least 1")
+        self.public_key_pem: Optional[bytes] = None
+        self._public_key = None
+        self.max_workers = max_workers
+        # A shared pool caps hashing memory however many workers run
+        self.buffer_pool = buffer_pool
+        self.buffer_size = buffer_pool.buffer_size if buffer_pool else buffer_size
+        self.hash_cache = hash_cache
+        self.metrics = metrics or Metrics()
+        self._local = threading.local()
         if public_key_path:
             self.load_public_key(public_key_path)
 
     def load_public_key(self, path: str):
-        """Load public key for signature verification."""
+        """Load public key for signature verification.
+
+        Only the PEM is read here; it is parsed on the first signature
+        check, so hash-only verification never loads ``cryptography``.
+        """
         with open(path, 'rb') as f:
-            self.public_key = serialization.load_pem_public_key(f.read())
+            self.public_key_pem = f.read()
+        self._public_key = None
 
-    def verify_hash(self, file_path: str, expected_hash: str) -> bool:
-        """Verify file hash matches expected value."""
-        actual_hash = self._calculate_hash(file_path)
+    @property
+    def public_key(self):
+        """The parsed public key, or None if none is loaded."""
+        if self._public_key is None and self.public_key_pem is not None:
+            self._public_key = load_cached_public_key(self.public_key_pem)
+        return self._public_key
+
+    def verify_hash(self, file_path: str, expected_hash: str, strict: bool = False) -> bool:
+        """Verify file hash matches expected value.
+
+        With ``strict`` set the hash cache is bypassed and the file is
+        always read in full.
+        """
+        actual_hash = self._hash_file(file_path, strict=strict)
+        if self.hash_cache is not None:
+            self.hash_cache.flush()
         return hmac.compare_digest(actual_hash, expected_hash)
 
+    def verify_files(self, files: List[Tuple[str, str]], stop_on_failure: bool = True,
+                     strict: bool = False,
+                     opener: Optional[Callable[[str], BinaryIO]] = None
+                     ) -> List[FileVerificationResult]:
+        """Verify (path, expected_hash) pairs concurrently.
+
+        Files are hashed on a pool of at most ``max_workers`` threads. When
+        ``stop_on_failure`` is set, the first failure cancels files that have
+        not finished yet; those are reported with status ``skipped``.
+        ``strict`` bypasses the hash cache.
+
+        With ``opener`` set, each path is passed to it and the returned
+        stream is hashed instead of the file (e.g. container members); the
+        hash cache does not apply and FileNotFoundError means missing.
+        """
+        results = [FileVerificationResult(path, expected) for path, expected in files]
+        if not results:
+            return results
+
+        cancel = threading.Event() if stop_on_failure else None
+
+        def check(result: FileVerificationResult):
+            if cancel is not None and cancel.is_set():
+                return
+            if opener is None and not os.path.isfile(result.path):
+                result.status = STATUS_MISSING
+            else:
+                try:
+                    if opener is None:
+                        actual_hash = self._hash_file(result.path, cancel, strict)
+                    else:
+                        with opener(result.path) as stream:
+                            actual_hash = self._hash_stream(stream, cancel)
+                except FileNotFoundError:
+                    result.status = STATUS_MISSING
+                except OSError as e:
+                    result.status = STATUS_ERROR
+                    result.error = str(e)
+                else:
+                    if actual_hash is None:
+                        return
+                    result.actual_hash = actual_hash
+                    if hmac.compare_digest(actual_hash, result.expected_hash):
+                        result.status = STATUS_OK
+                    else:
+                        result.status = STATUS_MISMATCH
+            if cancel is not None and not result.ok:
+                cancel.set()
+
+        workers = min(self.max_workers, len(results))
+        if workers == 1:
+            for result in results:
+                check(result)
+        else:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                for future in [pool.submit(check, result) for result in results]:
+                    future.result()
+
+        if self.hash_cache is not None:
+            self.hash_cache.flush()
+        return results
+
+    def verify_chunk(self, file_path: str, file_info: Dict, index: int) -> bool:
+        """Verify a single chunk of a file against its manifest entry."""
+        chunks = file_info['chunks']
+        if not 0 <= index < len(chunks):
+            return False
+        chunk_size = file_info['chunk_size']
+        with self._buffer() as buffer, open(file_path, 'rb', buffering=0) as f:
+            f.seek(index * chunk_size)
+            _, actual = read_leaf(f, memoryview(buffer), chunk_size)
+        return hmac.compare_digest(actual, chunks[index])
+
+    def find_bad_chunks(self, file_path: str, file_info: Dict,
+                        stop_at_first: bool = False) -> List[int]:
+        """Return the indexes of chunks that are missing or do not match.
+
+        Data past the last chunk in the manifest is reported as an extra
+        bad index ``len(chunks)``.
+        """
+        chunks = file_info['chunks']
+        chunk_size = file_info['chunk_size']
+        if not os.path.isfile(file_path):
+            return list(range(len(chunks)))
+
+        bad = []
+        with self._buffer() as buffer, open(file_path, 'rb', buffering=0) as f:
+            view = memoryview(buffer)
+            for index, expected in enumerate(chunks):
+                n, actual = read_leaf(f, view, chunk_size)
+                if not n or not hmac.compare_digest(actual, expected):
+                    bad.append(index)
+                    if stop_at_first:
+                        return bad
+            if f.read(1):
+                bad.append(len(chunks))
+        return bad
+
+    def resume_offset(self, file_path: str, file_info: Dict) -> int:
+        """Return the byte offset up to which a partial file is verified."""
+        if not os.path.isfile(file_path):
+            return 0
+        bad = self.find_bad_chunks(file_path, file_info, stop_at_first=True)
+        verified = bad[0] if bad else len(file_info['chunks'])
+        return min(verified * file_info['chunk_size'], os.path.getsize(file_path))
+
+    def verify_package_root(self, package) -> bool:
+        """Check a package's Merkle roots and the signature over its root.
+
+        Every chunked file entry must match its 'merkle_root', the package
+        root must match the manifest content, and 'root_signature' must be
+        a valid signature over the root.
+        """
+        if not package.merkle_root or not package.root_signature:
+            return False
+        for file_info in package.files:
+            if 'chunks' in file_info and \
+                    merkle_root(file_info['chunks']) != file_info.get('merkle_root'):
+                return False
+        root = manifest_root(package.manifest_header(), (dict(f) for f in package.files))
+        if not hmac.compare_digest(root, package.merkle_root):
+            return False
+        try:
+            signature = base64.b64decode(package.root_signature, validate=True)
+        except ValueError:
+            return False
+        return self.verify_signature(bytes.fromhex(package.merkle_root), signature)
+
     def verify_signature(self, data: bytes, signature: bytes) -> bool:
         """Verify digital signature."""
         if not self.public_key:
             raise ValueError("Public key not loaded")
-        try:
-            self.public_key.verify(
-                signature,
-                data,
-                padding.PSS(
-                    mgf=padding.MGF1(hashes.SHA256()),
-                    salt_length=padding.PSS.MAX_LENGTH
-                ),
-                hashes.SHA256()
+        return _pss_verify(self.public_key, data, signature)
+
+    def verify_manifest(self, package, signature: bytes) -> bool:
+        """Verify a detached signature over a package's canonical manifest."""
+        return self.verify_signature(package.canonical_manifest(), signature)
+
+    def verify_manifests_batch(self, items: Sequence[Tuple], max_workers: Optional[int] = None,
+                               min_batch: int = 32) -> List[SignatureResult]:
+        """Verify many detached manifest signatures across a process pool.
+
+        ``items`` holds (package, signature) or (package, signature,
+        public_key_pem) tuples; the verifier's own key is used when none is
+        given. Work is split into one batch per key and chunk so each
+        worker parses a key once. Batches smaller than ``min_batch`` are
+        verified in-process.
+        """
+        names = []
+        groups: Dict[bytes, List[Tuple[int, Tuple[bytes, bytes]]]] = {}
+        for index, item in enumerate(items):
+            package, signature = item[0], item[1]
+            public_key_pem = item[2] if len(item) > 2 else self.public_key_pem
+            if public_key_pem is None:
+                raise ValueError("Public key not loaded")
+            names.append(package.package_id)
+            groups.setdefault(public_key_pem, []).append(
+                (index, (package.canonical_manifest(), signature))
             )
-            return True
-        except:
-            return False
 
-    def _calculate_hash(self, file_path: str) -> str:
-        """Calculate SHA256 hash of file."""
+        outcomes: List[Tuple[bool, Optional[str]]] = [(False, None)] * len(names)
+        workers = max_workers or os.cpu_count() or 1
+        if workers == 1 or len(names) < min_batch:
+            for public_key_pem, entries in groups.items():
+                verified = _verify_signature_batch(public_key_pem, [e[1] for e in entries])
+                for (index, _), outcome in zip(entries, verified):
+                    outcomes[index] = outcome
+        else:
+            from concurrent.futures import ProcessPoolExecutor  # pulls in multiprocessing
+            chunk_size = max(1, -(-len(names) // (workers * 4)))
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                jobs = []
+                for public_key_pem, entries in groups.items():
+                    for start in range(0, len(entries), chunk_size):
+                        chunk = entries[start:start + chunk_size]
+                        future = pool.submit(_verify_signature_batch, public_key_pem,
+                                             [e[1] for e in chunk])
+                        jobs.append((chunk, future))
+                for chunk, future in jobs:
+                    for (index, _), outcome in zip(chunk, future.result()):
+                        outcomes[index] = outcome
+
+        return [SignatureResult(name, valid, error)
+                for name, (valid, error) in zip(names, outcomes)]
+
+    @contextmanager
+    def _buffer(self) -> Iterator[bytearray]:
+        """Borrow a buffer from ``buffer_pool``, or use this thread's own."""
+        if self.buffer_pool is None:
+            yield self._get_buffer()
+        else:
+            with self.buffer_pool.buffer() as buffer:
+                yield buffer
+
+    def _get_buffer(self) -> bytearray:
+        """Return this thread's reusable read buffer."""
+        buffer = getattr(self._local, 'buffer', None)
+        if buffer is None or len(buffer) != self.buffer_size:
+            buffer = bytearray(self.buffer_size)
+            self._local.buffer = buffer
+        return buffer
+
+    def _hash_file(self, file_path: str, cancel: Optional[threading.Event] = None,
+                   strict: bool = False) -> Optional[str]:
+        """Hash a file, consulting the hash cache unless ``strict`` is set."""
+        if self.hash_cache is None or strict:
+            return self._calculate_hash(file_path, cancel)
+        return self.hash_cache.get_or_compute(
+            file_path, lambda path: self._calculate_hash(path, cancel)
+        )
+
+    def _calculate_hash(self, file_path: str,
+                        cancel: Optional[threading.Event] = None) -> Optional[str]:
+        """Calculate SHA256 hash of file.
+
+        Returns None if ``cancel`` is set before hashing completes.
+        """
+        with open(file_path, 'rb', buffering=0) as f:
+            return self._hash_stream(f, cancel)
+
+    def _hash_stream(self, f: BinaryIO,
+                     cancel: Optional[threading.Event] = None) -> Optional[str]:
+        """Calculate SHA256 hash of a raw binary stream read to its end."""
         hash_sha256 = hashlib.sha256()
-        with open(file_path, 'rb') as f:
-            for chunk in iter(lambda: f.read(4096), b""):
-                hash_sha256.update(chunk)
-        return hash_sha256.hexdigest()
\ No newline at end of file
+        start = time.perf_counter()
+        hashed = 0
+        with self._buffer() as buffer:
+            view = memoryview(buffer)
+            while True:
+                n = f.readinto(buffer)
+                if not n:
+                    break
+                hash_sha256.update(view[:n])
+                hashed += n
+                if cancel is not None and cancel.is_set():
+                    return None
+        if self.metrics.enabled:
+            self.metrics.timing('ota_verifier_hash_seconds', time.perf_counter() - start)
+            self.metrics.count('ota_verifier_bytes_hashed_total', hashed)
+            self.metrics.count('ota_bytes_read_total', hashed, component='verifier')
+            self.metrics.count('ota_verifier_files_hashed_total', 1)
+        return hash_sha256.hexdigest()
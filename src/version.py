@@ -0,0 +1,253 @@
+"""
+Version Module
+
+Parses and orders software versions and indexes a fleet by version.
+
+Versions follow semantic versioning: ``MAJOR.MINOR.PATCH`` with an
+optional ``-prerelease`` and ``+build`` suffix. A leading ``v`` and
+missing minor/patch numbers ("2", "2.1") are accepted for older data.
+"""
+
+import re
+from bisect import bisect_left
+from functools import lru_cache, total_ordering
+from typing import Dict, Iterable, List, Optional, Tuple
+from .ota_package import OTAPackage, DeltaPackage
+
+_VERSION_RE = re.compile(
+    r"v?(?P<major>0|[1-9]\d*)(?:\.(?P<minor>0|[1-9]\d*))?(?:\.(?P<patch>0|[1-9]\d*))?"
+    r"(?:-(?P<prerelease>[0-9A-Za-z-]+(?:\.[0-9A-Za-z-]+)*))?"
+    r"(?:\+(?P<build>[0-9A-Za-z-]+(?:\.[0-9A-Za-z-]+)*))?\Z"
+)
+
+PARSE_CACHE_SIZE = 4096
+
+
+@total_ordering
+class Version:
+    """A parsed semantic version.
+
+    Pre-releases sort before their release ("1.0.0-rc.1" < "1.0.0"),
+    numeric pre-release identifiers compare numerically and sort before
+    alphanumeric ones, and build metadata is ignored when comparing.
+    """
+
+    __slots__ = ('major', 'minor', 'patch', 'prerelease', 'build', '_key')
+
+    def __init__(self, major: int, minor: int = 0, patch: int = 0,
+                 prerelease: Tuple[str, ...] = (), build: Optional[str] = None):
+        self.major = major
+        self.minor = minor
+        self.patch = patch
+        self.prerelease = tuple(prerelease)
+        self.build = build
+        if self.prerelease:
+            identifiers = tuple(
+                (0, int(part), "") if part.isdigit() else (1, 0, part)
+                for part in self.prerelease
+            )
+            self._key = (major, minor, patch, 0, identifiers)
+        else:
+            self._key = (major, minor, patch, 1, ())
+
+    @property
+    def is_prerelease(self) -> bool:
+        return bool(self.prerelease)
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, Version):
+            return NotImplemented
+        return self._key == other._key
+
+    def __lt__(self, other) -> bool:
+        if not isinstance(other, Version):
+            return NotImplemented
+        return self._key < other._key
+
+    def __hash__(self) -> int:
+        return hash(self._key)
+
+    def __str__(self) -> str:
+        text = f"{self.major}.{self.minor}.{self.patch}"
+        if self.prerelease:
+            text += "-" + ".".join(self.prerelease)
+        if self.build:
+            text += "+" + self.build
+        return text
+
+    def __repr__(self) -> str:
+        return f"Version({str(self)!r})"
+
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def parse_version(text: str) -> Version:
+    """Parse a version string; results are cached since fleets share few versions."""
+    match = _VERSION_RE.match(text.strip())
+    if match is None:
+        raise ValueError(f"Invalid version: {text!r}")
+    prerelease = match.group('prerelease')
+    return Version(
+        int(match.group('major')),
+        int(match.group('minor') or 0),
+        int(match.group('patch') or 0),
+        tuple(prerelease.split('.')) if prerelease else (),
+        match.group('build')
+    )
+
+
+def try_parse_version(text: str) -> Optional[Version]:
+    """Parse a version string, returning None if it is not a valid version."""
+    try:
+        return parse_version(text)
+    except ValueError:
+        return None
+
+
+def compare_versions(a: str, b: str) -> int:
+    """Return -1, 0 or 1 as version ``a`` is lower, equal or higher than ``b``."""
+    va, vb = parse_version(a), parse_version(b)
+    return (va > vb) - (va < vb)
+
+
+def package_applies(package: OTAPackage, current_version: str) -> bool:
+    """Whether ``package`` can be installed over ``current_version``.
+
+    A full package applies to any lower version; a delta package only to
+    its exact base version. Nothing applies over a version that cannot be
+    parsed, since it cannot be ordered.
+    """
+    current = try_parse_version(current_version)
+    if current is None:
+        return False
+    if isinstance(package, DeltaPackage):
+        return current == parse_version(package.base_version)
+    return parse_version(package.version) > current
+
+
+class _SortedVersions:
+    """Sorted (version, ID) pairs supporting range lookups by bisection."""
+
+    def __init__(self):
+        self.keys: List[Tuple[Version, str]] = []
+
+    def build(self, pairs: Iterable[Tuple[Version, str]]):
+        self.keys = sorted(pairs)
+
+    def add(self, version: Version, item_id: str):
+        key = (version, item_id)
+        index = bisect_left(self.keys, key)
+        if index == len(self.keys) or self.keys[index] != key:
+            self.keys.insert(index, key)
+
+    def remove(self, version: Version, item_id: str):
+        key = (version, item_id)
+        index = bisect_left(self.keys, key)
+        if index < len(self.keys) and self.keys[index] == key:
+            del self.keys[index]
+
+    def below(self, version: Version) -> List[str]:
+        end = bisect_left(self.keys, (version, ""))
+        return [item_id for _, item_id in self.keys[:end]]
+
+    def equal(self, version: Version) -> List[str]:
+        start = bisect_left(self.keys, (version, ""))
+        end = start
+        while end < len(self.keys) and self.keys[end][0] == version:
+            end += 1
+        return [item_id for _, item_id in self.keys[start:end]]
+
+
+class ApplicabilityIndex:
+    """Answers "which vehicles does this package apply to" by bisection.
+
+    Vehicle versions (and per-component versions) are kept sorted, so a
+    full package applies to the prefix below its version and a delta
+    package to the run of vehicles exactly on its base version.
+
+    Versions that cannot be parsed cannot be ordered, so those vehicles
+    and components are left out of the index (nothing applies to them)
+    and listed in ``invalid_versions`` and ``invalid_components``.
+    """
+
+    def __init__(self, vehicles: Iterable = ()):
+        self._vehicles = _SortedVersions()
+        self._components: Dict[str, _SortedVersions] = {}
+        self._versions: Dict[str, Version] = {}
+        self._component_versions: Dict[str, Dict[str, Version]] = {}
+        self.invalid_versions: List[str] = []  # vehicle IDs
+        self.invalid_components: List[Tuple[str, str]] = []  # (vehicle ID, component)
+
+        vehicle_pairs = []
+        component_pairs: Dict[str, List[Tuple[Version, str]]] = {}
+        for vehicle in vehicles:
+            version = try_parse_version(vehicle.current_version)
+            if version is None:
+                self.invalid_versions.append(vehicle.vehicle_id)
+            else:
+                self._versions[vehicle.vehicle_id] = version
+                vehicle_pairs.append((version, vehicle.vehicle_id))
+            installed = {}
+            for component, component_version in vehicle.installed_components.items():
+                parsed = try_parse_version(component_version)
+                if parsed is None:
+                    self.invalid_components.append((vehicle.vehicle_id, component))
+                    continue
+                installed[component] = parsed
+                component_pairs.setdefault(component, []).append((parsed, vehicle.vehicle_id))
+            self._component_versions[vehicle.vehicle_id] = installed
+
+        self._vehicles.build(vehicle_pairs)
+        for component, pairs in component_pairs.items():
+            self._components[component] = _SortedVersions()
+            self._components[component].build(pairs)
+
+    @classmethod
+    def from_store(cls, store) -> 'ApplicabilityIndex':
+        """Build an index from every vehicle in a ``FleetStore``."""
+        return cls(store.iter_vehicles())
+
+    def __len__(self) -> int:
+        return len(self._versions)
+
+    def vehicles_for(self, package: OTAPackage) -> List[str]:
+        """Return IDs of vehicles the package applies to, lowest version first."""
+        if isinstance(package, DeltaPackage):
+            return self._vehicles.equal(parse_version(package.base_version))
+        return self._vehicles.below(parse_version(package.version))
+
+    def vehicles_below(self, version: str) -> List[str]:
+        """Return IDs of vehicles running a version lower than ``version``."""
+        return self._vehicles.below(parse_version(version))
+
+    def vehicles_on(self, version: str) -> List[str]:
+        """Return IDs of vehicles running exactly ``version``."""
+        return self._vehicles.equal(parse_version(version))
+
+    def components_below(self, component: str, version: str) -> List[str]:
+        """Return IDs of vehicles whose ``component`` is older than ``version``."""
+        index = self._components.get(component)
+        return index.below(parse_version(version)) if index else []
+
+    def set_vehicle_version(self, vehicle_id: str, version: str):
+        """Move a vehicle to a new version after it has been updated."""
+        parsed = parse_version(version)
+        previous = self._versions.get(vehicle_id)
+        if previous is not None:
+            self._vehicles.remove(previous, vehicle_id)
+        self._vehicles.add(parsed, vehicle_id)
+        self._versions[vehicle_id] = parsed
+        self._component_versions.setdefault(vehicle_id, {})
+        if vehicle_id in self.invalid_versions:
+            self.invalid_versions.remove(vehicle_id)
+
+    def set_component_version(self, vehicle_id: str, component: str, version: str):
+        """Move one vehicle component to a new version."""
+        parsed = parse_version(version)
+        installed = self._component_versions.setdefault(vehicle_id, {})
+        index = self._components.setdefault(component, _SortedVersions())
+        if component in installed:
+            index.remove(installed[component], vehicle_id)
+        index.add(parsed, vehicle_id)
+        installed[component] = parsed
+        if (vehicle_id, component) in self.invalid_components:
+            self.invalid_components.remove((vehicle_id, component))
@@ -0,0 +1,199 @@
+"""
+Tests for Buffer Pool module.
+"""
+
+import unittest
+import errno
+import tempfile
+import os
+import shutil
+import threading
+import time
+from unittest import mock
+from src import fastcopy
+from src.buffer_pool import BufferPool
+from src.container import PackageContainer, write_container
+from src.fastcopy import copy_file, sync_tree
+from src.fetcher import PackageFetcher
+from src.installer import StreamingInstaller, PARTIAL_SUFFIX
+from src.merkle import add_chunk_hashes
+from src.metrics import Metrics, InMemorySink
+from src.ota_package import OTAPackage, calculate_file_hash
+from src.package_server import PackageServer
+from src.verifier import Verifier, STATUS_MISMATCH
+
+
+def read(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+class TestBufferPool(unittest.TestCase):
+
+    def test_acquire_blocks_until_release(self):
+        sink = InMemorySink()
+        pool = BufferPool(16, count=1, metrics=Metrics([sink]))
+        first = pool.acquire()
+        acquired = []
+        thread = threading.Thread(target=lambda: acquired.append(pool.acquire()))
+        thread.start()
+        time.sleep(0.05)
+        self.assertEqual(acquired, [])
+        pool.release(first)
+        thread.join(timeout=5)
+        self.assertIs(acquired[0], first)
+        self.assertEqual(pool.waits, 1)
+        self.assertEqual(sink.total('ota_buffer_pool_waits_total'), 1)
+
+    def test_timeout(self):
+        pool = BufferPool(16, count=1)
+        with pool.buffer():
+            with self.assertRaises(TimeoutError):
+                pool.acquire(timeout=0.01)
+
+    def test_peak_never_exceeds_capacity(self):
+        pool = BufferPool(1024, count=3)
+
+        def work():
+            for _ in range(20):
+                with pool.buffer() as buffer:
+                    buffer[0] = 1
+
+        threads = [threading.Thread(target=work) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        stats = pool.stats()
+        self.assertLessEqual(stats['peak_in_use'], 3)
+        self.assertLessEqual(stats['peak_bytes'], stats['capacity_bytes'])
+        self.assertEqual(pool.in_use, 0)
+
+    def test_for_budget(self):
+        pool = BufferPool.for_budget(1000000, buffer_size=262144)
+        self.assertEqual(pool.count, 3)
+        self.assertLessEqual(pool.capacity, 1000000)
+        self.assertEqual(BufferPool.for_budget(1000, buffer_size=262144).buffer_size, 1000)
+        with self.assertRaises(ValueError):
+            BufferPool.for_budget(0)
+
+    def test_release_foreign_buffer(self):
+        with self.assertRaises(ValueError):
+            BufferPool(16).release(bytearray(16))
+
+    def test_double_release(self):
+        pool = BufferPool(16, count=2)
+        buffer = pool.acquire()
+        pool.release(buffer)
+        with self.assertRaises(ValueError):
+            pool.release(buffer)
+        self.assertEqual(pool.in_use, 0)
+        # The buffer was not handed out twice
+        self.assertIsNot(pool.acquire(), pool.acquire())
+
+
+class TestPooledPipeline(unittest.TestCase):
+    """Buffers smaller than chunks and fewer buffers than workers."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.src_dir = os.path.join(self.temp_dir, "pkg")
+        os.makedirs(self.src_dir)
+        self.data = os.urandom(100000)
+        self.paths = []
+        for i in range(6):
+            path = os.path.join(self.src_dir, f"f{i}.bin")
+            with open(path, 'wb') as f:
+                f.write(self.data[i:])
+            self.paths.append(path)
+        self.pool = BufferPool(4096, count=2)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_calculate_file_hash(self):
+        self.assertEqual(calculate_file_hash(self.paths[0], pool=self.pool),
+                         calculate_file_hash(self.paths[0]))
+
+    def test_verifier_with_more_workers_than_buffers(self):
+        verifier = Verifier(max_workers=4, buffer_pool=self.pool)
+        self.assertEqual(verifier.buffer_size, 4096)
+        items = [(path, calculate_file_hash(path)) for path in self.paths]
+        results = verifier.verify_files(items)
+        self.assertTrue(all(r.ok for r in results))
+        self.assertLessEqual(self.pool.peak_in_use, 2)
+
+    def test_chunks_larger_than_buffer(self):
+        file_info = {'path': "f0.bin", 'hash': calculate_file_hash(self.paths[0])}
+        add_chunk_hashes(file_info, self.paths[0], 16384)
+        verifier = Verifier(buffer_pool=self.pool)
+        self.assertTrue(verifier.verify_chunk(self.paths[0], file_info, 3))
+        self.assertEqual(verifier.find_bad_chunks(self.paths[0], file_info), [])
+
+        installer = StreamingInstaller(buffer_pool=self.pool)
+        dst = os.path.join(self.temp_dir, "out", "f0.bin")
+        self.assertTrue(installer.install_chunked_file(self.paths[0], dst, file_info).ok)
+        self.assertEqual(read(dst), self.data)
+
+    def test_bad_chunk_leaves_verified_prefix(self):
+        file_info = {'path': "f0.bin", 'hash': calculate_file_hash(self.paths[0])}
+        add_chunk_hashes(file_info, self.paths[0], 16384)
+        file_info['chunks'][2] = "0" * 64
+        dst = os.path.join(self.temp_dir, "out", "f0.bin")
+        result = StreamingInstaller(buffer_pool=self.pool).install_chunked_file(
+            self.paths[0], dst, file_info)
+        self.assertEqual(result.status, STATUS_MISMATCH)
+        self.assertEqual(read(dst + PARTIAL_SUFFIX), self.data[:2 * 16384])
+
+    def test_install_package(self):
+        files = [{'path': os.path.basename(p), 'hash': calculate_file_hash(p)} for p in self.paths]
+        package = OTAPackage(self.src_dir, "1.0.0", files)
+        target = os.path.join(self.temp_dir, "target")
+        results = StreamingInstaller(buffer_pool=self.pool).install(package, target)
+        self.assertTrue(all(r.ok for r in results))
+        self.assertEqual(self.pool.in_use, 0)
+
+    def test_copy_fallback_and_sync(self):
+        dst = os.path.join(self.temp_dir, "copy.bin")
+        with mock.patch.object(fastcopy, '_try_reflink', return_value=False), \
+                mock.patch.object(fastcopy.os, 'copy_file_range', create=True,
+                                  side_effect=OSError(errno.EOPNOTSUPP, "unsupported")), \
+                mock.patch.object(fastcopy.os, 'sendfile', create=True,
+                                  side_effect=OSError(errno.EOPNOTSUPP, "unsupported")), \
+                mock.patch.object(fastcopy, '_no_copy_range', set()), \
+                mock.patch.object(fastcopy, '_no_sendfile', set()), \
+                mock.patch.object(self.pool, 'acquire', wraps=self.pool.acquire) as acquire:
+            self.assertEqual(copy_file(self.paths[0], dst, self.pool), len(self.data))
+        acquire.assert_called_once()
+        self.assertEqual(read(dst), self.data)
+
+        mirror = os.path.join(self.temp_dir, "mirror")
+        sync_tree(self.src_dir, mirror, compare_hash=True, buffer_pool=self.pool)
+        stats = sync_tree(self.src_dir, mirror, compare_hash=True, buffer_pool=self.pool)
+        self.assertEqual(stats.files_copied, 0)
+
+    def test_container_extract(self):
+        files = [{'path': os.path.basename(p), 'hash': calculate_file_hash(p)} for p in self.paths]
+        path = os.path.join(self.temp_dir, "pkg.otac")
+        write_container(OTAPackage(self.src_dir, "1.0.0", files), path)
+        out = os.path.join(self.temp_dir, "extracted")
+        with PackageContainer(path) as container:
+            container.extract(out, buffer_pool=self.pool)
+        self.assertEqual(read(os.path.join(out, "f0.bin")), self.data)
+
+    def test_fetch_streams_through_pool(self):
+        file_info = {'path': "f0.bin", 'hash': calculate_file_hash(self.paths[0]),
+                     'size': len(self.data)}
+        add_chunk_hashes(file_info, self.paths[0], 16384)
+        dest = os.path.join(self.temp_dir, "download")
+        with PackageServer(self.temp_dir) as server:
+            fetcher = PackageFetcher(f"{server.url}/pkg", max_connections=4,
+                                     buffer_pool=self.pool)
+            result = fetcher.fetch(OTAPackage(dest, "1.0.0", [file_info]))
+        self.assertTrue(result.ok)
+        self.assertEqual(read(os.path.join(dest, "f0.bin")), self.data)
+        self.assertLessEqual(self.pool.peak_in_use, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,159 @@
+"""
+Tests for CLI module.
+"""
+
+import unittest
+import tempfile
+import os
+import io
+import json
+import shutil
+import subprocess
+import sys
+from contextlib import redirect_stderr, redirect_stdout
+from unittest import mock
+from src.cli import main
+from src.compact_manifest import CompactManifest, write_compact_manifest
+from src.container import write_container
+from src.ota_package import OTAPackage, SIGNATURE_SUFFIX, calculate_file_hash
+from src.signer import Signer
+from src.vehicle import Vehicle
+from src.verifier import Verifier
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PUBLIC_KEY = os.path.join(REPO_ROOT, "public_key.pem")
+PRIVATE_KEY = os.path.join(REPO_ROOT, "private_key.pem")
+
+
+def read(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+class TestCli(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.payload = os.path.join(self.temp_dir, "pkg")
+        self.target = os.path.join(self.temp_dir, "target")
+        os.makedirs(self.payload)
+        os.makedirs(self.target)
+        files = []
+        for i in range(3):
+            path = os.path.join(self.payload, f"f{i}.bin")
+            with open(path, 'wb') as f:
+                f.write(f"new {i}".encode())
+            with open(os.path.join(self.target, f"f{i}.bin"), 'wb') as f:
+                f.write(f"old {i}".encode())
+            files.append({'path': f"f{i}.bin", 'hash': calculate_file_hash(path)})
+        self.package = OTAPackage(self.payload, "2.0.0", files)
+        self.manifest = os.path.join(self.temp_dir, "manifest.json")
+        self.package.save_signed_manifest(self.manifest, Signer(PRIVATE_KEY))
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def run_cli(self, *argv):
+        out = io.StringIO()
+        with redirect_stdout(out):
+            code = main(list(argv))
+        return code, out.getvalue()
+
+    def test_verify(self):
+        self.assertEqual(self.run_cli("verify", self.manifest, "--key", PUBLIC_KEY)[0], 0)
+        with open(os.path.join(self.payload, "f1.bin"), 'wb') as f:
+            f.write(b"tampered")
+        code, out = self.run_cli("verify", self.manifest, "--json")
+        self.assertEqual(code, 1)
+        report = json.loads(out)
+        failed = {os.path.basename(entry['path']): entry['status'] for entry in report['failed']}
+        self.assertEqual(failed, {"f1.bin": "mismatch"})
+        self.assertEqual(report['checked'] + len(report['skipped']), 3)
+
+    def test_verify_rejects_bad_signature(self):
+        with open(self.manifest + SIGNATURE_SUFFIX, 'wb') as f:
+            f.write(b"\0" * 256)
+        code, out = self.run_cli("verify", self.manifest, "--key", PUBLIC_KEY)
+        self.assertEqual(code, 1)
+        self.assertIn("signature is invalid", out)
+
+    def test_verify_container(self):
+        path = os.path.join(self.temp_dir, "pkg.otac")
+        write_container(self.package, path, signature=self.package.sign(Signer(PRIVATE_KEY)))
+        self.assertEqual(self.run_cli("verify", path, "--key", PUBLIC_KEY)[0], 0)
+
+    def test_apply_records_update_and_status(self):
+        state = os.path.join(self.temp_dir, "vehicle.json")
+        Vehicle("car", "1.0.0").save_state(state)
+        journal = os.path.join(self.temp_dir, "journal")
+        code, _ = self.run_cli("apply", self.manifest, self.target, "--key", PUBLIC_KEY,
+                               "--journal", journal, "--state", state, "--memory-limit", "65536",
+                               "--backup-dir", os.path.join(self.temp_dir, "backup"))
+        self.assertEqual(code, 0)
+        self.assertEqual(read(os.path.join(self.target, "f0.bin")), b"new 0")
+
+        code, out = self.run_cli("status", "--journal", journal, "--state", state, "--json")
+        status = json.loads(out)
+        self.assertEqual(status['update']['outcome'], "committed")
+        self.assertEqual(status['update']['files_installed'], 3)
+        self.assertEqual(status['vehicle']['current_version'], "2.0.0")
+
+    def test_apply_compact_manifest_without_loading_it(self):
+        self.package.sign_root(Signer(PRIVATE_KEY))
+        path = os.path.join(self.temp_dir, "manifest.otam")
+        write_compact_manifest(self.package.to_manifest(), path)
+        with mock.patch.object(CompactManifest, 'to_package',
+                               side_effect=AssertionError("manifest materialized")):
+            code, out = self.run_cli("apply", path, self.target, "--key", PUBLIC_KEY,
+                                     "--backup-dir", os.path.join(self.temp_dir, "backup"))
+        self.assertEqual(code, 0, out)
+        self.assertEqual(read(os.path.join(self.target, "f2.bin")), b"new 2")
+
+    def test_apply_requires_key_or_explicit_opt_out(self):
+        backup = os.path.join(self.temp_dir, "backup")
+        with redirect_stderr(io.StringIO()), self.assertRaises(SystemExit):
+            self.run_cli("apply", self.manifest, self.target, "--backup-dir", backup)
+        self.assertEqual(read(os.path.join(self.target, "f0.bin")), b"old 0")
+
+        code, out = self.run_cli("apply", self.manifest, self.target, "--no-signature-check",
+                                 "--backup-dir", backup)
+        self.assertEqual(code, 0)
+        self.assertIn("Warning", out)
+        self.assertEqual(read(os.path.join(self.target, "f0.bin")), b"new 0")
+
+    def test_snapshot_and_rollback(self):
+        snapshots = os.path.join(self.temp_dir, "snapshots")
+        self.run_cli("snapshot", "create", self.target, "--id", "before",
+                     "--snapshot-dir", snapshots)
+        self.assertIn("before", self.run_cli("snapshot", "list", "--snapshot-dir", snapshots)[1])
+        with open(os.path.join(self.target, "f0.bin"), 'wb') as f:
+            f.write(b"changed")
+        code, _ = self.run_cli("rollback", self.target, "--snapshot", "before",
+                               "--snapshot-dir", snapshots)
+        self.assertEqual(code, 0)
+        self.assertEqual(read(os.path.join(self.target, "f0.bin")), b"old 0")
+        self.assertEqual(self.run_cli("rollback", self.target, "--snapshot", "gone",
+                                      "--snapshot-dir", snapshots)[0], 1)
+
+    def test_missing_manifest(self):
+        code, out = self.run_cli("verify", os.path.join(self.temp_dir, "nope.json"))
+        self.assertEqual(code, 1)
+        self.assertIn("Error", out)
+
+    def test_key_parsed_on_first_use(self):
+        verifier = Verifier(PUBLIC_KEY)
+        self.assertIsNone(verifier._public_key)
+        self.assertTrue(verifier.verify_manifest(self.package,
+                                                 OTAPackage.load_signature(self.manifest)))
+        self.assertIsNotNone(verifier._public_key)
+
+    def test_hash_only_verify_skips_cryptography(self):
+        probe = ("import sys\nfrom src.cli import main\ncode = main(sys.argv[1:])\n"
+                 "assert 'cryptography' not in sys.modules\nsys.exit(code)\n")
+        proc = subprocess.run([sys.executable, '-c', probe, "verify", self.manifest],
+                              cwd=REPO_ROOT, capture_output=True, text=True)
+        self.assertEqual(proc.returncode, 0, proc.stderr)
+
+
+if __name__ == '__main__':
+    unittest.main()
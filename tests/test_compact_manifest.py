@@ -0,0 +1,152 @@
+"""
+Tests for Compact Manifest module.
+"""
+
+import unittest
+import tempfile
+import os
+from src.compact_manifest import (CompactManifest, write_compact_manifest,
+                                  convert_json_to_compact, convert_compact_to_json)
+from src.ota_package import OTAPackage
+from src.signer import Signer
+from src.updater import Updater
+from src.verifier import Verifier
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PRIVATE_KEY = os.path.join(REPO_ROOT, "private_key.pem")
+PUBLIC_KEY = os.path.join(REPO_ROOT, "public_key.pem")
+
+TEST_HASH = "9f86d081884c7d659a2feaa0c55ad015a3bf4f1b2b0b822cd15d6c15b0f00a08"
+
+
+class TestCompactManifest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.files = [
+            {"path": "file1.txt", "hash": "abc123", "size": "100"},
+            {"path": "dir/file2.bin", "hash": TEST_HASH, "size": 4},
+            {"path": "chunked.bin", "hash": TEST_HASH.upper(), "size": 4,
+             "chunk_size": 1024, "chunks": ["aa"], "merkle_root": "aa"},
+            {"path": "nosize.bin", "hash": TEST_HASH},
+        ]
+        self.package = OTAPackage("pkg", "1.2.0", self.files)
+        self.compact_path = os.path.join(self.temp_dir.name, "manifest.otam")
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_roundtrip(self):
+        write_compact_manifest(self.package.to_manifest(), self.compact_path)
+        with CompactManifest(self.compact_path) as manifest:
+            self.assertEqual(manifest.package_id, "pkg")
+            self.assertEqual(len(manifest), 4)
+            self.assertEqual(manifest.to_manifest(), self.package.to_manifest())
+            self.assertEqual([e.path for e in manifest.files], [f["path"] for f in self.files])
+
+    def test_lookup_by_path(self):
+        write_compact_manifest(self.package.to_manifest(), self.compact_path)
+        with CompactManifest(self.compact_path) as manifest:
+            entry = manifest.get("chunked.bin")
+            self.assertEqual(entry["chunks"], ["aa"])
+            self.assertEqual(entry.size, 4)
+            self.assertIn("chunks", entry)
+            self.assertEqual(manifest.get("file1.txt")["size"], "100")
+            self.assertIsNone(manifest.get("missing.bin"))
+            self.assertNotIn("missing.bin", manifest)
+
+    def test_json_conversion(self):
+        json_path = os.path.join(self.temp_dir.name, "manifest.json")
+        back_path = os.path.join(self.temp_dir.name, "back.json")
+        self.package.save_manifest(json_path)
+
+        convert_json_to_compact(json_path, self.compact_path)
+        convert_compact_to_json(self.compact_path, back_path)
+        self.assertEqual(OTAPackage.from_manifest(back_path).files, self.files)
+
+    def test_many_entries(self):
+        files = [{"path": f"d{i % 97}/f{i}.bin", "hash": f"{i:064x}", "size": i}
+                 for i in range(20000)]
+        write_compact_manifest({"package_id": "big", "version": "1", "files": files},
+                               self.compact_path)
+        with CompactManifest(self.compact_path) as manifest:
+            self.assertEqual(manifest.get(f"d{12222 % 97}/f12222.bin").hash, f"{12222:064x}")
+            self.assertEqual(sum(1 for _ in manifest), 20000)
+
+    def test_duplicate_path_rejected(self):
+        manifest = {"package_id": "p", "version": "1", "files": [self.files[0], self.files[0]]}
+        with self.assertRaises(ValueError):
+            write_compact_manifest(manifest, self.compact_path)
+
+    def test_truncated_file_raises_value_error(self):
+        write_compact_manifest(self.package.to_manifest(), self.compact_path)
+        with open(self.compact_path, "rb") as f:
+            data = f.read()
+
+        for length in range(len(data)):
+            with open(self.compact_path, "wb") as f:
+                f.write(data[:length])
+            with self.assertRaises(ValueError, msg=f"truncated to {length} bytes"):
+                with CompactManifest(self.compact_path) as manifest:
+                    manifest.to_manifest()
+                    for entry in self.files:
+                        manifest.get(entry["path"])
+
+    def test_corrupt_file_raises_value_error(self):
+        with open(self.compact_path, "wb") as f:
+            f.write(os.urandom(64))
+        with self.assertRaises(ValueError):
+            CompactManifest(self.compact_path)
+
+        write_compact_manifest(self.package.to_manifest(), self.compact_path)
+        with open(self.compact_path, "r+b") as f:
+            f.seek(-40, os.SEEK_END)
+            f.write(b"\xff" * 40)
+        with self.assertRaises(ValueError):
+            with CompactManifest(self.compact_path) as manifest:
+                manifest.to_manifest()
+
+    def test_updater_streams_compact_manifest(self):
+        package_dir = os.path.join(self.temp_dir.name, "payload")
+        os.makedirs(package_dir)
+        with open(os.path.join(package_dir, "test.txt"), "w") as f:
+            f.write("test")
+        write_compact_manifest({"package_id": package_dir, "version": "1.0.0",
+                                "files": [{"path": "test.txt", "hash": TEST_HASH, "size": 4}]},
+                               self.compact_path)
+
+        with CompactManifest(self.compact_path) as manifest:
+            summary = Updater(Verifier()).verify_package(manifest)
+        self.assertEqual(summary.checked, 1)
+        self.assertTrue(summary.ok)
+
+    def test_updater_applies_signed_compact_manifest(self):
+        package_dir = os.path.join(self.temp_dir.name, "payload")
+        target = os.path.join(self.temp_dir.name, "target")
+        os.makedirs(package_dir)
+        os.makedirs(target)
+        with open(os.path.join(package_dir, "test.txt"), "w") as f:
+            f.write("test")
+        package = OTAPackage(package_dir, "1.0.0",
+                             [{"path": "test.txt", "hash": TEST_HASH, "size": 4}])
+        package.sign_root(Signer(PRIVATE_KEY))
+        write_compact_manifest(package.to_manifest(), self.compact_path)
+
+        with CompactManifest(self.compact_path) as manifest:
+            self.assertEqual(manifest.merkle_root, package.merkle_root)
+            updater = Updater(Verifier(PUBLIC_KEY), os.path.join(self.temp_dir.name, "backup"),
+                              streaming_install=True,
+                              journal_path=os.path.join(self.temp_dir.name, "journal"))
+            self.assertTrue(updater.apply_update(manifest, target))
+        with open(os.path.join(target, "test.txt")) as f:
+            self.assertEqual(f.read(), "test")
+
+        # A root that does not match the entries is refused
+        package.files[0]["size"] = 5
+        write_compact_manifest(package.to_manifest(), self.compact_path)
+        with CompactManifest(self.compact_path) as manifest:
+            self.assertFalse(Verifier(PUBLIC_KEY).verify_package_root(manifest))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,283 @@
+"""
+Tests for Container module.
+"""
+
+import unittest
+import tempfile
+import os
+import shutil
+import stat
+import json
+import struct
+from unittest import mock
+from src.container import (METHOD_LZMA, METHOD_STORE, METHOD_ZLIB, ContainerError,
+                           ContainerPackage, PackageContainer, write_container)
+from src.installer import StreamingInstaller
+from src.merkle import add_chunk_hashes
+from src.ota_package import OTAPackage, DeltaPackage, calculate_file_hash
+from src.package_builder import main as build_main
+from src.signer import Signer
+from src.updater import Updater
+from src.verifier import Verifier, STATUS_ERROR, STATUS_MISMATCH, STATUS_MISSING
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PRIVATE_KEY = os.path.join(REPO_ROOT, "private_key.pem")
+PUBLIC_KEY = os.path.join(REPO_ROOT, "public_key.pem")
+
+
+def read(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def rewrite_index(path, mutate):
+    """Replace a container's index with ``mutate(index bytes)``."""
+    footer = struct.Struct("<QQ4s")
+    data = read(path)
+    index_offset, index_length, magic = footer.unpack_from(data, len(data) - footer.size)
+    index = mutate(data[index_offset:index_offset + index_length])
+    with open(path, 'wb') as f:
+        f.write(data[:index_offset] + index + footer.pack(index_offset, len(index), magic))
+
+
+class TestPackageContainer(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.payload = os.path.join(self.temp_dir, "payload")
+        self.contents = {
+            "text.txt": b"compress me " * 50000,
+            "sub/random.bin": os.urandom(200000),
+            "empty.txt": b"",
+        }
+        files = []
+        for rel_path, data in self.contents.items():
+            path = os.path.join(self.payload, rel_path)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as f:
+                f.write(data)
+            files.append({'path': rel_path, 'hash': calculate_file_hash(path), 'size': len(data)})
+        os.chmod(os.path.join(self.payload, "text.txt"), 0o750)
+        self.package = OTAPackage(self.payload, "2.0.0", files)
+        self.container_path = os.path.join(self.temp_dir, "package.otac")
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_round_trip_all_methods(self):
+        for method in (METHOD_STORE, METHOD_ZLIB, METHOD_LZMA):
+            with self.subTest(method=method):
+                write_container(self.package, self.container_path, method=method)
+                with PackageContainer(self.container_path) as container:
+                    self.assertEqual(container.manifest, self.package.to_manifest())
+                    for rel_path, data in self.contents.items():
+                        self.assertEqual(container.read_member(rel_path), data)
+
+    def test_compression_and_store_fallback(self):
+        write_container(self.package, self.container_path)
+        with PackageContainer(self.container_path) as container:
+            text = container.members["text.txt"]
+            self.assertEqual(text.method, METHOD_ZLIB)
+            self.assertLess(text.stored_size, text.size // 10)
+            # Random data does not compress, so it is stored as is
+            random_member = container.members["sub/random.bin"]
+            self.assertEqual(random_member.method, METHOD_STORE)
+            self.assertEqual(random_member.stored_size, 200000)
+            self.assertEqual(text.mode, 0o750)
+        self.assertLess(os.path.getsize(self.container_path), 260000)
+
+    def test_random_access(self):
+        write_container(self.package, self.container_path, method=METHOD_LZMA)
+        data = self.contents["text.txt"]
+        with PackageContainer(self.container_path) as container:
+            with container.open_member("text.txt") as reader:
+                reader.seek(300001)
+                self.assertEqual(reader.read(20), data[300001:300021])
+                reader.seek(5)
+                self.assertEqual(reader.read(7), data[5:12])
+                self.assertEqual(reader.seek(0, os.SEEK_END), len(data))
+                self.assertEqual(reader.read(), b"")
+            with container.open_member("sub/random.bin") as reader:
+                reader.seek(-10, os.SEEK_END)
+                self.assertEqual(reader.read(), self.contents["sub/random.bin"][-10:])
+
+    def test_seek_zlib_member(self):
+        write_container(self.package, self.container_path, method=METHOD_ZLIB)
+        data = self.contents["text.txt"]
+        with PackageContainer(self.container_path) as container:
+            with container.open_member("text.txt") as reader:
+                self.assertEqual(reader.seek(200000), 200000)
+                self.assertEqual(reader.read(10), data[200000:200010])
+                reader.seek(3, os.SEEK_CUR)
+                self.assertEqual(reader.read(4), data[200013:200017])
+
+    def test_bounded_reads(self):
+        write_container(self.package, self.container_path)
+        with PackageContainer(self.container_path) as container:
+            with container.open_member("text.txt") as reader:
+                buffer = bytearray(4096)
+                self.assertEqual(reader.readinto(buffer), 4096)
+                self.assertEqual(bytes(buffer), self.contents["text.txt"][:4096])
+
+    def test_missing_member(self):
+        write_container(self.package, self.container_path)
+        with PackageContainer(self.container_path) as container:
+            with self.assertRaises(FileNotFoundError):
+                container.open_member("nope")
+
+    def test_rejects_non_container(self):
+        path = os.path.join(self.temp_dir, "bogus")
+        with open(path, 'wb') as f:
+            f.write(b"x" * 100)
+        with self.assertRaises(ValueError):
+            PackageContainer(path)
+
+    def test_rejects_delta_package(self):
+        package = DeltaPackage(self.payload, "2.0.0", "1.0.0", [])
+        with self.assertRaises(ValueError):
+            write_container(package, self.container_path)
+        self.assertEqual(os.listdir(self.temp_dir), ["payload"])
+
+    def test_embedded_signature(self):
+        signature = self.package.sign(Signer(PRIVATE_KEY))
+        write_container(self.package, self.container_path, signature=signature)
+        with PackageContainer(self.container_path) as container:
+            package = container.to_package()
+            self.assertIsInstance(package, ContainerPackage)
+            self.assertTrue(Verifier(PUBLIC_KEY).verify_manifest(package, container.signature))
+
+    def test_extract(self):
+        write_container(self.package, self.container_path)
+        output = os.path.join(self.temp_dir, "out")
+        with PackageContainer(self.container_path) as container:
+            container.extract(output)
+        for rel_path, data in self.contents.items():
+            self.assertEqual(read(os.path.join(output, rel_path)), data)
+        self.assertEqual(stat.S_IMODE(os.stat(os.path.join(output, "text.txt")).st_mode), 0o750)
+
+    def test_rejects_member_paths_outside_output(self):
+        write_container(self.package, self.container_path)
+        original = read(self.container_path)
+        for bad in ("../escape.txt", "sub/../../escape.txt", "/tmp/escape.txt", ""):
+            with self.subTest(path=bad):
+                with open(self.container_path, 'wb') as f:
+                    f.write(original)
+                rewrite_index(self.container_path,
+                              lambda index: index.replace(b'"empty.txt"', json.dumps(bad).encode()))
+                with self.assertRaises(ValueError):
+                    PackageContainer(self.container_path)
+        self.assertFalse(os.path.exists(os.path.join(self.temp_dir, "escape.txt")))
+
+    def test_corrupt_index_closes_file(self):
+        write_container(self.package, self.container_path)
+        rewrite_index(self.container_path, lambda index: index[:len(index) // 2])
+        with mock.patch.object(PackageContainer, 'close', autospec=True,
+                               side_effect=PackageContainer.close) as close:
+            with self.assertRaises(ValueError):
+                PackageContainer(self.container_path)
+        close.assert_called_once()
+
+    def test_rejects_members_outside_the_data(self):
+        write_container(self.package, self.container_path, method=METHOD_STORE)
+        original = read(self.container_path)
+
+        def set_field(position, value):
+            def mutate(index):
+                data = json.loads(index)
+                data['members']['text.txt'][position] = value
+                return json.dumps(data).encode()
+            return mutate
+
+        size = len(self.contents["text.txt"])
+        for position, value in ((0, len(original)), (0, 0), (1, size + 1), (1, -1),
+                                (3, "bogus"), (2, "12")):
+            with self.subTest(field=position, value=value):
+                with open(self.container_path, 'wb') as f:
+                    f.write(original)
+                rewrite_index(self.container_path, set_field(position, value))
+                with self.assertRaises(ValueError):
+                    PackageContainer(self.container_path)
+
+    def test_short_stored_read_raises_container_error(self):
+        write_container(self.package, self.container_path, method=METHOD_STORE)
+        with PackageContainer(self.container_path) as container:
+            info = container.members["text.txt"]
+            info.stored_size -= 10
+            with container.open_member("text.txt") as reader:
+                with self.assertRaises(ContainerError):
+                    reader.read()
+
+
+class TestContainerUpdate(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.payload = os.path.join(self.temp_dir, "payload")
+        self.target = os.path.join(self.temp_dir, "target")
+        os.makedirs(self.target)
+        with open(os.path.join(self.target, "old.txt"), 'w') as f:
+            f.write("old")
+        self.container_path = os.path.join(self.temp_dir, "package.otac")
+        os.makedirs(os.path.join(self.payload, "bin"))
+        for rel_path, data in [("app.bin", b"application " * 10000), ("bin/tool", b"tool")]:
+            with open(os.path.join(self.payload, rel_path), 'wb') as f:
+                f.write(data)
+        os.chmod(os.path.join(self.payload, "bin/tool"), 0o755)
+        self.assertEqual(build_main([self.payload, "--version", "2.0.0",
+                                     "--output", os.path.join(self.temp_dir, "m.json"),
+                                     "--container", self.container_path]), 0)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def corrupt(self, rel_path):
+        with PackageContainer(self.container_path) as container:
+            member = container.members[rel_path]
+        with open(self.container_path, 'r+b') as f:
+            f.seek(member.offset + member.stored_size // 2)
+            byte = f.read(1)
+            f.seek(-1, os.SEEK_CUR)
+            f.write(bytes([byte[0] ^ 0xFF]))
+
+    def test_apply_update_from_container(self):
+        updater = Updater(Verifier(), os.path.join(self.temp_dir, "backup"))
+        with PackageContainer(self.container_path) as container:
+            self.assertTrue(updater.apply_update(container.to_package(), self.target))
+        self.assertEqual(read(os.path.join(self.target, "app.bin")), b"application " * 10000)
+        self.assertEqual(stat.S_IMODE(os.stat(os.path.join(self.target, "bin/tool")).st_mode),
+                         0o755)
+        self.assertEqual(read(os.path.join(self.target, "old.txt")), b"old")
+
+    def test_corrupt_member_fails_verification(self):
+        self.corrupt("app.bin")
+        updater = Updater(Verifier(), os.path.join(self.temp_dir, "backup"))
+        with PackageContainer(self.container_path) as container:
+            package = container.to_package()
+            results = {r.path: r for r in updater.verify_package(package).failures}
+            self.assertIn(results["app.bin"].status, (STATUS_ERROR, STATUS_MISMATCH))
+            self.assertFalse(updater.apply_update(package, self.target))
+        self.assertFalse(os.path.exists(os.path.join(self.target, "app.bin")))
+
+    def test_missing_member_reported(self):
+        with PackageContainer(self.container_path) as container:
+            package = container.to_package()
+            package.files.append({'path': "gone.bin", 'hash': "0" * 64})
+            summary = Updater(Verifier()).verify_package(package)
+        self.assertEqual(summary.failures[-1].status, STATUS_MISSING)
+
+    def test_chunked_install_from_container(self):
+        files = []
+        for rel_path in ("app.bin", "bin/tool"):
+            path = os.path.join(self.payload, rel_path)
+            file_info = {'path': rel_path, 'hash': calculate_file_hash(path)}
+            add_chunk_hashes(file_info, path, 4096)
+            files.append(file_info)
+        write_container(OTAPackage(self.payload, "2.0.0", files), self.container_path)
+        with PackageContainer(self.container_path) as container:
+            results = StreamingInstaller().install(container.to_package(), self.target)
+        self.assertTrue(all(result.ok for result in results))
+        self.assertEqual(read(os.path.join(self.target, "app.bin")), b"application " * 10000)
+
+
+if __name__ == '__main__':
+    unittest.main()
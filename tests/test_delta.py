@@ -0,0 +1,130 @@
+"""
+Tests for Delta module.
+"""
+
+import unittest
+import io
+import tempfile
+import os
+import random
+from contextlib import redirect_stdout
+from src.delta import (build_delta_package, build_block_index, apply_delta, install_delta,
+                       _candidate_offsets, _weak_key, OP_COPY)
+from src.ota_package import DeltaPackage, calculate_file_hash
+from src.updater import Updater, BACKUP_INCREMENTAL
+from src.verifier import Verifier
+
+
+class TestDelta(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        root = self.temp_dir.name
+        self.base_dir = os.path.join(root, "base")
+        self.new_dir = os.path.join(root, "new")
+        self.package_dir = os.path.join(root, "delta_pkg")
+        os.makedirs(self.base_dir)
+        os.makedirs(os.path.join(self.new_dir, "sub"))
+
+        rng = random.Random(42)
+        self.base_data = bytes(rng.getrandbits(8) for _ in range(64 * 1024))
+        # Insert a few bytes near the start so every following block shifts
+        self.new_data = self.base_data[:1000] + b"PATCHED" + self.base_data[1000:]
+        with open(os.path.join(self.base_dir, "ecu.bin"), "wb") as f:
+            f.write(self.base_data)
+        with open(os.path.join(self.new_dir, "ecu.bin"), "wb") as f:
+            f.write(self.new_data)
+        with open(os.path.join(self.base_dir, "same.bin"), "wb") as f:
+            f.write(b"unchanged")
+        with open(os.path.join(self.new_dir, "same.bin"), "wb") as f:
+            f.write(b"unchanged")
+        with open(os.path.join(self.new_dir, "sub", "added.txt"), "wb") as f:
+            f.write(b"brand new file")
+        with open(os.path.join(self.base_dir, "removed.bin"), "wb") as f:
+            f.write(b"dropped in 1.1.0")
+
+        self.package = build_delta_package(
+            self.package_dir, "1.1.0", "1.0.0", self.base_dir, self.new_dir,
+            block_size=1024
+        )
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_delta_only_covers_changes(self):
+        paths = sorted(f['path'] for f in self.package.files)
+        self.assertEqual(paths, ["ecu.bin", "sub/added.txt"])
+        self.assertEqual(self.package.deleted, ["removed.bin"])
+
+        ecu = next(f for f in self.package.files if f['path'] == "ecu.bin")
+        self.assertLess(ecu['delta_size'], 4096)
+        self.assertTrue(any(op[0] == OP_COPY for op in ecu['ops']))
+
+    def test_apply_delta_reconstructs_file(self):
+        ecu = next(f for f in self.package.files if f['path'] == "ecu.bin")
+        base_path = os.path.join(self.base_dir, "ecu.bin")
+        out_path = os.path.join(self.temp_dir.name, "out.bin")
+
+        self.assertTrue(apply_delta(base_path, os.path.join(self.package_dir, ecu['delta_path']),
+                                    ecu, out_path))
+        with open(out_path, "rb") as f:
+            self.assertEqual(f.read(), self.new_data)
+
+    def test_apply_delta_rejects_wrong_base(self):
+        ecu = next(f for f in self.package.files if f['path'] == "ecu.bin")
+        base_path = os.path.join(self.base_dir, "ecu.bin")
+        with open(base_path, "wb") as f:
+            f.write(bytes(len(self.base_data)))
+
+        result = apply_delta(base_path, os.path.join(self.package_dir, ecu['delta_path']),
+                             ecu, base_path)
+        self.assertFalse(result)
+        with open(base_path, "rb") as f:
+            self.assertEqual(f.read(), bytes(len(self.base_data)))
+
+    def test_manifest_roundtrip(self):
+        manifest_path = os.path.join(self.temp_dir.name, "manifest.json")
+        self.package.save_manifest(manifest_path)
+        loaded = DeltaPackage.from_manifest(manifest_path)
+        self.assertEqual(loaded.base_version, "1.0.0")
+        self.assertEqual(loaded.files, self.package.files)
+        self.assertEqual(loaded.deleted, ["removed.bin"])
+
+    def test_candidate_offsets_match_weak_checksum_at_every_offset(self):
+        base_path = os.path.join(self.base_dir, "ecu.bin")
+        index = build_block_index(base_path, 1024)
+        data = self.new_data[:8192]
+        expected = [i for i in range(len(data) - 1024 + 1) if _weak_key(data[i:i + 1024]) in index]
+        self.assertEqual(_candidate_offsets(data, 0, len(data) - 1024 + 1, 1024, index), expected)
+        self.assertIn(1024 + 7, expected)  # second block, shifted by the inserted bytes
+
+    def test_install_checks_base_before_writing(self):
+        with open(os.path.join(self.base_dir, "ecu.bin"), "ab") as f:
+            f.write(b"locally modified")
+        with redirect_stdout(io.StringIO()):
+            self.assertFalse(install_delta(self.package, self.base_dir))
+        self.assertFalse(os.path.exists(os.path.join(self.base_dir, "sub", "added.txt")))
+        self.assertTrue(os.path.exists(os.path.join(self.base_dir, "removed.bin")))
+
+    def test_updater_applies_delta_package(self):
+        updater = Updater(Verifier(), backup_dir=os.path.join(self.temp_dir.name, "backup"))
+        self.assertTrue(updater.apply_update(self.package, self.base_dir))
+
+        for name in ("ecu.bin", "same.bin", "sub/added.txt"):
+            self.assertEqual(calculate_file_hash(os.path.join(self.base_dir, name)),
+                             calculate_file_hash(os.path.join(self.new_dir, name)))
+        self.assertFalse(os.path.exists(os.path.join(self.base_dir, "removed.bin")))
+
+    def test_rollback_restores_deleted_files(self):
+        updater = Updater(Verifier(), backup_dir=os.path.join(self.temp_dir.name, "backup"),
+                          backup_mode=BACKUP_INCREMENTAL)
+        updater.add_update_step(lambda package, target_dir: False)
+        self.assertFalse(updater.apply_update(self.package, self.base_dir))
+        with open(os.path.join(self.base_dir, "removed.bin"), "rb") as f:
+            self.assertEqual(f.read(), b"dropped in 1.1.0")
+        with open(os.path.join(self.base_dir, "ecu.bin"), "rb") as f:
+            self.assertEqual(f.read(), self.base_data)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,201 @@
+"""
+Tests for Fast Copy module.
+"""
+
+import unittest
+import tempfile
+import os
+import shutil
+from unittest import mock
+from src import fastcopy
+from src.fastcopy import copy_file, copy_tree, sync_tree
+from src.metrics import Metrics, InMemorySink
+from src.rollback import RollbackManager
+from src.updater import Updater
+from src.verifier import Verifier
+
+
+def write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+def read(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+class TestFastCopy(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.src = os.path.join(self.temp_dir, "src")
+        write(os.path.join(self.src, "a.bin"), os.urandom(300000))
+        write(os.path.join(self.src, "sub", "b.txt"), b"hello")
+        write(os.path.join(self.src, "sub", "deep", "c.txt"), b"")
+        os.makedirs(os.path.join(self.src, "empty"))
+        os.symlink("sub/b.txt", os.path.join(self.src, "link"))
+        os.utime(os.path.join(self.src, "sub", "b.txt"), ns=(1_000_000_000, 1_000_000_000))
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def assertTreesEqual(self, a, b):
+        for root, dirs, files in os.walk(a):
+            other = os.path.join(b, os.path.relpath(root, a))
+            self.assertEqual(sorted(os.listdir(root)), sorted(os.listdir(other)))
+            for name in files:
+                path = os.path.join(root, name)
+                if os.path.islink(path):
+                    self.assertEqual(os.readlink(path), os.readlink(os.path.join(other, name)))
+                else:
+                    self.assertEqual(read(path), read(os.path.join(other, name)))
+
+    def test_copy_tree(self):
+        dst = os.path.join(self.temp_dir, "dst")
+        stats = copy_tree(self.src, dst, max_workers=4)
+
+        self.assertTreesEqual(self.src, dst)
+        self.assertTrue(os.path.islink(os.path.join(dst, "link")))
+        self.assertEqual(stats.files_copied, 3)
+        self.assertEqual(stats.bytes_copied, 300005)
+        self.assertEqual(os.stat(os.path.join(dst, "sub", "b.txt")).st_mtime_ns, 1_000_000_000)
+
+    def test_copy_tree_refuses_existing_destination(self):
+        with self.assertRaises(FileExistsError):
+            copy_tree(self.src, self.src)
+
+    def test_copy_file_fallback(self):
+        src = os.path.join(self.src, "a.bin")
+        dst = os.path.join(self.temp_dir, "copy.bin")
+        with mock.patch.object(fastcopy, '_try_reflink', return_value=False), \
+                mock.patch.object(fastcopy.os, 'copy_file_range',
+                                  side_effect=OSError(fastcopy.errno.ENOSYS, "nope"), create=True), \
+                mock.patch.object(fastcopy.os, 'sendfile',
+                                  side_effect=OSError(fastcopy.errno.EINVAL, "nope"), create=True), \
+                mock.patch.object(fastcopy, '_no_copy_range', set()), \
+                mock.patch.object(fastcopy, '_no_sendfile', set()):
+            self.assertEqual(copy_file(src, dst), 300000)
+        self.assertEqual(read(src), read(dst))
+
+    def test_copy_file_propagates_io_errors(self):
+        with self.assertRaises(FileNotFoundError):
+            copy_file(os.path.join(self.src, "missing"), os.path.join(self.temp_dir, "x"))
+
+    def test_metrics(self):
+        sink = InMemorySink()
+        copy_tree(self.src, os.path.join(self.temp_dir, "dst"),
+                  metrics=Metrics([sink]), component="snapshot")
+        self.assertEqual(sink.total("ota_bytes_written_total", component="snapshot"), 300005)
+        self.assertEqual(sink.total("ota_files_touched_total", component="snapshot"), 3)
+
+
+class TestSyncTree(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.src = os.path.join(self.temp_dir, "src")
+        self.dst = os.path.join(self.temp_dir, "dst")
+        for i in range(20):
+            write(os.path.join(self.src, f"d{i % 3}", f"f{i}.txt"), f"file {i}".encode())
+        copy_tree(self.src, self.dst)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_unchanged_tree_copies_nothing(self):
+        stats = sync_tree(self.src, self.dst)
+        self.assertEqual(stats.files_copied, 0)
+        self.assertEqual(stats.files_unchanged, 20)
+
+    def test_restores_only_differences(self):
+        write(os.path.join(self.dst, "d0", "f0.txt"), b"changed size")
+        os.unlink(os.path.join(self.dst, "d1", "f1.txt"))
+        write(os.path.join(self.dst, "d2", "extra.txt"), b"new")
+        os.makedirs(os.path.join(self.dst, "newdir", "x"))
+        shutil.rmtree(os.path.join(self.dst, "d2"))
+        write(os.path.join(self.dst, "d2"), b"now a file")
+
+        stats = sync_tree(self.src, self.dst)
+
+        self.assertEqual(stats.files_unchanged, 20 - 2 - 6)
+        self.assertEqual(stats.files_copied, 2 + 6)
+        self.assertFalse(os.path.exists(os.path.join(self.dst, "newdir")))
+        for i in range(20):
+            self.assertEqual(read(os.path.join(self.dst, f"d{i % 3}", f"f{i}.txt")),
+                             f"file {i}".encode())
+
+    def test_mtime_change_triggers_copy(self):
+        path = os.path.join(self.dst, "d0", "f0.txt")
+        write(path, b"FILE 0")
+        stats = sync_tree(self.src, self.dst)
+        self.assertEqual(stats.files_copied, 1)
+        self.assertEqual(read(path), b"file 0")
+
+    def test_compare_hash_catches_preserved_mtime(self):
+        path = os.path.join(self.dst, "d0", "f0.txt")
+        st = os.stat(path)
+        write(path, b"FILE 0")
+        os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns))
+
+        self.assertEqual(sync_tree(self.src, self.dst).files_copied, 0)
+        stats = sync_tree(self.src, self.dst, compare_hash=True)
+        self.assertEqual(stats.files_copied, 1)
+        self.assertEqual(read(path), b"file 0")
+
+    def test_compare_hash_skips_touched_files(self):
+        path = os.path.join(self.dst, "d0", "f0.txt")
+        os.utime(path, ns=(1, 1))
+        stats = sync_tree(self.src, self.dst, compare_hash=True)
+        self.assertEqual(stats.files_copied, 0)
+        self.assertEqual(os.stat(path).st_mtime_ns,
+                         os.stat(os.path.join(self.src, "d0", "f0.txt")).st_mtime_ns)
+
+    def test_does_not_write_through_hardlinks(self):
+        path = os.path.join(self.dst, "d0", "f0.txt")
+        other = os.path.join(self.temp_dir, "shared.txt")
+        os.unlink(path)
+        write(other, b"shared content")
+        os.link(other, path)
+
+        sync_tree(self.src, self.dst)
+        self.assertEqual(read(other), b"shared content")
+        self.assertEqual(read(path), b"file 0")
+
+
+class TestDifferentialRollback(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.target = os.path.join(self.temp_dir, "target")
+        for i in range(10):
+            write(os.path.join(self.target, f"f{i}.bin"), f"original {i}".encode())
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_rollback_manager_differential(self):
+        sink = InMemorySink()
+        manager = RollbackManager(os.path.join(self.temp_dir, "snapshots"),
+                                  metrics=Metrics([sink]))
+        manager.create_snapshot(self.target, "snap")
+        write(os.path.join(self.target, "f3.bin"), b"modified")
+        write(os.path.join(self.target, "new.bin"), b"new")
+
+        self.assertTrue(manager.rollback_to_snapshot("snap", self.target, differential=True))
+        self.assertEqual(read(os.path.join(self.target, "f3.bin")), b"original 3")
+        self.assertFalse(os.path.exists(os.path.join(self.target, "new.bin")))
+        self.assertEqual(sink.total("ota_files_touched_total", component="snapshot_rollback"), 1)
+
+    def test_updater_differential_rollback(self):
+        updater = Updater(Verifier(), os.path.join(self.temp_dir, "backup"),
+                          differential_rollback=True)
+        updater._create_backup(self.target)
+        write(os.path.join(self.target, "f0.bin"), b"broken")
+        updater._rollback(self.target)
+        self.assertEqual(read(os.path.join(self.target, "f0.bin")), b"original 0")
+
+
+if __name__ == '__main__':
+    unittest.main()
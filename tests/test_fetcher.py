@@ -0,0 +1,249 @@
+"""
+Tests for Fetcher and Package Server modules.
+"""
+
+import unittest
+import tempfile
+import os
+import json
+import shutil
+import time
+import http.client
+from unittest import mock
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+from src.fetcher import (PackageFetcher, FetchError, TokenBucket, PART_SUFFIX,
+                         PROGRESS_SUFFIX)
+from src.merkle import add_chunk_hashes
+from src.metrics import Metrics, InMemorySink
+from src.ota_package import OTAPackage, calculate_file_hash
+from src.package_server import PackageServer
+from src.updater import Updater
+from src.verifier import Verifier, STATUS_ERROR, STATUS_MISMATCH
+
+
+def read(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+class TestPackageServer(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        with open(os.path.join(self.temp_dir, "file.bin"), 'wb') as f:
+            f.write(bytes(range(256)) * 4)
+        self.server = PackageServer(self.temp_dir).start()
+        self.conn = http.client.HTTPConnection("127.0.0.1", self.server.port, timeout=5)
+
+    def tearDown(self):
+        self.conn.close()
+        self.server.stop()
+        shutil.rmtree(self.temp_dir)
+
+    def get(self, range_header=None):
+        headers = {'Range': range_header} if range_header else {}
+        self.conn.request('GET', "/file.bin", headers=headers)
+        response = self.conn.getresponse()
+        return response, response.read()
+
+    def test_ranges_over_one_connection(self):
+        data = bytes(range(256)) * 4
+        response, body = self.get("bytes=10-19")
+        self.assertEqual(response.status, 206)
+        self.assertEqual(response.getheader('Content-Range'), "bytes 10-19/1024")
+        self.assertEqual(body, data[10:20])
+        response, body = self.get("bytes=1000-")
+        self.assertEqual(body, data[1000:])
+        response, body = self.get("bytes=-4")
+        self.assertEqual(body, data[-4:])
+        response, body = self.get()
+        self.assertEqual(response.status, 200)
+        self.assertEqual(body, data)
+
+    def test_unsatisfiable_range(self):
+        response, _ = self.get("bytes=2000-2010")
+        self.assertEqual(response.status, 416)
+        self.assertEqual(response.getheader('Content-Range'), "bytes */1024")
+
+
+class TestPackageFetcher(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.served = os.path.join(self.temp_dir, "served")
+        self.payload = os.path.join(self.served, "pkg")
+        self.dest = os.path.join(self.temp_dir, "download")
+        self.contents = {
+            "big.bin": os.urandom(300000),
+            "sub/small.txt": b"small file",
+            "empty.txt": b"",
+        }
+        files = []
+        for rel_path, data in self.contents.items():
+            path = os.path.join(self.payload, rel_path)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as f:
+                f.write(data)
+            files.append({'path': rel_path, 'hash': calculate_file_hash(path),
+                          'size': len(data)})
+        self.package = OTAPackage(self.dest, "2.0.0", files)
+        self.server = PackageServer(self.served).start()
+        self.url = f"{self.server.url}/pkg"
+
+    def tearDown(self):
+        self.server.stop()
+        shutil.rmtree(self.temp_dir)
+
+    def assertDownloaded(self):
+        for rel_path, data in self.contents.items():
+            self.assertEqual(read(os.path.join(self.dest, rel_path)), data)
+            self.assertFalse(os.path.exists(os.path.join(self.dest, rel_path + PART_SUFFIX)))
+            self.assertFalse(os.path.exists(os.path.join(self.dest, rel_path + PROGRESS_SUFFIX)))
+
+    def test_fetch_package(self):
+        sink = InMemorySink()
+        fetcher = PackageFetcher(self.url, max_connections=4, chunk_size=16384,
+                                 metrics=Metrics([sink]))
+        result = fetcher.fetch(self.package)
+
+        self.assertTrue(result.ok)
+        self.assertDownloaded()
+        self.assertEqual(result.bytes_fetched, 300010)
+        self.assertEqual(result.chunks_fetched, 19 + 1)
+        self.assertEqual(sink.total("ota_fetch_bytes_total"), 300010)
+        # The updater finds the payload where it expects it
+        self.assertTrue(Updater(Verifier()).verify_package(self.package).ok)
+
+    def test_second_fetch_skips_complete_files(self):
+        PackageFetcher(self.url, chunk_size=65536).fetch(self.package)
+        result = PackageFetcher(self.url, chunk_size=65536).fetch(self.package)
+        self.assertTrue(result.ok)
+        self.assertEqual(result.files_skipped, 3)
+        self.assertEqual(result.bytes_fetched, 0)
+
+    def test_size_from_head_request(self):
+        for file_info in self.package.files:
+            del file_info['size']
+        self.assertTrue(PackageFetcher(self.url, chunk_size=65536).fetch(self.package).ok)
+        self.assertDownloaded()
+
+    def test_resume_after_interruption(self):
+        fetcher = PackageFetcher(self.url, max_connections=1, chunk_size=10000, retries=0)
+        original = fetcher.fetch_range
+        calls = []
+
+        def flaky(rel_path, start, end):
+            calls.append(start)
+            if rel_path == "big.bin" and len(calls) > 12:
+                raise FetchError("connection reset")
+            return original(rel_path, start, end)
+
+        with mock.patch.object(fetcher, 'fetch_range', side_effect=flaky):
+            result = fetcher.fetch(self.package)
+        self.assertFalse(result.ok)
+        self.assertEqual(result.results[0].status, STATUS_ERROR)
+        progress_path = os.path.join(self.dest, "big.bin" + PROGRESS_SUFFIX)
+        with open(progress_path) as f:
+            done = json.load(f)['done']
+        self.assertGreater(len(done), 0)
+
+        result = PackageFetcher(self.url, chunk_size=10000).fetch(self.package)
+        self.assertTrue(result.ok)
+        self.assertEqual(result.chunks_resumed, len(done))
+        self.assertEqual(result.chunks_fetched, 30 - len(done))
+        self.assertEqual(result.files_skipped, 2)
+        self.assertDownloaded()
+
+    def test_progress_ignored_when_manifest_changes(self):
+        os.makedirs(self.dest)
+        with open(os.path.join(self.dest, "big.bin" + PART_SUFFIX), 'wb') as f:
+            f.write(b"\0" * 300000)
+        with open(os.path.join(self.dest, "big.bin" + PROGRESS_SUFFIX), 'w') as f:
+            json.dump({'hash': "0" * 64, 'size': 300000, 'chunk_size': 65536,
+                       'done': [0, 1, 2, 3, 4]}, f)
+        result = PackageFetcher(self.url, chunk_size=65536).fetch(self.package)
+        self.assertTrue(result.ok)
+        self.assertEqual(result.chunks_resumed, 0)
+        self.assertDownloaded()
+
+    def test_chunk_hashes_checked_on_arrival(self):
+        file_info = self.package.files[0]
+        add_chunk_hashes(file_info, os.path.join(self.payload, "big.bin"), 65536)
+        file_info['chunks'][2] = "0" * 64
+        fetcher = PackageFetcher(self.url, retries=1)
+        with mock.patch.object(fetcher, 'fetch_range', wraps=fetcher.fetch_range) as fetch_range:
+            result = fetcher.fetch(self.package)
+        self.assertEqual(result.results[0].status, STATUS_MISMATCH)
+        self.assertIn("chunk 2", result.results[0].error)
+        self.assertEqual(fetch_range.call_args_list.count(
+            mock.call("big.bin", 131072, 196608)), 2)
+        self.assertFalse(os.path.exists(os.path.join(self.dest, "big.bin")))
+        self.assertTrue(result.results[1].ok)
+
+    def test_corrupt_server_file_rejected(self):
+        with open(os.path.join(self.payload, "sub/small.txt"), 'wb') as f:
+            f.write(b"tampered!!")
+        result = PackageFetcher(self.url).fetch(self.package)
+        self.assertEqual(result.results[1].status, STATUS_MISMATCH)
+        self.assertFalse(os.path.exists(os.path.join(self.dest, "sub/small.txt")))
+        self.assertFalse(os.path.exists(os.path.join(self.dest, "sub/small.txt" + PART_SUFFIX)))
+
+    def test_missing_remote_file(self):
+        self.package.files.append({'path': "gone.bin", 'hash': "0" * 64, 'size': 10})
+        result = PackageFetcher(self.url, retries=0).fetch(self.package)
+        self.assertEqual(result.results[-1].status, STATUS_ERROR)
+        self.assertIn("404", result.results[-1].error)
+
+    def test_rate_limit(self):
+        start = time.monotonic()
+        result = PackageFetcher(self.url, chunk_size=65536, rate_limit=1000000).fetch(self.package)
+        self.assertTrue(result.ok)
+        # 300 KB at 1 MB/s with a 1 MB burst still finishes quickly; the limiter
+        # only has to pay back what exceeds the burst
+        self.assertLess(time.monotonic() - start, 5)
+
+    @unittest.skipUnless(resource and os.path.isdir("/proc/self/fd"), "needs RLIMIT_NOFILE")
+    def test_more_files_than_descriptor_limit(self):
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        limit = len(os.listdir("/proc/self/fd")) + 48
+        files = []
+        for i in range(limit + 100):
+            path = os.path.join(self.payload, "many", f"{i}.txt")
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as f:
+                f.write(b"%d" % i)
+            files.append({'path': f"many/{i}.txt", 'hash': calculate_file_hash(path),
+                          'size': os.path.getsize(path)})
+        package = OTAPackage(self.dest, "2.0.0", files)
+        resource.setrlimit(resource.RLIMIT_NOFILE, (limit, hard))
+        try:
+            result = PackageFetcher(self.url, max_connections=4).fetch(package)
+        finally:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (soft, hard))
+        self.assertEqual([r.error for r in result.results if not r.ok], [])
+        self.assertEqual(read(os.path.join(self.dest, "many/7.txt")), b"7")
+
+    def test_rejects_non_http_url(self):
+        with self.assertRaises(ValueError):
+            PackageFetcher("ftp://example.com/pkg")
+
+
+class TestTokenBucket(unittest.TestCase):
+
+    def test_waits_for_debt(self):
+        bucket = TokenBucket(rate=100000, burst=1000)
+        start = time.monotonic()
+        bucket.consume(1000)
+        bucket.consume(20000)
+        self.assertGreaterEqual(time.monotonic() - start, 0.15)
+
+    def test_rejects_bad_rate(self):
+        with self.assertRaises(ValueError):
+            TokenBucket(0)
+
+
+if __name__ == '__main__':
+    unittest.main()
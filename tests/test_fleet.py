@@ -0,0 +1,175 @@
+"""
+Tests for Fleet module.
+"""
+
+import unittest
+import asyncio
+import io
+import threading
+import time
+from contextlib import redirect_stdout
+from src.fleet import FleetCampaign, generate_fleet, percentile
+from src.metrics import Metrics, InMemorySink
+from src.ota_package import OTAPackage
+
+
+class TestFleetCampaign(unittest.TestCase):
+
+    def setUp(self):
+        self.package = OTAPackage("fleet_pkg", "2.0.0", [])
+
+    def test_generate_fleet(self):
+        fleet = generate_fleet(100)
+        self.assertEqual(len(fleet), 100)
+        self.assertEqual(fleet[0].vehicle_id, "VIN00")
+        self.assertEqual(len({v.vehicle_id for v in fleet}), 100)
+
+    def test_full_rollout(self):
+        fleet = generate_fleet(1000)
+        report = FleetCampaign(self.package, max_concurrency=50, seed=1).run(fleet)
+
+        self.assertFalse(report.aborted)
+        self.assertEqual(report.updated, 1000)
+        self.assertEqual(report.stages_completed, 1)
+        self.assertTrue(all(v.current_version == "2.0.0" for v in fleet))
+        self.assertGreater(report.throughput, 0)
+        self.assertEqual(len(report.latencies), 1000)
+
+    def test_percentage_rollout(self):
+        fleet = generate_fleet(200)
+        report = FleetCampaign(self.package, stages=[0.25], seed=1).run(fleet)
+
+        self.assertEqual(report.updated, 50)
+        self.assertEqual(sum(v.current_version == "2.0.0" for v in fleet), 50)
+
+    def test_staged_rollout_reaches_everyone(self):
+        fleet = generate_fleet(100)
+        report = FleetCampaign(self.package, stages=[0.01, 0.1, 1.0], seed=1).run(fleet)
+
+        self.assertEqual(report.stages_completed, 3)
+        self.assertEqual(report.updated, 100)
+
+    def test_skips_up_to_date_vehicles(self):
+        fleet = generate_fleet(10)
+        fleet[0].current_version = "2.0.0"
+        report = FleetCampaign(self.package, seed=1).run(fleet)
+
+        self.assertEqual(report.skipped, 1)
+        self.assertEqual(report.updated, 9)
+
+    def test_skips_vehicles_with_invalid_versions(self):
+        fleet = generate_fleet(10)
+        fleet[3].current_version = "1.0.0.0"
+        fleet[7].current_version = "unknown"
+        out = io.StringIO()
+        with redirect_stdout(out):
+            report = FleetCampaign(self.package, max_concurrency=2, seed=1).run(fleet)
+
+        self.assertEqual(out.getvalue(), "")
+
+        self.assertEqual(report.updated, 8)
+        self.assertEqual(report.skipped, 2)
+        self.assertEqual(sorted(report.invalid_versions), [fleet[3].vehicle_id, fleet[7].vehicle_id])
+        self.assertEqual(report.to_dict()['invalid_versions'], 2)
+
+    def test_update_errors_recorded(self):
+        def update(vehicle, package):
+            if vehicle.vehicle_id in ("VIN1", "VIN4"):
+                raise RuntimeError(f"{vehicle.vehicle_id} unreachable")
+            return True
+
+        out = io.StringIO()
+        with redirect_stdout(out):
+            report = FleetCampaign(self.package, update_func=update,
+                                   failure_threshold=1.0).run(generate_fleet(6))
+
+        self.assertEqual(out.getvalue(), "")
+        self.assertEqual(report.errors, {"VIN1": "VIN1 unreachable", "VIN4": "VIN4 unreachable"})
+        self.assertEqual(sorted(report.failed_vehicles), ["VIN1", "VIN4"])
+        self.assertEqual(report.to_dict()['errors'], 2)
+
+    def test_aborts_on_failure_threshold(self):
+        fleet = generate_fleet(2000)
+        campaign = FleetCampaign(self.package, stages=[0.05, 1.0], max_concurrency=10,
+                                 failure_rate=0.5, failure_threshold=0.1,
+                                 min_samples=20, seed=3)
+        report = campaign.run(fleet)
+
+        self.assertTrue(report.aborted)
+        self.assertIn("failure rate", report.abort_reason)
+        self.assertEqual(report.stages_completed, 0)
+        # Only in-flight vehicles finish after the abort
+        self.assertLess(report.attempted, 20 + 10)
+        self.assertEqual(len(report.failed_vehicles), report.failed)
+
+    def test_concurrency_bound_with_update_func(self):
+        active = [0]
+        peak = [0]
+        lock = threading.Lock()
+
+        def update(vehicle, package):
+            with lock:
+                active[0] += 1
+                peak[0] = max(peak[0], active[0])
+            time.sleep(0.02)
+            with lock:
+                active[0] -= 1
+            return vehicle.vehicle_id != "VIN3"
+
+        fleet = generate_fleet(8)
+        report = FleetCampaign(self.package, max_concurrency=2, update_func=update,
+                               failure_threshold=1.0).run(fleet)
+
+        self.assertEqual(peak[0], 2)
+        self.assertEqual(report.failed, 1)
+        self.assertEqual(report.failed_vehicles, ["VIN3"])
+
+    def test_concurrency_bound_with_simulated_updates(self):
+        active = [0]
+        peak = [0]
+        campaign = FleetCampaign(self.package, max_concurrency=3)
+
+        async def simulate():
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+            await asyncio.sleep(0.01)
+            active[0] -= 1
+            return True
+
+        campaign._simulate = simulate
+        report = campaign.run(generate_fleet(20))
+        self.assertEqual(report.updated, 20)
+        self.assertEqual(peak[0], 3)
+
+    def test_simulated_latency_percentiles(self):
+        fleet = generate_fleet(40)
+        report = FleetCampaign(self.package, max_concurrency=40, latency=0.01,
+                               latency_jitter=0.005, seed=2).run(fleet)
+        tail = report.latency_percentiles()
+
+        self.assertGreaterEqual(tail['p50'], 0.005)
+        self.assertLessEqual(tail['p50'], tail['p95'])
+        self.assertLessEqual(tail['p95'], tail['p99'])
+        self.assertLess(report.duration, 0.5)
+
+    def test_metrics(self):
+        sink = InMemorySink()
+        fleet = generate_fleet(10)
+        FleetCampaign(self.package, metrics=Metrics([sink])).run(fleet)
+        self.assertEqual(sink.total('ota_fleet_updates_total', result='updated'), 10)
+
+    def test_invalid_stages(self):
+        with self.assertRaises(ValueError):
+            FleetCampaign(self.package, stages=[0.5, 0.1])
+        with self.assertRaises(ValueError):
+            FleetCampaign(self.package, stages=[0.0, 1.0])
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 0.5), 50)
+        self.assertEqual(percentile(values, 0.99), 99)
+        self.assertEqual(percentile([], 0.5), 0.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,145 @@
+"""
+Tests for Fleet Store module.
+"""
+
+import unittest
+import tempfile
+import os
+import shutil
+from src.fleet import FleetCampaign, generate_fleet
+from src.fleet_store import FleetStore
+from src.ota_package import OTAPackage
+from src.vehicle import Vehicle
+
+
+class TestFleetStore(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.store = FleetStore(os.path.join(self.temp_dir, "fleet.db"))
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.temp_dir)
+
+    def _vehicle(self, vehicle_id, version="1.0.0", **components):
+        vehicle = Vehicle(vehicle_id, version)
+        for component, component_version in components.items():
+            vehicle.add_component(component, component_version)
+        return vehicle
+
+    def test_upsert_and_get(self):
+        self.store.upsert_vehicles([self._vehicle("V1", ecu="1.0"), self._vehicle("V2")])
+        vehicle = self.store.get_vehicle("V1")
+
+        self.assertEqual(len(self.store), 2)
+        self.assertEqual(vehicle.current_version, "1.0.0")
+        self.assertEqual(vehicle.installed_components, {"ecu": "1.0"})
+        self.assertIsNone(self.store.get_vehicle("missing"))
+
+    def test_upsert_replaces_components(self):
+        self.store.upsert_vehicles([self._vehicle("V1", ecu="1.0", tcu="1.0")])
+        self.store.upsert_vehicles([self._vehicle("V1", "1.1.0", ecu="2.0")])
+        vehicle = self.store.get_vehicle("V1")
+
+        self.assertEqual(vehicle.current_version, "1.1.0")
+        self.assertEqual(vehicle.installed_components, {"ecu": "2.0"})
+
+    def test_record_update_appends_history(self):
+        self.store.upsert_vehicles([self._vehicle("V1")])
+        self.store.record_update("V1", "pkg1", "1.1.0", "2024-01-01")
+        self.store.record_update("V1", "pkg2", "1.2.0", "2024-02-01")
+
+        vehicle = self.store.get_vehicle("V1", with_history=True)
+        self.assertEqual(vehicle.current_version, "1.2.0")
+        self.assertEqual(vehicle.update_history, [
+            {'package_id': "pkg1", 'previous_version': "1.0.0",
+             'new_version': "1.1.0", 'timestamp': "2024-01-01"},
+            {'package_id': "pkg2", 'previous_version': "1.1.0",
+             'new_version': "1.2.0", 'timestamp': "2024-02-01"},
+        ])
+        self.assertEqual(len(self.store.history("V1", limit=1)), 1)
+        self.assertEqual(self.store.history("V1", limit=1)[0]['package_id'], "pkg2")
+
+    def test_record_component_update(self):
+        self.store.upsert_vehicles([self._vehicle("V1", ecu="1.0")])
+        self.store.record_component_update("V1", "campaign", {"ecu": "2.0", "tcu": "1.0"}, "ts")
+
+        vehicle = self.store.get_vehicle("V1", with_history=True)
+        self.assertEqual(vehicle.installed_components, {"ecu": "2.0", "tcu": "1.0"})
+        self.assertEqual(vehicle.update_history[0]['components']['ecu'],
+                         {'previous_version': "1.0", 'new_version': "2.0"})
+
+    def test_fleet_queries(self):
+        self.store.upsert_vehicles([
+            self._vehicle("V1", "1.0.0", ecu="1.0"),
+            self._vehicle("V2", "2.0.0", ecu="2.0"),
+            self._vehicle("V3", "2.0.0"),
+        ])
+
+        self.assertEqual(self.store.vehicles_on_version("2.0.0"), ["V2", "V3"])
+        self.assertEqual(self.store.vehicles_with_component("ecu"), ["V1", "V2"])
+        self.assertEqual(self.store.vehicles_with_component("ecu", "1.0"), ["V1"])
+        self.assertEqual(self.store.version_counts(), {"1.0.0": 1, "2.0.0": 2})
+
+    def test_queries_use_indexes(self):
+        plan = self.store._conn.execute(
+            "EXPLAIN QUERY PLAN SELECT vehicle_id FROM vehicles WHERE current_version = ?",
+            ("1.0.0",)
+        ).fetchall()
+        self.assertIn("idx_vehicles_version", str(plan))
+
+    def test_iter_vehicles_in_batches(self):
+        self.store.upsert_vehicles(
+            self._vehicle(f"V{i:03d}", ecu=str(i)) for i in range(25)
+        )
+        vehicles = list(self.store.iter_vehicles(batch_size=10))
+
+        self.assertEqual(len(vehicles), 25)
+        self.assertEqual(vehicles[7].vehicle_id, "V007")
+        self.assertEqual(vehicles[7].installed_components, {"ecu": "7"})
+
+    def test_failed_transaction_rolls_back(self):
+        self.store.upsert_vehicles([self._vehicle("V1")])
+        with self.assertRaises(ValueError):
+            self.store.record_updates([("V1", "pkg", "2.0.0", "ts"), ("V1",)])
+        self.assertEqual(self.store.get_vehicle("V1").current_version, "1.0.0")
+        self.assertEqual(self.store.history("V1"), [])
+
+    def test_import_state_files(self):
+        vehicle = self._vehicle("V1", ecu="1.0")
+        vehicle.record_update("pkg", "1.1.0", "ts")
+        path = os.path.join(self.temp_dir, "vehicle.json")
+        vehicle.save_state(path)
+
+        self.assertEqual(self.store.import_state_files([path]), 1)
+        loaded = self.store.get_vehicle("V1", with_history=True)
+        self.assertEqual(loaded.to_dict(), vehicle.to_dict())
+
+    def test_persists_across_reopen(self):
+        self.store.upsert_vehicles([self._vehicle("V1")])
+        self.store.close()
+        self.store = FleetStore(os.path.join(self.temp_dir, "fleet.db"))
+        self.assertEqual(self.store.vehicles_on_version("1.0.0"), ["V1"])
+
+    def test_campaign_records_to_store(self):
+        fleet = generate_fleet(50)
+        self.store.upsert_vehicles(fleet)
+        FleetCampaign(OTAPackage("pkg", "2.0.0", []), stages=[0.2, 1.0],
+                      store=self.store, seed=1).run(fleet)
+
+        self.assertEqual(self.store.version_counts(), {"2.0.0": 50})
+        self.assertEqual(len(self.store.history(fleet[0].vehicle_id)), 1)
+
+
+class TestVehicleSlots(unittest.TestCase):
+
+    def test_vehicle_has_no_instance_dict(self):
+        vehicle = Vehicle("V1", "1.0.0")
+        self.assertFalse(hasattr(vehicle, '__dict__'))
+        with self.assertRaises(AttributeError):
+            vehicle.color = "red"
+
+
+if __name__ == '__main__':
+    unittest.main()
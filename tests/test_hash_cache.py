@@ -0,0 +1,123 @@
+"""
+Tests for Hash Cache module.
+"""
+
+import unittest
+import tempfile
+import os
+import time
+import io
+from contextlib import redirect_stdout
+from src.hash_cache import HashCache
+from src.ota_package import OTAPackage, calculate_file_hash
+from src.updater import Updater
+from src.verifier import Verifier
+
+TEST_CONTENT_HASH = "6ae8a75555209fd6c44157c0aed8016e763ff435a19cf186f76863140143ff72"
+
+
+def write_old_file(path, content):
+    """Write a file with an mtime outside the racy window."""
+    with open(path, "wb") as f:
+        f.write(content)
+    old = time.time() - 60
+    os.utime(path, (old, old))
+
+
+class TestHashCache(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.file_path = os.path.join(self.temp_dir.name, "image.bin")
+        write_old_file(self.file_path, b"test content")
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_get_or_compute_caches_digest(self):
+        cache = HashCache()
+        calls = []
+
+        def compute(path):
+            calls.append(path)
+            return "digest"
+
+        self.assertEqual(cache.get_or_compute(self.file_path, compute), "digest")
+        self.assertEqual(cache.get_or_compute(self.file_path, compute), "digest")
+        self.assertEqual(len(calls), 1)
+
+    def test_modified_file_misses(self):
+        cache = HashCache()
+        cache.put(self.file_path, "digest")
+        write_old_file(self.file_path, b"other content")
+        os.utime(self.file_path, ns=(0, 1_000_000_000))
+        self.assertIsNone(cache.get(self.file_path))
+
+    def test_recent_file_not_cached(self):
+        cache = HashCache()
+        os.utime(self.file_path)
+        cache.put(self.file_path, "digest")
+        self.assertEqual(len(cache), 0)
+
+    def test_lru_eviction(self):
+        cache = HashCache(max_entries=2)
+        paths = []
+        for i in range(3):
+            path = os.path.join(self.temp_dir.name, f"file{i}.bin")
+            write_old_file(path, bytes([i]))
+            paths.append(path)
+
+        cache.put(paths[0], "d0")
+        cache.put(paths[1], "d1")
+        cache.get(paths[0])
+        cache.put(paths[2], "d2")
+
+        self.assertEqual(cache.get(paths[0]), "d0")
+        self.assertIsNone(cache.get(paths[1]))
+        self.assertEqual(cache.get(paths[2]), "d2")
+
+    def test_save_and_load(self):
+        cache_path = os.path.join(self.temp_dir.name, "cache", "hashes.json")
+        cache = HashCache(cache_path)
+        self.assertEqual(calculate_file_hash(self.file_path, cache), TEST_CONTENT_HASH)
+        self.assertTrue(os.path.exists(cache_path))
+
+        reloaded = HashCache(cache_path)
+        self.assertEqual(reloaded.get(self.file_path), TEST_CONTENT_HASH)
+
+    def test_corrupt_cache_file_starts_empty(self):
+        cache_path = os.path.join(self.temp_dir.name, "hashes.json")
+        for content in ('{"entries": [["key", "dig', '[1, 2]', '{"entries": 5}'):
+            with self.subTest(content=content):
+                with open(cache_path, "w") as f:
+                    f.write(content)
+                with redirect_stdout(io.StringIO()):
+                    cache = HashCache(cache_path)
+                self.assertEqual(len(cache), 0)
+                verifier = Verifier(hash_cache=cache)
+                self.assertTrue(verifier.verify_hash(self.file_path, TEST_CONTENT_HASH))
+
+    def test_verifier_strict_bypasses_cache(self):
+        cache = HashCache()
+        cache.put(self.file_path, "0" * 64)
+        verifier = Verifier(hash_cache=cache)
+
+        self.assertTrue(verifier.verify_hash(self.file_path, "0" * 64))
+        self.assertFalse(verifier.verify_hash(self.file_path, "0" * 64, strict=True))
+        self.assertTrue(verifier.verify_hash(self.file_path, TEST_CONTENT_HASH, strict=True))
+
+    def test_apply_update_does_not_trust_cache(self):
+        cache = HashCache()
+        cache.put(self.file_path, "0" * 64)
+        package = OTAPackage(self.temp_dir.name, "1.0.0", [{'path': "image.bin", 'hash': "0" * 64}])
+        target = os.path.join(self.temp_dir.name, "target")
+        os.makedirs(target)
+        updater = Updater(Verifier(hash_cache=cache), os.path.join(self.temp_dir.name, "backup"))
+
+        self.assertTrue(updater.verify_package(package).ok)
+        self.assertFalse(updater.verify_package(package, strict=True).ok)
+        self.assertFalse(updater.apply_update(package, target))
+
+
+if __name__ == '__main__':
+    unittest.main()
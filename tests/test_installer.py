@@ -0,0 +1,87 @@
+"""
+Tests for Installer module.
+"""
+
+import unittest
+import errno
+import tempfile
+import os
+from unittest import mock
+from src import installer as installer_module
+from src.installer import StreamingInstaller
+from src.merkle import add_chunk_hashes
+from src.ota_package import OTAPackage
+from src.updater import Updater
+from src.verifier import Verifier, STATUS_MISMATCH
+
+TEST_HASH = "9f86d081884c7d659a2feaa0c55ad015a3bf4f1b2b0b822cd15d6c15b0f00a08"
+
+
+class TestStreamingInstaller(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.package_dir = os.path.join(self.temp_dir.name, "pkg")
+        self.target_dir = os.path.join(self.temp_dir.name, "target")
+        os.makedirs(os.path.join(self.package_dir, "sub"))
+        os.makedirs(self.target_dir)
+        with open(os.path.join(self.package_dir, "sub", "test.txt"), "w") as f:
+            f.write("test")
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_install_writes_verified_file(self):
+        package = OTAPackage(self.package_dir, "1.0.0",
+                             [{"path": "sub/test.txt", "hash": TEST_HASH, "size": 4}])
+        self.assertTrue(StreamingInstaller(buffer_size=3)(package, self.target_dir))
+        with open(os.path.join(self.target_dir, "sub", "test.txt")) as f:
+            self.assertEqual(f.read(), "test")
+
+    def test_bad_file_never_lands(self):
+        with open(os.path.join(self.target_dir, "test.txt"), "w") as f:
+            f.write("installed")
+        os.rename(os.path.join(self.package_dir, "sub", "test.txt"),
+                  os.path.join(self.package_dir, "test.txt"))
+        package = OTAPackage(self.package_dir, "1.0.0",
+                             [{"path": "test.txt", "hash": "0" * 64, "size": 4}])
+
+        results = StreamingInstaller().install(package, self.target_dir)
+        self.assertEqual(results[0].status, STATUS_MISMATCH)
+        with open(os.path.join(self.target_dir, "test.txt")) as f:
+            self.assertEqual(f.read(), "installed")
+        self.assertEqual(os.listdir(self.target_dir), ["test.txt"])
+
+    def test_updater_streaming_install(self):
+        package = OTAPackage(self.package_dir, "1.0.0",
+                             [{"path": "sub/test.txt", "hash": TEST_HASH, "size": 4}])
+        updater = Updater(Verifier(), os.path.join(self.temp_dir.name, "backup"),
+                          streaming_install=True)
+        self.assertTrue(updater.apply_update(package, self.target_dir))
+        self.assertTrue(os.path.exists(os.path.join(self.target_dir, "sub", "test.txt")))
+        self.assertTrue(updater.last_verification.ok)
+        self.assertEqual(updater.last_verification.checked, 1)
+
+    def test_partial_dir_on_another_filesystem(self):
+        src_path = os.path.join(self.package_dir, "sub", "test.txt")
+        file_info = {"path": "sub/test.txt", "hash": TEST_HASH, "size": 4}
+        add_chunk_hashes(file_info, src_path, chunk_size=2)
+        package = OTAPackage(self.package_dir, "1.0.0", [file_info])
+        partial_dir = os.path.join(self.temp_dir.name, "partial")
+        replace = os.replace
+
+        def cross_device(src, dst):
+            if src.startswith(partial_dir):
+                raise OSError(errno.EXDEV, "Invalid cross-device link")
+            replace(src, dst)
+
+        with mock.patch.object(installer_module.os, 'replace', side_effect=cross_device):
+            self.assertTrue(StreamingInstaller(partial_dir=partial_dir)(package, self.target_dir))
+        with open(os.path.join(self.target_dir, "sub", "test.txt")) as f:
+            self.assertEqual(f.read(), "test")
+        self.assertEqual(os.listdir(os.path.join(self.target_dir, "sub")), ["test.txt"])
+        self.assertEqual(os.listdir(os.path.join(partial_dir, "sub")), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,298 @@
+"""
+Tests for Journal module.
+"""
+
+import unittest
+import tempfile
+import os
+import shutil
+from unittest import mock
+from src import updater as updater_module
+from src.installer import StreamingInstaller
+from src.journal import (OUTCOME_COMMITTED, OUTCOME_ROLLED_BACK, UpdateJournal,
+                         decode_record, encode_record)
+from src.ota_package import OTAPackage, calculate_file_hash
+from src.updater import (Updater, RecoveryError, BACKUP_INCREMENTAL, RECOVERY_COMPLETED,
+                         RECOVERY_NONE, RECOVERY_ROLLED_BACK)
+from src.verifier import Verifier
+
+
+class Crash(BaseException):
+    """Stands in for the process dying mid-update."""
+
+
+def read(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+class TestJournalRecords(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.temp_dir, "journal")
+        self.package = OTAPackage("pkg", "1.0.0", [])
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_record_round_trip(self):
+        line = encode_record({'type': 'step', 'name': 'flash'})
+        self.assertEqual(decode_record(line), {'type': 'step', 'name': 'flash'})
+        self.assertIsNone(decode_record(line[:-1]))
+        self.assertIsNone(decode_record(line.replace(b"flash", b"flush")))
+
+    def test_replay(self):
+        journal = UpdateJournal(self.path)
+        journal.begin(self.package, self.temp_dir, "/backup", "full")
+        journal.phase_done('backup')
+        journal.installed('a.bin')
+        journal.step_done('flash')
+        journal.close()
+
+        state = UpdateJournal(self.path).replay()
+        self.assertTrue(state.in_progress)
+        self.assertEqual(state.begin['package_id'], "pkg")
+        self.assertEqual(state.phases, {'backup'})
+        self.assertEqual(state.installed, {'a.bin'})
+        self.assertEqual(state.steps, {'flash'})
+
+    def test_torn_tail_ignored_and_truncated_on_resume(self):
+        journal = UpdateJournal(self.path)
+        journal.begin(self.package, self.temp_dir, "/backup", "full")
+        journal.phase_done('backup')
+        journal.close()
+        with open(self.path, 'ab') as f:
+            f.write(encode_record({'type': 'step', 'name': 'half'})[:12])
+
+        journal = UpdateJournal(self.path)
+        state = journal.replay()
+        self.assertEqual(state.steps, set())
+        journal.resume(state)
+        journal.end(OUTCOME_COMMITTED)
+
+        state = journal.replay()
+        self.assertEqual(state.outcome, OUTCOME_COMMITTED)
+        self.assertFalse(state.in_progress)
+
+    def test_missing_journal(self):
+        self.assertFalse(UpdateJournal(self.path).replay().in_progress)
+
+
+class TestJournaledUpdate(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.package_dir = os.path.join(self.temp_dir, "pkg")
+        self.target = os.path.join(self.temp_dir, "target")
+        self.journal_path = os.path.join(self.temp_dir, "update.journal")
+        os.makedirs(self.package_dir)
+        os.makedirs(self.target)
+        files = []
+        for i in range(5):
+            path = os.path.join(self.package_dir, f"f{i}.bin")
+            with open(path, 'wb') as f:
+                f.write(f"new {i}".encode())
+            with open(os.path.join(self.target, f"f{i}.bin"), 'wb') as f:
+                f.write(f"old {i}".encode())
+            files.append({'path': f"f{i}.bin", 'hash': calculate_file_hash(path)})
+        self.package = OTAPackage(self.package_dir, "2.0.0", files)
+        self.ran = []
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def make_updater(self, crash_in=None, idempotent=True, **options):
+        updater = Updater(Verifier(), os.path.join(self.temp_dir, "backup"),
+                          journal_path=self.journal_path, **options)
+        for name in ("prepare", "flash", "finalize"):
+            def step(package, target_dir, name=name):
+                if name == crash_in:
+                    raise Crash()
+                self.ran.append(name)
+                return True
+            updater.add_update_step(step, name=name, idempotent=idempotent)
+        return updater
+
+    def crash(self, updater):
+        with self.assertRaises(Crash):
+            updater.apply_update(self.package, self.target)
+        updater.journal.close()
+
+    def assertTarget(self, prefix):
+        for i in range(5):
+            self.assertEqual(read(os.path.join(self.target, f"f{i}.bin")), f"{prefix} {i}".encode())
+
+    def test_resume_skips_finished_work(self):
+        self.crash(self.make_updater(crash_in="flash", streaming_install=True))
+        self.assertEqual(self.ran, ["prepare"])
+
+        updater = self.make_updater(streaming_install=True)
+        with mock.patch.object(updater, '_create_backup') as backup, \
+                mock.patch.object(StreamingInstaller, 'install_file') as install_file:
+            self.assertTrue(updater.apply_update(self.package, self.target))
+        backup.assert_not_called()
+        install_file.assert_not_called()
+        self.assertEqual(self.ran, ["prepare", "flash", "finalize"])
+        self.assertTarget("new")
+        self.assertEqual(updater.journal.replay().outcome, OUTCOME_COMMITTED)
+        self.assertFalse(os.path.exists(os.path.join(self.temp_dir, "backup")))
+
+    def test_resume_mid_install(self):
+        updater = self.make_updater(streaming_install=True)
+        original = StreamingInstaller.install_file
+        calls = []
+
+        def install_file(installer, *args, **kwargs):
+            calls.append(args[0])
+            if len(calls) == 3:
+                raise Crash()
+            return original(installer, *args, **kwargs)
+
+        with mock.patch.object(StreamingInstaller, 'install_file', install_file):
+            self.crash(updater)
+
+        updater = self.make_updater(streaming_install=True)
+        with mock.patch.object(StreamingInstaller, 'install_file', autospec=True,
+                               side_effect=original) as resumed:
+            self.assertTrue(updater.apply_update(self.package, self.target))
+        self.assertEqual([os.path.basename(c.args[1]) for c in resumed.call_args_list],
+                         ["f2.bin", "f3.bin", "f4.bin"])
+        self.assertTarget("new")
+
+    def test_resume_mid_verification(self):
+        updater = self.make_updater()
+        verify_files = updater.verifier.verify_files
+        calls = []
+
+        def flaky(batch, *args, **kwargs):
+            calls.append([os.path.basename(path) for path, _ in batch])
+            if len(calls) == 3:
+                raise Crash()
+            return verify_files(batch, *args, **kwargs)
+
+        with mock.patch.object(updater_module, 'VERIFY_BATCH_SIZE', 1), \
+                mock.patch.object(updater.verifier, 'verify_files', side_effect=flaky):
+            self.crash(updater)
+
+        # A file that changed since it was verified is checked again
+        st = os.stat(os.path.join(self.package_dir, "f0.bin"))
+        os.utime(os.path.join(self.package_dir, "f0.bin"),
+                 ns=(st.st_atime_ns, st.st_mtime_ns + 1000))
+        updater = self.make_updater()
+        with mock.patch.object(updater_module, 'VERIFY_BATCH_SIZE', 1), \
+                mock.patch.object(updater.verifier, 'verify_files',
+                                  wraps=updater.verifier.verify_files) as verify:
+            self.assertTrue(updater.apply_update(self.package, self.target))
+        self.assertEqual([[os.path.basename(path) for path, _ in c.args[0]]
+                          for c in verify.call_args_list],
+                         [["f0.bin"], ["f2.bin"], ["f3.bin"], ["f4.bin"]])
+        self.assertEqual(updater.last_verification.checked, 5)
+
+    def test_recover_rolls_back_without_package(self):
+        self.crash(self.make_updater(crash_in="finalize", streaming_install=True))
+        self.assertTarget("new")
+
+        updater = self.make_updater()
+        self.assertEqual(updater.recover(), RECOVERY_ROLLED_BACK)
+        self.assertTarget("old")
+        self.assertEqual(updater.journal.replay().outcome, OUTCOME_ROLLED_BACK)
+        self.assertFalse(os.path.exists(os.path.join(self.temp_dir, "backup")))
+        self.assertEqual(updater.recover(), RECOVERY_NONE)
+
+    def test_recover_with_package_completes(self):
+        self.crash(self.make_updater(crash_in="flash"))
+        self.assertEqual(self.make_updater().recover(self.package), RECOVERY_COMPLETED)
+        self.assertEqual(self.ran, ["prepare", "flash", "finalize"])
+
+    def test_recover_before_install_leaves_target_alone(self):
+        updater = self.make_updater()
+        with mock.patch.object(updater, '_pre_verify', side_effect=Crash()):
+            self.crash(updater)
+        updater = self.make_updater()
+        with mock.patch.object(updater, '_rollback') as rollback:
+            self.assertEqual(updater.recover(), RECOVERY_ROLLED_BACK)
+        rollback.assert_not_called()
+        self.assertTarget("old")
+
+    def test_other_package_rolls_back_interrupted_update(self):
+        self.crash(self.make_updater(crash_in="finalize", streaming_install=True))
+        other = OTAPackage(self.package_dir, "3.0.0", self.package.files[:1])
+        updater = Updater(Verifier(), os.path.join(self.temp_dir, "backup"),
+                          journal_path=self.journal_path)
+        self.assertTrue(updater.apply_update(other, self.target))
+        # The interrupted update was undone before the new one started
+        self.assertEqual(read(os.path.join(self.target, "f1.bin")), b"old 1")
+
+    def test_crash_in_non_idempotent_step_rolls_back_and_restarts(self):
+        log = os.path.join(self.target, "f0.bin")
+        updater = self.make_updater(idempotent=False, streaming_install=True)
+
+        def append(package, target_dir):
+            with open(log, 'ab') as f:
+                f.write(b"+")
+            if crashing:
+                raise Crash()
+            return True
+
+        updater.add_update_step(append, name="append")
+        crashing = True
+        self.crash(updater)
+        self.assertEqual(read(log), b"new 0+")
+        self.assertEqual(updater.journal.replay().interrupted_steps, {"append"})
+
+        updater = self.make_updater(idempotent=False, streaming_install=True)
+        updater.add_update_step(append, name="append")
+        crashing = False
+        self.assertEqual(updater.recover(self.package), RECOVERY_ROLLED_BACK)
+        self.assertEqual(read(log), b"old 0")
+        self.assertTrue(updater.apply_update(self.package, self.target))
+        # Appended once, not twice
+        self.assertEqual(read(log), b"new 0+")
+
+    def test_crash_in_idempotent_step_resumes(self):
+        self.crash(self.make_updater(crash_in="flash", streaming_install=True))
+        updater = self.make_updater(streaming_install=True)
+        with mock.patch.object(updater, '_rollback') as rollback:
+            self.assertEqual(updater.recover(self.package), RECOVERY_COMPLETED)
+        rollback.assert_not_called()
+
+    def test_recover_uses_journaled_backup(self):
+        self.crash(self.make_updater(crash_in="finalize", streaming_install=True,
+                                     backup_mode=BACKUP_INCREMENTAL))
+        self.assertTarget("new")
+        updater = Updater(Verifier(), os.path.join(self.temp_dir, "elsewhere"),
+                          journal_path=self.journal_path)
+        self.assertEqual(updater.recover(), RECOVERY_ROLLED_BACK)
+        self.assertTarget("old")
+        self.assertFalse(os.path.exists(os.path.join(self.temp_dir, "backup")))
+
+    def test_other_backup_dir_rolls_back_instead_of_resuming(self):
+        self.crash(self.make_updater(crash_in="finalize", streaming_install=True))
+        updater = Updater(Verifier(), os.path.join(self.temp_dir, "elsewhere"),
+                          journal_path=self.journal_path)
+        self.assertEqual(updater.recover(self.package), RECOVERY_ROLLED_BACK)
+        self.assertTarget("old")
+
+    def test_recover_fails_if_backup_missing(self):
+        self.crash(self.make_updater(crash_in="finalize", streaming_install=True))
+        shutil.rmtree(os.path.join(self.temp_dir, "backup"))
+        updater = self.make_updater()
+        with self.assertRaises(RecoveryError):
+            updater.recover()
+        self.assertTarget("new")
+        self.assertTrue(updater.journal.replay().in_progress)
+        other = OTAPackage(self.package_dir, "3.0.0", self.package.files[:1])
+        with self.assertRaises(RecoveryError):
+            updater.apply_update(other, self.target)
+
+    def test_failed_update_journals_rollback(self):
+        updater = self.make_updater()
+        updater.add_update_step(lambda package, target_dir: False, name="fails")
+        self.assertFalse(updater.apply_update(self.package, self.target))
+        self.assertEqual(updater.journal.replay().outcome, OUTCOME_ROLLED_BACK)
+        self.assertEqual(updater.recover(), RECOVERY_NONE)
+
+
+if __name__ == '__main__':
+    unittest.main()
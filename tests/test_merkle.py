@@ -0,0 +1,153 @@
+"""
+Tests for Merkle module.
+"""
+
+import unittest
+import tempfile
+import os
+from src.merkle import add_chunk_hashes, merkle_root, leaf_hash, read_leaf
+from src.installer import StreamingInstaller, PARTIAL_SUFFIX
+from src.metrics import Metrics, InMemorySink
+from src.ota_package import OTAPackage, calculate_file_hash
+from src.signer import Signer
+from src.updater import Updater
+from src.verifier import Verifier
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PRIVATE_KEY = os.path.join(REPO_ROOT, "private_key.pem")
+PUBLIC_KEY = os.path.join(REPO_ROOT, "public_key.pem")
+
+
+class TestMerkle(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.package_dir = os.path.join(self.temp_dir.name, "pkg")
+        os.makedirs(self.package_dir)
+        self.data = bytes(range(256)) * 40  # 10240 bytes, 10 full chunks of 1024
+        self.file_path = os.path.join(self.package_dir, "ecu.bin")
+        with open(self.file_path, "wb") as f:
+            f.write(self.data)
+
+        self.file_info = {"path": "ecu.bin", "hash": calculate_file_hash(self.file_path),
+                          "size": len(self.data)}
+        add_chunk_hashes(self.file_info, self.file_path, chunk_size=1024)
+        self.verifier = Verifier()
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def corrupt(self, path, offset):
+        with open(path, "r+b") as f:
+            f.seek(offset)
+            f.write(b"\xff\xff")
+
+    def test_merkle_root(self):
+        leaves = [leaf_hash(b"a"), leaf_hash(b"b"), leaf_hash(b"c")]
+        self.assertEqual(merkle_root(leaves[:1]), leaves[0])
+        self.assertNotEqual(merkle_root(leaves), merkle_root(leaves[:2]))
+        self.assertEqual(len(self.file_info["chunks"]), 10)
+        self.assertEqual(self.file_info["merkle_root"], merkle_root(self.file_info["chunks"]))
+
+    def test_read_leaf_with_small_buffer(self):
+        pieces = []
+        with open(self.file_path, "rb", buffering=0) as f:
+            f.seek(9 * 1024 + 512)
+            n, digest = read_leaf(f, memoryview(bytearray(100)), 1024,
+                                  lambda piece: pieces.append(bytes(piece)))
+        self.assertEqual(n, 512)
+        self.assertEqual(digest, leaf_hash(self.data[-512:]))
+        self.assertEqual(b"".join(pieces), self.data[-512:])
+
+    def test_find_bad_chunks(self):
+        self.assertEqual(self.verifier.find_bad_chunks(self.file_path, self.file_info), [])
+        self.corrupt(self.file_path, 3 * 1024 + 10)
+        self.corrupt(self.file_path, 7 * 1024)
+
+        self.assertEqual(self.verifier.find_bad_chunks(self.file_path, self.file_info), [3, 7])
+        self.assertFalse(self.verifier.verify_chunk(self.file_path, self.file_info, 3))
+        self.assertTrue(self.verifier.verify_chunk(self.file_path, self.file_info, 4))
+        self.assertEqual(self.verifier.resume_offset(self.file_path, self.file_info), 3 * 1024)
+
+    def test_signed_package_root(self):
+        package = OTAPackage(self.package_dir, "1.0.0", [self.file_info])
+        package.sign_root(Signer(PRIVATE_KEY))
+
+        verifier = Verifier(PUBLIC_KEY)
+        self.assertTrue(verifier.verify_package_root(package))
+
+        self.file_info["chunks"][0] = leaf_hash(b"tampered")
+        self.assertFalse(verifier.verify_package_root(package))
+
+    def test_manifest_roundtrip_keeps_root(self):
+        package = OTAPackage(self.package_dir, "1.0.0", [self.file_info])
+        package.sign_root(Signer(PRIVATE_KEY))
+        manifest_path = os.path.join(self.temp_dir.name, "manifest.json")
+        package.save_manifest(manifest_path)
+
+        loaded = OTAPackage.from_manifest(manifest_path)
+        self.assertEqual(loaded.merkle_root, package.merkle_root)
+        self.assertTrue(Verifier(PUBLIC_KEY).verify_package_root(loaded))
+
+    def test_install_resumes_from_verified_chunks(self):
+        target_dir = os.path.join(self.temp_dir.name, "target")
+        os.makedirs(target_dir)
+        package = OTAPackage(self.package_dir, "1.0.0", [self.file_info])
+        installer = StreamingInstaller()
+
+        # A corrupted source stops at the bad chunk and keeps the good prefix
+        self.corrupt(self.file_path, 5 * 1024)
+        self.assertFalse(installer(package, target_dir))
+        partial = os.path.join(target_dir, "ecu.bin" + PARTIAL_SUFFIX)
+        self.assertEqual(os.path.getsize(partial), 5 * 1024)
+
+        with open(self.file_path, "wb") as f:
+            f.write(self.data)
+        self.assertTrue(installer(package, target_dir))
+        self.assertFalse(os.path.exists(partial))
+        with open(os.path.join(target_dir, "ecu.bin"), "rb") as f:
+            self.assertEqual(f.read(), self.data)
+
+    def test_updater_retry_resumes_after_rollback(self):
+        target_dir = os.path.join(self.temp_dir.name, "target")
+        os.makedirs(target_dir)
+        with open(os.path.join(target_dir, "ecu.bin"), "wb") as f:
+            f.write(b"old")
+        package = OTAPackage(self.package_dir, "1.0.0", [self.file_info])
+        sink = InMemorySink()
+        updater = Updater(Verifier(), os.path.join(self.temp_dir.name, "backup"),
+                          streaming_install=True, metrics=Metrics([sink]))
+
+        self.corrupt(self.file_path, 5 * 1024)
+        self.assertFalse(updater.apply_update(package, target_dir))
+        with open(os.path.join(target_dir, "ecu.bin"), "rb") as f:
+            self.assertEqual(f.read(), b"old")
+        partial = os.path.join(updater.partial_dir, "ecu.bin" + PARTIAL_SUFFIX)
+        self.assertEqual(os.path.getsize(partial), 5 * 1024)
+
+        with open(self.file_path, "wb") as f:
+            f.write(self.data)
+        written = sink.total('ota_bytes_written_total', component='installer')
+        self.assertTrue(updater.apply_update(package, target_dir))
+        # Only the chunks after the verified prefix were copied again
+        self.assertEqual(sink.total('ota_bytes_written_total', component='installer') - written,
+                         5 * 1024)
+        with open(os.path.join(target_dir, "ecu.bin"), "rb") as f:
+            self.assertEqual(f.read(), self.data)
+        self.assertFalse(os.path.exists(updater.partial_dir))
+
+    def test_updater_checks_signed_root(self):
+        target_dir = os.path.join(self.temp_dir.name, "target")
+        os.makedirs(target_dir)
+        package = OTAPackage(self.package_dir, "1.0.0", [self.file_info])
+        package.sign_root(Signer(PRIVATE_KEY))
+        self.file_info["chunks"][0] = leaf_hash(b"tampered")
+
+        updater = Updater(Verifier(PUBLIC_KEY), os.path.join(self.temp_dir.name, "backup"),
+                          streaming_install=True)
+        self.assertFalse(updater.apply_update(package, target_dir))
+        self.assertFalse(os.path.exists(os.path.join(target_dir, "ecu.bin")))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+"""
+Tests for Metrics module.
+"""
+
+import unittest
+import tempfile
+import os
+import json
+from src.metrics import Metrics, MetricsSink, InMemorySink, JsonLinesSink, PrometheusTextSink
+from src.ota_package import OTAPackage
+from src.rollback import RollbackManager
+from src.updater import Updater
+from src.verifier import Verifier
+
+TEST_HASH = "9f86d081884c7d659a2feaa0c55ad015a3bf4f1b2b0b822cd15d6c15b0f00a08"
+
+
+class TestMetrics(unittest.TestCase):
+
+    def test_no_sink_is_noop(self):
+        metrics = Metrics()
+        self.assertFalse(metrics.enabled)
+        self.assertIs(metrics.timer("a"), metrics.timer("b"))
+        metrics.count("c", 5)
+
+    def test_sink_must_implement_record(self):
+        class NoRecord(MetricsSink):
+            pass
+
+        with self.assertRaises(TypeError):
+            MetricsSink()
+        with self.assertRaises(TypeError):
+            NoRecord()
+
+    def test_prometheus_render(self):
+        sink = PrometheusTextSink()
+        metrics = Metrics([sink])
+        metrics.count("ota_bytes_written_total", 10, component="installer")
+        metrics.count("ota_bytes_written_total", 5, component="installer")
+        metrics.timing("ota_update_phase_seconds", 0.5, phase="backup")
+        metrics.timing("ota_update_phase_seconds", 0.25, phase="backup")
+
+        text = sink.render()
+        self.assertIn("# TYPE ota_bytes_written_total counter", text)
+        self.assertIn('ota_bytes_written_total{component="installer"} 15', text)
+        self.assertIn('ota_update_phase_seconds_sum{phase="backup"} 0.75', text)
+        self.assertIn('ota_update_phase_seconds_count{phase="backup"} 2', text)
+
+    def test_json_lines_sink(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, "metrics.jsonl")
+            metrics = Metrics([JsonLinesSink(path)])
+            with metrics.timer("ota_snapshot_seconds", operation="create"):
+                pass
+            metrics.count("ota_files_touched_total", 3)
+
+            with open(path) as f:
+                records = [json.loads(line) for line in f]
+            self.assertEqual([r["name"] for r in records],
+                             ["ota_snapshot_seconds", "ota_files_touched_total"])
+            self.assertEqual(records[0]["labels"], {"operation": "create"})
+
+    def test_updater_reports_phases_and_steps(self):
+        sink = InMemorySink()
+        metrics = Metrics([sink])
+        with tempfile.TemporaryDirectory() as temp_dir:
+            target_dir = os.path.join(temp_dir, "target")
+            package_dir = os.path.join(temp_dir, "pkg")
+            os.makedirs(target_dir)
+            os.makedirs(package_dir)
+            with open(os.path.join(package_dir, "test.txt"), "w") as f:
+                f.write("test")
+            package = OTAPackage(package_dir, "1.0.0",
+                                 [{"path": "test.txt", "hash": TEST_HASH, "size": 4}])
+
+            def flash_ecu(package, target_dir):
+                return True
+
+            updater = Updater(Verifier(metrics=metrics), os.path.join(temp_dir, "backup"),
+                              metrics=metrics)
+            updater.add_update_step(flash_ecu)
+            self.assertTrue(updater.apply_update(package, target_dir))
+
+            for phase in ("backup", "verify", "install", "steps", "cleanup"):
+                self.assertEqual(len(sink.values("ota_update_phase_seconds", phase=phase)), 1)
+            self.assertEqual(len(sink.values("ota_update_step_seconds", step="flash_ecu")), 1)
+            self.assertEqual(sink.total("ota_verifier_bytes_hashed_total"), 4)
+
+            with open(os.path.join(target_dir, "installed.bin"), "w") as f:
+                f.write("data")
+            manager = RollbackManager(os.path.join(temp_dir, "snapshots"), metrics=metrics)
+            manager.create_snapshot(target_dir, "snap")
+            self.assertEqual(len(sink.values("ota_snapshot_seconds", operation="create")), 1)
+            self.assertEqual(sink.total("ota_bytes_written_total", component="snapshot"), 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
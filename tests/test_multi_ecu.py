@@ -0,0 +1,166 @@
+"""
+Tests for Multi-ECU module.
+"""
+
+import unittest
+import tempfile
+import os
+import shutil
+import threading
+import time
+from src.multi_ecu import (
+    MultiComponentUpdater, ComponentUpdate,
+    COMPONENT_SUCCESS, COMPONENT_FAILED, COMPONENT_ROLLED_BACK, COMPONENT_SKIPPED
+)
+from src.ota_package import OTAPackage, calculate_file_hash
+from src.vehicle import Vehicle
+from src.verifier import Verifier
+
+
+def copy_payload(package, target_dir):
+    for file_info in package.files:
+        shutil.copy(os.path.join(package.package_id, file_info['path']),
+                    os.path.join(target_dir, file_info['path']))
+    return True
+
+
+class TestMultiComponentUpdater(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.vehicle = Vehicle("VIN1", "1.0.0")
+        self.vehicle.add_component("ecu_a", "1.0.0")
+        self.vehicle.add_component("ecu_b", "1.0.0")
+        self.multi = MultiComponentUpdater(
+            Verifier(), backup_root=os.path.join(self.temp_dir, "backups"), max_workers=4
+        )
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def _component(self, name, version="2.0.0", **kwargs):
+        package_dir = os.path.join(self.temp_dir, f"{name}_pkg")
+        target_dir = os.path.join(self.temp_dir, name)
+        os.makedirs(package_dir)
+        os.makedirs(target_dir)
+        with open(os.path.join(package_dir, "firmware.bin"), "w") as f:
+            f.write(f"{name} {version}")
+        with open(os.path.join(target_dir, "firmware.bin"), "w") as f:
+            f.write(f"{name} old")
+        files = [{"path": "firmware.bin",
+                  "hash": calculate_file_hash(os.path.join(package_dir, "firmware.bin"))}]
+        package = OTAPackage(package_dir, version, files)
+        kwargs.setdefault('steps', [copy_payload])
+        return ComponentUpdate(name, package, target_dir, **kwargs)
+
+    def _read(self, update):
+        with open(os.path.join(update.target_dir, "firmware.bin")) as f:
+            return f.read()
+
+    def test_all_components_succeed(self):
+        updates = [self._component("ecu_a"), self._component("ecu_b")]
+        result = self.multi.apply(self.vehicle, updates, "campaign_1", "2024-01-01T00:00:00")
+
+        self.assertTrue(result.success)
+        for update in updates:
+            self.assertEqual(result.results[update.component].status, COMPONENT_SUCCESS)
+            self.assertEqual(self._read(update), f"{update.component} 2.0.0")
+        self.assertEqual(self.vehicle.installed_components,
+                         {"ecu_a": "2.0.0", "ecu_b": "2.0.0"})
+        entry = self.vehicle.update_history[-1]
+        self.assertEqual(entry['package_id'], "campaign_1")
+        self.assertEqual(entry['components']['ecu_a'],
+                         {'previous_version': "1.0.0", 'new_version': "2.0.0"})
+        self.assertFalse(os.path.exists(os.path.join(self.temp_dir, "backups", "ecu_a")))
+
+    def test_required_failure_rolls_back_all(self):
+        def fail(package, target_dir):
+            return False
+
+        good = self._component("ecu_a")
+        bad = self._component("ecu_b", steps=[copy_payload, fail])
+        result = self.multi.apply(self.vehicle, [good, bad])
+
+        self.assertFalse(result.success)
+        self.assertEqual(result.results["ecu_a"].status, COMPONENT_ROLLED_BACK)
+        self.assertEqual(result.results["ecu_b"].status, COMPONENT_FAILED)
+        self.assertEqual(self._read(good), "ecu_a old")
+        self.assertEqual(self._read(bad), "ecu_b old")
+        self.assertEqual(self.vehicle.installed_components["ecu_a"], "1.0.0")
+        self.assertEqual(self.vehicle.update_history, [])
+
+    def test_optional_failure_keeps_campaign(self):
+        def fail(package, target_dir):
+            return False
+
+        good = self._component("ecu_a")
+        optional = self._component("ecu_b", required=False, steps=[fail])
+        result = self.multi.apply(self.vehicle, [good, optional])
+
+        self.assertTrue(result.success)
+        self.assertEqual(result.results["ecu_b"].status, COMPONENT_FAILED)
+        self.assertEqual(self.vehicle.installed_components,
+                         {"ecu_a": "2.0.0", "ecu_b": "1.0.0"})
+
+    def test_failure_skips_pending_components(self):
+        self.multi.max_workers = 1
+
+        def fail(package, target_dir):
+            return False
+
+        updates = [self._component("ecu_a", steps=[fail]), self._component("ecu_b")]
+        result = self.multi.apply(self.vehicle, updates)
+
+        self.assertFalse(result.success)
+        self.assertEqual(result.results["ecu_b"].status, COMPONENT_SKIPPED)
+        self.assertEqual(self._read(updates[1]), "ecu_b old")
+
+    def test_bus_limit_serializes_components(self):
+        active = []
+        peak = []
+        lock = threading.Lock()
+
+        def tracked(package, target_dir):
+            with lock:
+                active.append(target_dir)
+                peak.append(len(active))
+            time.sleep(0.05)
+            with lock:
+                active.remove(target_dir)
+            return copy_payload(package, target_dir)
+
+        updates = [self._component(f"ecu_{i}", bus="can0", steps=[tracked]) for i in range(3)]
+        result = self.multi.apply(self.vehicle, updates)
+
+        self.assertTrue(result.success)
+        self.assertEqual(max(peak), 1)
+
+    def test_busy_bus_does_not_block_other_buses(self):
+        self.multi.max_workers = 2
+        other_bus_ran = threading.Event()
+        overlapped = []
+
+        def slow(package, target_dir):
+            overlapped.append(other_bus_ran.wait(timeout=2))
+            return copy_payload(package, target_dir)
+
+        def fast(package, target_dir):
+            other_bus_ran.set()
+            return copy_payload(package, target_dir)
+
+        # Queued behind two can0 components that cannot run at the same time
+        updates = [self._component(f"ecu_{i}", bus="can0", steps=[slow]) for i in range(3)]
+        updates.append(self._component("ecu_body", bus="can1", steps=[fast]))
+        result = self.multi.apply(self.vehicle, updates)
+
+        self.assertTrue(result.success)
+        self.assertTrue(overlapped[0])
+
+    def test_duplicate_component_rejected(self):
+        update = self._component("ecu_a")
+        with self.assertRaises(ValueError):
+            self.multi.apply(self.vehicle, [update, update])
+
+
+if __name__ == '__main__':
+    unittest.main()
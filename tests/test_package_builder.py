@@ -0,0 +1,158 @@
+"""
+Tests for Package Builder module.
+"""
+
+import unittest
+import tempfile
+import os
+import shutil
+from unittest import mock
+from src import package_builder
+from src.package_builder import build_package, load_previous_files, scan_payload, main
+from src.compact_manifest import CompactManifest
+from src.ota_package import OTAPackage, calculate_file_hash
+from src.verifier import Verifier
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PRIVATE_KEY = os.path.join(REPO_ROOT, "private_key.pem")
+PUBLIC_KEY = os.path.join(REPO_ROOT, "public_key.pem")
+
+
+class TestPackageBuilder(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.payload = os.path.join(self.temp_dir, "payload")
+        for rel_path in ["b.bin", "a.bin", "sub/c.bin", "sub/deep/d.bin", "z/e.bin"]:
+            self.write(rel_path, rel_path.encode() * 100)
+            self.age(rel_path)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def write(self, rel_path, data):
+        path = os.path.join(self.payload, rel_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(data)
+
+    def age(self, rel_path, seconds=60):
+        """Move a file's mtime back out of the builder's racy window."""
+        path = os.path.join(self.payload, rel_path)
+        st = os.stat(path)
+        os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns - seconds * 1_000_000_000))
+
+    def test_scan_payload_sorted(self):
+        paths = [rel_path for rel_path, _ in scan_payload(self.payload)]
+        self.assertEqual(paths, ["a.bin", "b.bin", "sub/c.bin", "sub/deep/d.bin", "z/e.bin"])
+
+    def test_build_package(self):
+        result = build_package(self.payload, "1.0.0")
+        package = result.package
+
+        self.assertEqual(package.package_id, self.payload)
+        self.assertEqual(result.hashed, 5)
+        self.assertEqual(result.reused, 0)
+        entry = package.files[2]
+        self.assertEqual(entry['path'], "sub/c.bin")
+        self.assertEqual(entry['hash'], calculate_file_hash(os.path.join(self.payload, "sub/c.bin")))
+        self.assertEqual(entry['size'], 900)
+        self.assertTrue(Verifier().verify_files(
+            (os.path.join(self.payload, f['path']), f['hash']) for f in package.files
+        ))
+
+    def test_incremental_rebuild_rehashes_only_changes(self):
+        first = build_package(self.payload, "1.0.0").package
+        manifest_path = os.path.join(self.temp_dir, "v1.json")
+        first.save_manifest(manifest_path)
+        self.write("sub/c.bin", b"changed")
+        self.write("new.bin", b"new")
+
+        with mock.patch.object(package_builder, 'calculate_file_hash',
+                               wraps=calculate_file_hash) as hashed:
+            result = build_package(self.payload, "1.1.0",
+                                   previous=load_previous_files(manifest_path))
+        self.assertEqual(sorted(c.args[0] for c in hashed.call_args_list),
+                         [os.path.join(self.payload, "new.bin"),
+                          os.path.join(self.payload, "sub/c.bin")])
+        self.assertEqual(result.reused, 4)
+        files = {f['path']: f for f in result.package.files}
+        self.assertEqual(files["sub/c.bin"]['hash'],
+                         calculate_file_hash(os.path.join(self.payload, "sub/c.bin")))
+        self.assertEqual(files["a.bin"], {f['path']: f for f in first.files}["a.bin"])
+
+    def test_same_size_edit_detected_by_mtime(self):
+        first = build_package(self.payload, "1.0.0").package
+        previous = {f['path']: f for f in first.files}
+        path = os.path.join(self.payload, "a.bin")
+        self.write("a.bin", b"A.BIN" * 100)
+        st = os.stat(path)
+        os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1000))
+
+        result = build_package(self.payload, "1.1.0", previous=previous)
+        self.assertEqual(result.hashed, 1)
+        self.assertEqual(result.package.files[0]['hash'], calculate_file_hash(path))
+
+    def test_racy_edit_keeping_size_and_mtime_detected(self):
+        self.write("a.bin", b"fresh" * 100)
+        first = build_package(self.payload, "1.0.0").package
+        self.assertNotIn('mtime_ns', first.files[0])
+        self.assertIn('mtime_ns', first.files[1])
+
+        # Edited in the same timestamp tick as the build hashed it
+        path = os.path.join(self.payload, "a.bin")
+        st = os.stat(path)
+        self.write("a.bin", b"FRESH" * 100)
+        os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns))
+
+        previous = {f['path']: f for f in first.files}
+        result = build_package(self.payload, "1.1.0", previous=previous)
+        self.assertEqual(result.hashed, 1)
+        self.assertEqual(result.reused, 4)
+        self.assertEqual(result.package.files[0]['hash'], calculate_file_hash(path))
+
+    def test_chunk_hashes_reused_only_for_same_chunk_size(self):
+        first = build_package(self.payload, "1.0.0", chunk_size=256).package
+        self.assertIn('chunks', first.files[0])
+        previous = {f['path']: f for f in first.files}
+
+        self.assertEqual(build_package(self.payload, "1.1", previous=previous,
+                                       chunk_size=256).hashed, 0)
+        self.assertEqual(build_package(self.payload, "1.1", previous=previous,
+                                       chunk_size=512).hashed, 5)
+
+    def test_cli_signed_manifest(self):
+        output = os.path.join(self.temp_dir, "manifest.json")
+        self.assertEqual(main([self.payload, "--version", "2.0.0", "--output", output,
+                               "--sign-key", PRIVATE_KEY]), 0)
+
+        package = OTAPackage.from_manifest(output)
+        signature = OTAPackage.load_signature(output)
+        self.assertEqual(len(package.files), 5)
+        self.assertTrue(Verifier(PUBLIC_KEY).verify_manifest(package, signature))
+
+    def test_cli_excludes_output_inside_payload(self):
+        output = os.path.join(self.payload, "manifest.json")
+        main([self.payload, "--version", "1.0.0", "--output", output])
+        main([self.payload, "--version", "1.0.1", "--output", output, "--previous", output])
+        paths = [f['path'] for f in OTAPackage.from_manifest(output).files]
+        self.assertNotIn("manifest.json", paths)
+
+    def test_cli_compact_previous(self):
+        output = os.path.join(self.temp_dir, "manifest.otam")
+        main([self.payload, "--version", "1.0.0", "--output", output, "--compact",
+              "--merkle-root"])
+        with CompactManifest(output) as manifest:
+            self.assertEqual(len(manifest), 5)
+            self.assertIsNotNone(manifest.header.get('merkle_root'))
+        self.assertEqual(len(load_previous_files(output)), 5)
+        result = build_package(self.payload, "1.0.1", previous=load_previous_files(output))
+        self.assertEqual(result.hashed, 0)
+
+    def test_cli_missing_payload(self):
+        self.assertEqual(main([os.path.join(self.temp_dir, "missing"), "--version", "1",
+                               "--output", os.path.join(self.temp_dir, "m.json")]), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -5,7 +5,10 @@ Tests for Rollback module.
 import unittest
 import tempfile
 import os
-from src.rollback import RollbackManager
+import json
+import time
+from unittest import mock
+from src.rollback import RollbackManager, CATALOG_FILE, RETENTION_LRU
 
 
 class TestRollbackManager(unittest.TestCase):
@@ -79,5 +82,172 @@ class TestRollbackManager(unittest.TestCase):
             self.assertNotIn(snapshot_id, self.rollback_manager.snapshots)
 
 
+class TestContentAddressedSnapshots(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.source_dir = os.path.join(self.temp_dir.name, "source")
+        os.makedirs(os.path.join(self.source_dir, "sub"))
+        with open(os.path.join(self.source_dir, "a.bin"), "w") as f:
+            f.write("shared")
+        with open(os.path.join(self.source_dir, "sub", "b.bin"), "w") as f:
+            f.write("shared")
+        self.manager = RollbackManager(os.path.join(self.temp_dir.name, "backups"),
+                                       content_addressed=True)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def count_blobs(self):
+        return sum(len(files) for _, _, files in os.walk(self.manager.objects_dir))
+
+    def test_snapshots_share_content(self):
+        first = self.manager.create_snapshot(self.source_dir, "snap1")
+        second = self.manager.create_snapshot(self.source_dir, "snap2")
+
+        self.assertEqual(self.count_blobs(), 1)
+        inode1 = os.stat(os.path.join(self.manager.snapshots[first], "a.bin")).st_ino
+        inode2 = os.stat(os.path.join(self.manager.snapshots[second], "sub", "b.bin")).st_ino
+        self.assertEqual(inode1, inode2)
+
+    def test_delete_collects_unreferenced_blobs(self):
+        self.manager.create_snapshot(self.source_dir, "snap1")
+        with open(os.path.join(self.source_dir, "a.bin"), "w") as f:
+            f.write("changed")
+        self.manager.create_snapshot(self.source_dir, "snap2")
+        self.assertEqual(self.count_blobs(), 2)
+
+        self.manager.delete_snapshot("snap2")
+        self.assertEqual(self.count_blobs(), 1)
+        self.manager.cleanup_old_snapshots(keep_count=0)
+        self.assertEqual(self.count_blobs(), 0)
+
+    def test_rollback_from_linked_snapshot(self):
+        snapshot_id = self.manager.create_snapshot(self.source_dir, "snap1")
+        with open(os.path.join(self.source_dir, "a.bin"), "w") as f:
+            f.write("modified")
+
+        self.assertTrue(self.manager.rollback_to_snapshot(snapshot_id, self.source_dir))
+        with open(os.path.join(self.source_dir, "a.bin")) as f:
+            self.assertEqual(f.read(), "shared")
+        # Restored files must not share storage with the snapshot
+        snapshot_file = os.path.join(self.manager.snapshots[snapshot_id], "a.bin")
+        self.assertNotEqual(os.stat(snapshot_file).st_ino,
+                            os.stat(os.path.join(self.source_dir, "a.bin")).st_ino)
+
+
+class TestSnapshotCatalog(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.backup_dir = os.path.join(self.temp_dir.name, "backups")
+        self.source_dir = os.path.join(self.temp_dir.name, "source")
+        os.makedirs(self.source_dir)
+        self.write("a.bin", 1000)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def write(self, name, size):
+        with open(os.path.join(self.source_dir, name), "wb") as f:
+            f.write(os.urandom(size))
+
+    def test_catalog_survives_restart(self):
+        manager = RollbackManager(self.backup_dir)
+        manager.create_snapshot(self.source_dir, "snap1")
+        info = manager.snapshot_info("snap1")
+        self.assertEqual(info['files'], 1)
+        self.assertEqual(info['size'], 1000)
+
+        reloaded = RollbackManager(self.backup_dir)
+        self.assertEqual(reloaded.list_snapshots(), ["snap1"])
+        self.assertEqual(reloaded.snapshot_info("snap1"), info)
+        self.assertTrue(reloaded.rollback_to_snapshot("snap1", self.source_dir))
+
+    def test_stale_entries_dropped_on_load(self):
+        manager = RollbackManager(self.backup_dir)
+        manager.create_snapshot(self.source_dir, "snap1")
+        manager.create_snapshot(self.source_dir, "snap2")
+        os.rename(os.path.join(self.backup_dir, "snap1"), os.path.join(self.temp_dir.name, "moved"))
+
+        reloaded = RollbackManager(self.backup_dir)
+        self.assertEqual(reloaded.list_snapshots(), ["snap2"])
+        with open(os.path.join(self.backup_dir, CATALOG_FILE)) as f:
+            self.assertEqual(list(json.load(f)['snapshots']), ["snap2"])
+
+    def test_unreadable_catalog_is_ignored(self):
+        os.makedirs(self.backup_dir)
+        with open(os.path.join(self.backup_dir, CATALOG_FILE), "w") as f:
+            f.write("{not json")
+        self.assertEqual(RollbackManager(self.backup_dir).list_snapshots(), [])
+
+    def test_cleanup_sorts_by_age(self):
+        manager = RollbackManager(self.backup_dir)
+        for snapshot_id in ["snap_b", "snap_c", "snap_a"]:
+            manager.create_snapshot(self.source_dir, snapshot_id)
+            time.sleep(0.01)
+        manager.cleanup_old_snapshots(keep_count=2)
+        self.assertEqual(sorted(manager.list_snapshots()), ["snap_a", "snap_c"])
+
+    def test_count_limit_applied_on_create(self):
+        manager = RollbackManager(self.backup_dir, max_snapshots=2)
+        for i in range(4):
+            manager.create_snapshot(self.source_dir, f"snap{i}")
+        self.assertEqual(sorted(manager.list_snapshots()), ["snap2", "snap3"])
+        self.assertFalse(os.path.exists(os.path.join(self.backup_dir, "snap0")))
+
+    def test_byte_budget(self):
+        manager = RollbackManager(self.backup_dir, max_bytes=2500)
+        for i in range(4):
+            manager.create_snapshot(self.source_dir, f"snap{i}")
+        self.assertEqual(sorted(manager.list_snapshots()), ["snap2", "snap3"])
+        self.assertLessEqual(manager.disk_usage(), 2500)
+
+    def test_newest_snapshot_kept_over_budget(self):
+        manager = RollbackManager(self.backup_dir, max_bytes=10)
+        manager.create_snapshot(self.source_dir, "snap1")
+        manager.create_snapshot(self.source_dir, "snap2")
+        self.assertEqual(manager.list_snapshots(), ["snap2"])
+
+    def test_lru_policy_keeps_recently_used(self):
+        manager = RollbackManager(self.backup_dir, retention_policy=RETENTION_LRU)
+        for i in range(3):
+            manager.create_snapshot(self.source_dir, f"snap{i}")
+            time.sleep(0.01)
+        manager.rollback_to_snapshot("snap0", self.source_dir)
+        manager.enforce_retention(max_count=2)
+        self.assertEqual(sorted(manager.list_snapshots()), ["snap0", "snap2"])
+
+    def test_content_addressed_usage_counts_shared_data_once(self):
+        manager = RollbackManager(self.backup_dir, content_addressed=True)
+        manager.create_snapshot(self.source_dir, "snap1")
+        manager.create_snapshot(self.source_dir, "snap2")
+        self.assertEqual(manager.disk_usage(), 1000)
+
+        self.write("b.bin", 500)
+        manager.create_snapshot(self.source_dir, "snap3")
+        self.assertEqual(manager.disk_usage(), 1500)
+        self.assertEqual(manager.enforce_retention(max_bytes=1200), ["snap1", "snap2", "snap3"])
+        self.assertEqual(manager.disk_usage(), 0)
+
+    def test_byte_budget_collects_garbage_once(self):
+        manager = RollbackManager(self.backup_dir, content_addressed=True)
+        for i in range(5):
+            self.write("a.bin", 1000)
+            manager.create_snapshot(self.source_dir, f"snap{i}")
+        self.assertEqual(manager.disk_usage(), 5000)
+
+        with mock.patch.object(manager, 'collect_garbage',
+                               wraps=manager.collect_garbage) as collect:
+            deleted = manager.enforce_retention(max_bytes=2000)
+        self.assertEqual(deleted, ["snap0", "snap1", "snap2"])
+        self.assertEqual(collect.call_count, 1)
+        self.assertEqual(manager.disk_usage(), 2000)
+
+    def test_invalid_policy(self):
+        with self.assertRaises(ValueError):
+            RollbackManager(self.backup_dir, retention_policy="random")
+
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
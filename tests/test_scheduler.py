@@ -0,0 +1,111 @@
+"""
+Tests for Scheduler module.
+"""
+
+import unittest
+import tempfile
+import os
+import threading
+import time
+from src.scheduler import StepScheduler, UpdateStep, resolve_steps
+from src.ota_package import OTAPackage
+from src.updater import Updater
+from src.verifier import Verifier
+
+
+class TestStepScheduler(unittest.TestCase):
+
+    def setUp(self):
+        self.package = OTAPackage("pkg", "1.0.0", [])
+        self.scheduler = StepScheduler(max_workers=4)
+
+    def test_plain_steps_stay_sequential(self):
+        order = []
+
+        def first(package, target_dir):
+            time.sleep(0.02)
+            order.append("first")
+            return True
+
+        def second(package, target_dir):
+            order.append("second")
+            return True
+
+        resolved = resolve_steps([first, second])
+        self.assertEqual(resolved[1].depends_on, ["first"])
+        self.assertTrue(self.scheduler.run([first, second], self.package, "target"))
+        self.assertEqual(order, ["first", "second"])
+
+    def test_independent_steps_run_concurrently(self):
+        barrier = threading.Barrier(2, timeout=2)
+
+        def flash(package, target_dir):
+            barrier.wait()
+            return True
+
+        steps = [UpdateStep(flash, "ecu_a", depends_on=[]),
+                 UpdateStep(flash, "ecu_b", depends_on=[]),
+                 UpdateStep(lambda p, t: True, "finalize", depends_on=["ecu_a", "ecu_b"])]
+        self.assertTrue(self.scheduler.run(steps, self.package, "target"))
+
+    def test_shared_resource_serializes(self):
+        active = []
+        overlap = []
+
+        def flash(package, target_dir):
+            active.append(1)
+            overlap.append(len(active))
+            time.sleep(0.02)
+            active.pop()
+            return True
+
+        steps = [UpdateStep(flash, f"ecu_{i}", depends_on=[], resources=["can0"])
+                 for i in range(3)]
+        self.assertTrue(self.scheduler.run(steps, self.package, "target"))
+        self.assertEqual(max(overlap), 1)
+
+    def test_failure_cancels_other_steps(self):
+        ran = []
+
+        def fail(package, target_dir):
+            return False
+
+        def slow(package, target_dir, cancel_event):
+            ran.append("slow")
+            return not cancel_event.wait(2)
+
+        def after(package, target_dir):
+            ran.append("after")
+            return True
+
+        steps = [UpdateStep(fail, "fail", depends_on=[]),
+                 UpdateStep(slow, "slow", depends_on=[], cancellable=True),
+                 UpdateStep(after, "after", depends_on=["slow"])]
+        start = time.time()
+        self.assertFalse(self.scheduler.run(steps, self.package, "target"))
+        self.assertLess(time.time() - start, 1.5)
+        self.assertNotIn("after", ran)
+
+    def test_cycle_rejected(self):
+        steps = [UpdateStep(lambda p, t: True, "a", depends_on=["b"]),
+                 UpdateStep(lambda p, t: True, "b", depends_on=["a"])]
+        with self.assertRaises(ValueError):
+            resolve_steps(steps)
+
+    def test_updater_rolls_back_once(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            target_dir = os.path.join(temp_dir, "target")
+            os.makedirs(target_dir)
+            updater = Updater(Verifier(), os.path.join(temp_dir, "backup"))
+            rollbacks = []
+            original = updater._rollback
+            updater._rollback = lambda target: (rollbacks.append(target), original(target))
+
+            updater.add_update_step(lambda p, t: False, name="ecu_a", depends_on=[])
+            updater.add_update_step(lambda p, t: False, name="ecu_b", depends_on=[])
+            self.assertFalse(updater.apply_update(self.package, target_dir))
+            self.assertEqual(len(rollbacks), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
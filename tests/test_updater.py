@@ -6,7 +6,7 @@ import unittest
 import tempfile
 import os
 import shutil
-from src.updater import Updater
+from src.updater import Updater, BACKUP_INCREMENTAL, INSTALL_AB
 from src.verifier import Verifier
 from src.ota_package import OTAPackage
 
@@ -60,6 +60,135 @@ class TestUpdater(unittest.TestCase):
             finally:
                 os.chdir(old_cwd)
 
+    def test_verify_package_reports_per_file_results(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            files = [
+                {"path": "test.txt", "hash": "9f86d081884c7d659a2feaa0c55ad015a3bf4f1b2b0b822cd15d6c15b0f00a08", "size": "4"},
+                {"path": "absent.txt", "hash": "00", "size": "0"}
+            ]
+            package = OTAPackage(os.path.join(temp_dir, "test_pkg"), "1.0.0", files)
+            os.makedirs(package.package_id)
+            with open(os.path.join(package.package_id, "test.txt"), "w") as f:
+                f.write("test")
+
+            # One worker checks files in order, so the failure cannot cancel test.txt
+            updater = Updater(Verifier(max_workers=1))
+            results = list(updater.iter_verify_package(package))
+            statuses = {os.path.basename(r.path): r.status for r in results}
+            self.assertEqual(statuses, {"test.txt": "ok", "absent.txt": "missing"})
+            self.assertFalse(updater._verify_package(package))
+            self.assertEqual(updater.last_verification.checked, 2)
+            self.assertEqual([os.path.basename(r.path) for r in updater.last_verification.failures],
+                             ["absent.txt"])
+
+    def test_incremental_backup_rollback(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            target_dir = os.path.join(temp_dir, "target")
+            backup_dir = os.path.join(temp_dir, "backup")
+            os.makedirs(target_dir)
+            with open(os.path.join(target_dir, "app.bin"), "w") as f:
+                f.write("old")
+            with open(os.path.join(target_dir, "untouched.bin"), "w") as f:
+                f.write("keep")
+
+            files = [
+                {"path": "app.bin", "hash": "x", "size": "3"},
+                {"path": "new/dir/extra.bin", "hash": "y", "size": "3"}
+            ]
+            package = OTAPackage("pkg", "1.0.0", files)
+            updater = Updater(self.verifier, backup_dir, backup_mode=BACKUP_INCREMENTAL)
+            updater._create_backup(target_dir, package)
+
+            self.assertFalse(os.path.exists(os.path.join(backup_dir, "files", "untouched.bin")))
+
+            with open(os.path.join(target_dir, "app.bin"), "w") as f:
+                f.write("new")
+            os.makedirs(os.path.join(target_dir, "new", "dir"))
+            with open(os.path.join(target_dir, "new", "dir", "extra.bin"), "w") as f:
+                f.write("new")
+
+            updater._rollback(target_dir)
+
+            with open(os.path.join(target_dir, "app.bin")) as f:
+                self.assertEqual(f.read(), "old")
+            self.assertFalse(os.path.exists(os.path.join(target_dir, "new")))
+            self.assertEqual(sorted(os.listdir(target_dir)), ["app.bin", "untouched.bin"])
+
+    def test_ab_update_switch_and_rollback(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            target_dir = os.path.join(temp_dir, "target")
+            os.makedirs(target_dir)
+            with open(os.path.join(target_dir, "test.txt"), "w") as f:
+                f.write("old")
+            with open(os.path.join(target_dir, "big.bin"), "w") as f:
+                f.write("unchanged")
+
+            files = [{"path": "test.txt", "hash": "9f86d081884c7d659a2feaa0c55ad015a3bf4f1b2b0b822cd15d6c15b0f00a08", "size": "4"}]
+            package = OTAPackage(os.path.join(temp_dir, "test_pkg"), "1.0.0", files)
+            os.makedirs(package.package_id)
+            with open(os.path.join(package.package_id, "test.txt"), "w") as f:
+                f.write("test")
+
+            def write_file(package, install_dir):
+                with open(os.path.join(install_dir, "test.txt"), "w") as f:
+                    f.write("test")
+                return True
+
+            updater = Updater(self.verifier, install_mode=INSTALL_AB)
+            updater.add_update_step(write_file)
+            self.assertTrue(updater.apply_update(package, target_dir))
+
+            self.assertTrue(os.path.islink(target_dir))
+            with open(os.path.join(target_dir, "test.txt")) as f:
+                self.assertEqual(f.read(), "test")
+            previous = os.path.join(target_dir + ".slots", "a")
+            with open(os.path.join(previous, "test.txt")) as f:
+                self.assertEqual(f.read(), "old")
+            with open(os.path.join(target_dir, "big.bin")) as f:
+                self.assertEqual(f.read(), "unchanged")
+
+            self.assertTrue(updater.rollback_slot(target_dir))
+            with open(os.path.join(target_dir, "test.txt")) as f:
+                self.assertEqual(f.read(), "old")
+
+    def test_ab_step_edits_in_place_without_touching_active_slot(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            target_dir = os.path.join(temp_dir, "target")
+            os.makedirs(target_dir)
+            with open(os.path.join(target_dir, "settings.conf"), "w") as f:
+                f.write("old")
+
+            def append_setting(package, install_dir):
+                with open(os.path.join(install_dir, "settings.conf"), "a") as f:
+                    f.write("+new")
+                return True
+
+            package = OTAPackage(os.path.join(temp_dir, "test_pkg"), "1.0.0", [])
+            updater = Updater(self.verifier, install_mode=INSTALL_AB)
+            updater.add_update_step(append_setting)
+            self.assertTrue(updater.apply_update(package, target_dir))
+
+            with open(os.path.join(target_dir, "settings.conf")) as f:
+                self.assertEqual(f.read(), "old+new")
+            with open(os.path.join(target_dir + ".slots", "a", "settings.conf")) as f:
+                self.assertEqual(f.read(), "old")
+
+    def test_ab_update_failure_keeps_active_slot(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            target_dir = os.path.join(temp_dir, "target")
+            os.makedirs(target_dir)
+            with open(os.path.join(target_dir, "test.txt"), "w") as f:
+                f.write("old")
+
+            package = OTAPackage(os.path.join(temp_dir, "test_pkg"), "1.0.0", [])
+            updater = Updater(self.verifier, install_mode=INSTALL_AB)
+            updater.add_update_step(lambda package, install_dir: False)
+
+            self.assertFalse(updater.apply_update(package, target_dir))
+            with open(os.path.join(target_dir, "test.txt")) as f:
+                self.assertEqual(f.read(), "old")
+            self.assertFalse(os.path.exists(os.path.join(target_dir + ".slots", "b")))
+
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -5,7 +5,17 @@ Tests for Verifier module.
 import unittest
 import tempfile
 import os
-from src.verifier import Verifier
+from unittest import mock
+from src.verifier import (Verifier, STATUS_OK, STATUS_MISMATCH, STATUS_MISSING, STATUS_SKIPPED,
+                          load_cached_public_key)
+from src.ota_package import OTAPackage
+from src.signer import Signer
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PRIVATE_KEY = os.path.join(REPO_ROOT, "private_key.pem")
+PUBLIC_KEY = os.path.join(REPO_ROOT, "public_key.pem")
+
+TEST_CONTENT_HASH = "6ae8a75555209fd6c44157c0aed8016e763ff435a19cf186f76863140143ff72"
 
 
 class TestVerifier(unittest.TestCase):
@@ -40,10 +50,101 @@ class TestVerifier(unittest.TestCase):
         finally:
             os.unlink(temp_path)
 
+    def test_small_buffer_hash(self):
+        verifier = Verifier(buffer_size=3)
+        with tempfile.NamedTemporaryFile(mode='wb', delete=False) as f:
+            f.write(b"test content")
+            temp_path = f.name
+
+        try:
+            self.assertTrue(verifier.verify_hash(temp_path, TEST_CONTENT_HASH))
+        finally:
+            os.unlink(temp_path)
+
+    def test_verify_files_results(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            good = os.path.join(temp_dir, "good.bin")
+            with open(good, "wb") as f:
+                f.write(b"test content")
+
+            verifier = Verifier(max_workers=2)
+            results = verifier.verify_files([
+                (good, TEST_CONTENT_HASH),
+                (os.path.join(temp_dir, "missing.bin"), TEST_CONTENT_HASH),
+            ], stop_on_failure=False)
+
+            self.assertEqual([r.status for r in results], [STATUS_OK, STATUS_MISSING])
+            self.assertEqual(results[0].actual_hash, TEST_CONTENT_HASH)
+
+    def test_verify_files_stops_on_first_mismatch(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            paths = []
+            for i in range(4):
+                path = os.path.join(temp_dir, f"file{i}.bin")
+                with open(path, "wb") as f:
+                    f.write(b"test content")
+                paths.append(path)
+
+            verifier = Verifier(max_workers=1)
+            results = verifier.verify_files(
+                [(paths[0], "bad")] + [(p, TEST_CONTENT_HASH) for p in paths[1:]]
+            )
+
+            self.assertEqual(results[0].status, STATUS_MISMATCH)
+            self.assertTrue(all(r.status == STATUS_SKIPPED for r in results[1:]))
+
     def test_verify_signature_without_key(self):
         with self.assertRaises(ValueError):
             self.verifier.verify_signature(b"data", b"signature")
 
 
+class TestManifestSignatures(unittest.TestCase):
+
+    def setUp(self):
+        self.signer = Signer(PRIVATE_KEY)
+        self.verifier = Verifier(PUBLIC_KEY)
+
+    def make_package(self, index):
+        files = [{"path": f"ecu_{index}.bin", "hash": f"{index:064x}", "size": index}]
+        return OTAPackage(f"pkg_{index}", "1.0.0", files)
+
+    def test_signed_manifest_roundtrip(self):
+        package = self.make_package(1)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            manifest_path = os.path.join(temp_dir, "manifest.json")
+            package.save_signed_manifest(manifest_path, self.signer)
+
+            loaded = OTAPackage.from_manifest(manifest_path)
+            signature = OTAPackage.load_signature(manifest_path)
+            self.assertTrue(self.verifier.verify_manifest(loaded, signature))
+
+            loaded.version = "9.9.9"
+            self.assertFalse(self.verifier.verify_manifest(loaded, signature))
+
+    def test_signature_errors(self):
+        package = self.make_package(1)
+        self.assertFalse(self.verifier.verify_manifest(package, b"not a signature"))
+        self.assertFalse(self.verifier.verify_manifest(package, None))
+        # Anything but a bad signature is a bug and is not reported as one
+        self.verifier._public_key = mock.Mock(**{'verify.side_effect': MemoryError})
+        with self.assertRaises(MemoryError):
+            self.verifier.verify_manifest(package, package.sign(self.signer))
+
+    def test_batch_verification(self):
+        packages = [self.make_package(i) for i in range(6)]
+        items = [(p, p.sign(self.signer)) for p in packages]
+        items[3] = (packages[3], items[4][1])
+
+        for workers in (1, 2):
+            results = self.verifier.verify_manifests_batch(items, max_workers=workers, min_batch=1)
+            self.assertEqual([r.name for r in results], [p.package_id for p in packages])
+            self.assertEqual([r.valid for r in results], [True, True, True, False, True, True])
+
+    def test_public_key_cache(self):
+        with open(PUBLIC_KEY, "rb") as f:
+            pem = f.read()
+        self.assertIs(load_cached_public_key(pem), load_cached_public_key(pem))
+
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,128 @@
+"""
+Tests for Version module.
+"""
+
+import unittest
+from src.version import (
+    Version, parse_version, compare_versions, package_applies, ApplicabilityIndex
+)
+from src.fleet_store import FleetStore
+from src.ota_package import OTAPackage, DeltaPackage
+from src.vehicle import Vehicle
+
+
+class TestVersion(unittest.TestCase):
+
+    def test_numeric_ordering(self):
+        self.assertLess(parse_version("1.9.0"), parse_version("1.10.0"))
+        self.assertLess(parse_version("1.0.9"), parse_version("1.1.0"))
+        self.assertGreater(parse_version("10.0.0"), parse_version("9.99.99"))
+
+    def test_prerelease_ordering(self):
+        ordered = ["1.0.0-alpha", "1.0.0-alpha.1", "1.0.0-alpha.beta", "1.0.0-beta",
+                   "1.0.0-beta.2", "1.0.0-beta.11", "1.0.0-rc.1", "1.0.0"]
+        parsed = [parse_version(v) for v in ordered]
+        self.assertEqual(sorted(reversed(parsed)), parsed)
+
+    def test_build_metadata_ignored(self):
+        self.assertEqual(parse_version("1.0.0+build.1"), parse_version("1.0.0+build.2"))
+        self.assertEqual(str(parse_version("1.0.0-rc.1+abc")), "1.0.0-rc.1+abc")
+
+    def test_lenient_forms(self):
+        self.assertEqual(parse_version("v2"), Version(2, 0, 0))
+        self.assertEqual(parse_version("2.1"), Version(2, 1, 0))
+
+    def test_invalid(self):
+        for text in ["", "1.0.0.0", "01.0.0", "1.0.0-", "abc"]:
+            with self.assertRaises(ValueError):
+                parse_version(text)
+
+    def test_parse_is_cached(self):
+        self.assertIs(parse_version("3.4.5"), parse_version("3.4.5"))
+
+    def test_compare_versions(self):
+        self.assertEqual(compare_versions("1.10.0", "1.9.0"), 1)
+        self.assertEqual(compare_versions("1.0.0", "1.0.0+x"), 0)
+        self.assertEqual(compare_versions("1.0.0-rc.1", "1.0.0"), -1)
+
+    def test_vehicle_is_update_applicable(self):
+        vehicle = Vehicle("V1", "1.9.0")
+        self.assertTrue(vehicle.is_update_applicable("1.10.0"))
+        self.assertFalse(vehicle.is_update_applicable("1.9.0"))
+        self.assertFalse(vehicle.is_update_applicable("1.9.0-rc.1"))
+        self.assertFalse(Vehicle("V2", "1.0.0.0").is_update_applicable("2.0.0"))
+
+    def test_package_applies(self):
+        full = OTAPackage("pkg", "2.0.0", [])
+        delta = DeltaPackage("pkg", "2.0.0", "1.5.0", [])
+        self.assertTrue(package_applies(full, "1.5.0"))
+        self.assertFalse(package_applies(full, "2.0.0"))
+        self.assertTrue(package_applies(delta, "1.5.0"))
+        self.assertFalse(package_applies(delta, "1.4.0"))
+        self.assertFalse(package_applies(full, "1.0.0.0"))
+        self.assertFalse(package_applies(delta, "garbage"))
+
+
+class TestApplicabilityIndex(unittest.TestCase):
+
+    def setUp(self):
+        versions = ["1.9.0", "1.10.0", "2.0.0-rc.1", "2.0.0", "1.9.0"]
+        self.vehicles = []
+        for index, version in enumerate(versions):
+            vehicle = Vehicle(f"V{index}", version)
+            vehicle.add_component("ecu", f"1.{index}.0")
+            self.vehicles.append(vehicle)
+        self.index = ApplicabilityIndex(self.vehicles)
+
+    def test_vehicles_for_full_package(self):
+        applicable = self.index.vehicles_for(OTAPackage("pkg", "2.0.0", []))
+        self.assertEqual(applicable, ["V0", "V4", "V1", "V2"])
+
+    def test_vehicles_for_delta_package(self):
+        delta = DeltaPackage("pkg", "2.0.0", "1.9.0", [])
+        self.assertEqual(self.index.vehicles_for(delta), ["V0", "V4"])
+
+    def test_matches_linear_scan(self):
+        for target in ["1.0.0", "1.9.0", "1.9.1", "2.0.0-rc.2", "3.0.0"]:
+            expected = {v.vehicle_id for v in self.vehicles if v.is_update_applicable(target)}
+            self.assertEqual(set(self.index.vehicles_below(target)), expected)
+
+    def test_components_below(self):
+        self.assertEqual(self.index.components_below("ecu", "1.2.0"), ["V0", "V1"])
+        self.assertEqual(self.index.components_below("missing", "1.0.0"), [])
+
+    def test_updates_move_vehicles(self):
+        self.index.set_vehicle_version("V0", "2.0.0")
+        self.index.set_component_version("V0", "ecu", "9.0.0")
+
+        self.assertEqual(self.index.vehicles_on("2.0.0"), ["V0", "V3"])
+        self.assertNotIn("V0", self.index.vehicles_below("2.0.0"))
+        self.assertNotIn("V0", self.index.components_below("ecu", "5.0.0"))
+
+    def test_invalid_versions_left_out(self):
+        broken = Vehicle("BAD", "unknown")
+        broken.add_component("ecu", "1.0.0")
+        broken.add_component("gateway", "not-a-version")
+        index = ApplicabilityIndex(self.vehicles + [broken])
+
+        self.assertEqual(len(index), 5)
+        self.assertEqual(index.invalid_versions, ["BAD"])
+        self.assertEqual(index.invalid_components, [("BAD", "gateway")])
+        self.assertNotIn("BAD", index.vehicles_for(OTAPackage("pkg", "9.0.0", [])))
+        self.assertIn("BAD", index.components_below("ecu", "1.1.0"))
+        self.assertEqual(index.components_below("gateway", "9.0.0"), [])
+
+        index.set_vehicle_version("BAD", "1.0.0")
+        self.assertEqual(index.invalid_versions, [])
+        self.assertIn("BAD", index.vehicles_below("2.0.0"))
+
+    def test_from_store(self):
+        with FleetStore() as store:
+            store.upsert_vehicles(self.vehicles)
+            index = ApplicabilityIndex.from_store(store)
+        self.assertEqual(len(index), 5)
+        self.assertEqual(index.vehicles_on("1.9.0"), ["V0", "V4"])
+
+
+if __name__ == '__main__':
+    unittest.main()